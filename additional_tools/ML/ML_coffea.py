@@ -114,10 +114,10 @@ class ML_cluster(processor.ProcessorABC):
 
         # save per event variables to a dataframe
         out_vars = pd.DataFrame()
-        out_vars["ntracks"] = ak.num(tracks).to_list()
-        out_vars["ngood_fastjets"] = ak.num(ak_inclusive_jets).to_list()
-        out_vars["ht"] = ak.sum(ak4jets.pt, axis=-1).to_list()
-        out_vars["ngood_ak4jets"] = ak.num(ak4jets).to_list()
+        out_vars["ntracks"] = ak.to_numpy(ak.num(tracks))
+        out_vars["ngood_fastjets"] = ak.to_numpy(ak.num(ak_inclusive_jets))
+        out_vars["ht"] = ak.to_numpy(ak.sum(ak4jets.pt, axis=-1))
+        out_vars["ngood_ak4jets"] = ak.to_numpy(ak.num(ak4jets))
 
         # indices of events in tracks, used to keep track which events pass selections
         indices = np.arange(0, len(tracks))
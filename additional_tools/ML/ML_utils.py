@@ -54,7 +54,7 @@ def SSDMethod(self, indices, events, out_label=""):
                 )  # highest SUEP prediction per event
 
         for model in self.ssd_models:
-            self.out_vars.loc[indices, model + "_ssd" + out_label] = pred_dict[model]
+            self.out_vars.loc(indices, model + "_ssd" + out_label, pred_dict[model])
 
 
 def DGNNMethod(
@@ -84,6 +84,46 @@ def DGNNMethod(
         # consistency check
         assert len(self.dgnn_model_names) == len(self.configs)
 
+        # calculate other observables to store, these do not depend on the model
+        boost_SUEP = ak.zip(
+            {
+                "px": SUEP_cand.px * -1,
+                "py": SUEP_cand.py * -1,
+                "pz": SUEP_cand.pz * -1,
+                "mass": SUEP_cand.mass,
+            },
+            with_name="Momentum4D",
+        )
+        SUEP_tracks_b = SUEP_tracks.boost_p4(boost_SUEP)
+        if do_inverted:
+            boost_ISR = ak.zip(
+                {
+                    "px": ISR_cand.px * -1,
+                    "py": ISR_cand.py * -1,
+                    "pz": ISR_cand.pz * -1,
+                    "mass": ISR_cand.mass,
+                },
+                with_name="Momentum4D",
+            )
+            ISR_tracks_b = ISR_tracks.boost_p4(boost_ISR)
+            eigs, eigs_ISR = SUEP_utils.batch_sphericity(
+                [SUEP_tracks_b, ISR_tracks_b], 1.0
+            )  # Set r=1.0 for IRC safe
+        else:
+            eigs = SUEP_utils.sphericity(SUEP_tracks_b, 1.0)  # Set r=1.0 for IRC safe
+
+        self.out_vars.loc(indices, "SUEP_nconst_GNN" + out_label, ak.num(SUEP_tracks))
+        self.out_vars.loc(
+            indices, "SUEP_S1_GNN" + out_label, 1.5 * (eigs[:, 1] + eigs[:, 0])
+        )
+        if do_inverted:
+            self.out_vars.loc(indices, "ISR_nconst_GNN" + out_label, ak.num(ISR_tracks))
+            self.out_vars.loc(
+                indices,
+                "ISR_S1_GNN" + out_label,
+                1.5 * (eigs_ISR[:, 1] + eigs_ISR[:, 0]),
+            )
+
         for model_name, config in zip(self.dgnn_model_names, self.configs):
             model_path = modelDir + model_name + ".pt"
 
@@ -101,55 +141,15 @@ def DGNNMethod(
 
             # run GNN inference on the SUEP tracks
             results = run_inference_GNN(self, suep, SUEP_tracks, SUEP_cand)
-            self.out_vars.loc[
-                indices, "SUEP_" + model_name + "_GNN" + out_label
-            ] = results
-
-            # calculate other obserables to store
-            boost_SUEP = ak.zip(
-                {
-                    "px": SUEP_cand.px * -1,
-                    "py": SUEP_cand.py * -1,
-                    "pz": SUEP_cand.pz * -1,
-                    "mass": SUEP_cand.mass,
-                },
-                with_name="Momentum4D",
-            )
-            SUEP_tracks_b = SUEP_tracks.boost_p4(boost_SUEP)
-            eigs = SUEP_utils.sphericity(SUEP_tracks_b, 1.0)  # Set r=1.0 for IRC safe
-            self.out_vars.loc[indices, "SUEP_nconst_GNN" + out_label] = ak.num(
-                SUEP_tracks
-            )
-            self.out_vars.loc[indices, "SUEP_S1_GNN" + out_label] = 1.5 * (
-                eigs[:, 1] + eigs[:, 0]
+            self.out_vars.loc(
+                indices, "SUEP_" + model_name + "_GNN" + out_label, results
             )
 
             if do_inverted:
-                # run GNN inference on the SUEP tracks
+                # run GNN inference on the ISR tracks
                 results = run_inference_GNN(self, suep, ISR_tracks, ISR_cand)
-                self.out_vars.loc[
-                    indices, "ISR_" + model_name + "_GNN" + out_label
-                ] = results
-
-                # calculate other obserables to store
-                boost_ISR = ak.zip(
-                    {
-                        "px": ISR_cand.px * -1,
-                        "py": ISR_cand.py * -1,
-                        "pz": ISR_cand.pz * -1,
-                        "mass": ISR_cand.mass,
-                    },
-                    with_name="Momentum4D",
-                )
-                ISR_tracks_b = ISR_tracks.boost_p4(boost_ISR)
-                eigs = SUEP_utils.sphericity(
-                    ISR_tracks_b, 1.0
-                )  # Set r=1.0 for IRC safe
-                self.out_vars.loc[indices, "ISR_nconst_GNN" + out_label] = ak.num(
-                    ISR_tracks
-                )
-                self.out_vars.loc[indices, "ISR_S1_GNN" + out_label] = 1.5 * (
-                    eigs[:, 1] + eigs[:, 0]
+                self.out_vars.loc(
+                    indices, "ISR_" + model_name + "_GNN" + out_label, results
                 )
 
 
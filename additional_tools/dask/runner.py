@@ -409,6 +409,20 @@ def daskExecutor(args, processor_instance, sample_dict, env_extra, condor_extra)
         client = Client(cluster)
         print("Waiting for at least one worker...")
         client.wait_for_workers(1)
+
+    class WarmupCorrections(WorkerPlugin):
+        def setup(self, worker: Worker):
+            # importing the processor registers the warm-up hooks of its corrections
+            import workflows.SUEP_coffea
+            from workflows.CMS_corrections import correction_registry
+
+            # on casa, the data directory is uploaded to the worker space
+            prefix = None
+            if args.executor == "dask/casa":
+                prefix = os.getcwd() + "/dask-worker-space/"
+            correction_registry.warmup(args.era, args.isMC, prefix=prefix)
+
+    client.register_worker_plugin(WarmupCorrections())
     with performance_report(filename="dask_out/dask-report.html"):
         output = processor.run_uproot_job(
             sample_dict,
@@ -15,7 +15,7 @@ import vector
 
 sys.path.append("..")
 
-from workflows.SUEP_utils import FastJetReclustering, getTopTwoJets
+from workflows.SUEP_utils import FastJetReclustering, getTopTwoJets, lastCopy
 
 vector.register_awkward()
 
@@ -90,16 +90,12 @@ def plot(
     showRingOfFire=True,
     params=None,
     showCandidates=False,
+    scalarParticle=None,
 ):
     genParticles_ParentId = genParticles.genPartIdxMother
     genParticles_PdgId = genParticles.pdgId
     genParticles_Status = genParticles.status
 
-    # The last copy of the scalar mediator
-    scalarParticle = genParticles[
-        (genParticles_PdgId == 25) & (genParticles_Status == 62)
-    ]
-
     # Define mask arrays to select the desired particles
     finalParticles = (genParticles_Status == 1) & (genParticles.pt > 1)
     fromScalarParticles = genParticles_ParentId == 999998
@@ -575,6 +571,11 @@ def main():
     genParticles = ak.packed(genParticles[eventSelection])
     tracks = ak.packed(tracks[eventSelection])
 
+    # The last copy of the scalar mediator
+    scalarParticles = lastCopy(
+        genParticles[(genParticles.pdgId == 25) & (genParticles.status == 62)]
+    )
+
     # sanity check
     assert len(tracks) == len(genParticles)
 
@@ -585,6 +586,7 @@ def main():
         # get the event tracks, gen particles
         this_tracks = tracks[i]
         this_genParticles = genParticles[i]
+        this_scalarParticle = scalarParticles[i]
 
         if args.boost:
             fig = plt.figure(figsize=(12, 7))
@@ -602,6 +604,7 @@ def main():
                 showRingOfFire=args.ring,
                 showGen=args.gen,
                 showPFCands=args.pfcands,
+                scalarParticle=this_scalarParticle,
             )
             plot(
                 i,
@@ -614,6 +617,7 @@ def main():
                 showRingOfFire=args.ring,
                 showGen=args.gen,
                 showPFCands=args.pfcands,
+                scalarParticle=this_scalarParticle,
             )
         elif args.boostOnly:
             fig = plt.figure(figsize=(6, 7))
@@ -630,6 +634,7 @@ def main():
                 showRingOfFire=args.ring,
                 showGen=args.gen,
                 showPFCands=args.pfcands,
+                scalarParticle=this_scalarParticle,
             )
         else:
             fig = plt.figure(figsize=(6, 7))
@@ -646,6 +651,7 @@ def main():
                 showRingOfFire=args.ring,
                 showGen=args.gen,
                 showPFCands=args.pfcands,
+                scalarParticle=this_scalarParticle,
             )
 
         # signal case
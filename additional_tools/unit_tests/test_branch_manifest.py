@@ -0,0 +1,89 @@
+"""
+Checks that the processors declare, in their branch manifests, every branch they read,
+so that a job run with --preload does not fail on a branch missing from preload.root.
+The code of the processors is checked, for each configuration, without reading any file
+(see workflows/utils/branch_manifest.undeclared).
+
+To run them, do:
+    python -m pytest test_branch_manifest.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+pytest.importorskip("coffea")
+
+from workflows import SUEP_coffea, SUEP_coffea_WH, SUEP_coffea_ZH
+from workflows.utils.branch_manifest import undeclared
+
+ERAS = ["2016apv", "2016", "2017", "2018"]
+
+
+def check(instance):
+    manifest = instance.branchManifest()
+    assert undeclared(manifest, [type(instance).process], instance) == []
+
+
+@pytest.mark.parametrize("era", ERAS)
+@pytest.mark.parametrize("isMC", [0, 1])
+@pytest.mark.parametrize("scouting", [0, 1])
+@pytest.mark.parametrize("trigger", ["PFHT", "TripleMu"])
+def test_ggF_manifest(era, isMC, scouting, trigger):
+    check(
+        SUEP_coffea.SUEP_cluster(
+            isMC=isMC,
+            era=era,
+            scouting=scouting,
+            do_syst=isMC,
+            syst_var="",
+            sample="GluGluToSUEP_HT1000_T1p00_mS125.000_mPhi1.000",
+            weight_syst="",
+            flag=False,
+            do_inf=False,
+            output_location=None,
+            accum="pandas_merger",
+            trigger=trigger,
+        )
+    )
+
+
+@pytest.mark.parametrize("era", ERAS)
+@pytest.mark.parametrize("isMC", [0, 1])
+def test_WH_manifest(era, isMC):
+    check(
+        SUEP_coffea_WH.SUEP_cluster_WH(
+            isMC=isMC,
+            era=era,
+            scouting=0,
+            do_syst=isMC,
+            syst_var="",
+            sample="WHleptonicpythia_generic_M125.0_MD3.00_T3.00_HT-1_UL18",
+            weight_syst="",
+            flag=False,
+            output_location=None,
+            accum="pandas_merger",
+            trigger="TripleMu",
+        )
+    )
+
+
+@pytest.mark.parametrize("era", ERAS)
+@pytest.mark.parametrize("isMC", [0, 1])
+def test_ZH_manifest(era, isMC):
+    check(
+        SUEP_coffea_ZH.SUEP_cluster_ZH(
+            isMC=isMC,
+            era=era,
+            sample="ZH_ZToLL_HToSUEP_mS125_UL18",
+            do_syst=isMC,
+            syst_var="",
+            weight_syst="",
+            SRonly=False,
+            output_location=None,
+            doOF=False,
+            isDY=False,
+        )
+    )
@@ -0,0 +1,120 @@
+"""
+Tests of the background prefetching of the ntuples of make_hists (histmaker/prefetch.py),
+with LocalTransport standing in for xrootd, so that they run without a network.
+
+To run them, do:
+    python -m pytest test_prefetch.py
+"""
+
+import os
+import sys
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../histmaker")
+)
+import prefetch
+
+
+class FlakyTransport(prefetch.LocalTransport):
+    """LocalTransport failing the first nfailures transfers of each file."""
+
+    def __init__(self, source_dir, nfailures):
+        super().__init__(source_dir)
+        self.nfailures = nfailures
+        self.attempts = {}
+
+    def fetch(self, ifile, local_file, timeout=None):
+        self.attempts[ifile] = self.attempts.get(ifile, 0) + 1
+        if self.attempts[ifile] <= self.nfailures:
+            # leave a partial file behind, as a failed xrdcp can
+            with open(local_file, "w") as f:
+                f.write("partial")
+            raise OSError("transfer failed")
+        super().fetch(ifile, local_file, timeout)
+
+
+def make_files(source_dir, nfiles, size=1000):
+    source_dir.mkdir(exist_ok=True)
+    files = []
+    for i in range(nfiles):
+        path = source_dir / f"ntuple_{i}.hdf5"
+        path.write_bytes(bytes([i]) * size)
+        files.append(str(path))
+    return files
+
+
+def scratch_files(scratch_dir):
+    return [f for f in os.listdir(scratch_dir) if f.startswith("prefetch_")]
+
+
+def test_prefetch_order_and_cleanup(tmp_path):
+    files = make_files(tmp_path / "source", 5)
+    scratch_dir = str(tmp_path / "scratch")
+    prefetcher = prefetch.Prefetcher(
+        files, prefetch.LocalTransport(), nprefetch=3, scratch_dir=scratch_dir
+    )
+    for i, (ifile, local_file) in enumerate(prefetcher):
+        assert ifile == files[i]
+        with open(local_file, "rb") as f:
+            assert f.read() == bytes([i]) * 1000
+    assert scratch_files(scratch_dir) == []
+
+
+def test_prefetch_retries(tmp_path):
+    files = make_files(tmp_path / "source", 3)
+    scratch_dir = str(tmp_path / "scratch")
+
+    # succeeds on the last attempt
+    transport = FlakyTransport(None, nfailures=2)
+    prefetcher = prefetch.Prefetcher(
+        files, transport, scratch_dir=scratch_dir, retries=3
+    )
+    local_files = [local_file for _, local_file in prefetcher]
+    assert all(local_file is not None for local_file in local_files)
+    assert all(transport.attempts[f] == 3 for f in files)
+
+    # fails after all the retries, without leaving partial files behind
+    transport = FlakyTransport(None, nfailures=3)
+    prefetcher = prefetch.Prefetcher(
+        files, transport, scratch_dir=scratch_dir, retries=3
+    )
+    for ifile, local_file in prefetcher:
+        assert local_file is None
+        assert transport.attempts[ifile] == 3
+    assert scratch_files(scratch_dir) == []
+
+
+def test_prefetch_scratch_budget(tmp_path):
+    files = make_files(tmp_path / "source", 6)
+    scratch_dir = str(tmp_path / "scratch")
+
+    # smaller than one file: only the next file is copied while one is in use
+    prefetcher = prefetch.Prefetcher(
+        files,
+        prefetch.LocalTransport(),
+        nprefetch=4,
+        scratch_dir=scratch_dir,
+        scratch_budget=500,
+    )
+    nfiles = 0
+    for _, local_file in prefetcher:
+        assert local_file is not None
+        assert len(scratch_files(scratch_dir)) <= 2
+        nfiles += 1
+    assert nfiles == len(files)
+    assert scratch_files(scratch_dir) == []
+
+
+def test_prefetch_early_exit(tmp_path):
+    files = make_files(tmp_path / "source", 6)
+    scratch_dir = str(tmp_path / "scratch")
+    prefetcher = prefetch.Prefetcher(
+        files, prefetch.LocalTransport(), nprefetch=4, scratch_dir=scratch_dir
+    )
+    ntuples = iter(prefetcher)
+    _, local_file = next(ntuples)
+    assert os.path.exists(local_file)
+
+    # stopping the iteration cleans up the file in use and the transfers in flight
+    ntuples.close()
+    assert scratch_files(scratch_dir) == []
@@ -0,0 +1,74 @@
+"""
+Tests of the closed-form eigenvalues of the sphericity tensors (SUEP_utils.eigvalsh_3x3),
+against numpy.linalg.eigvalsh.
+
+To run them, do:
+    python -m pytest test_sphericity.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+np = pytest.importorskip("numpy")
+pytest.importorskip("awkward")
+pytest.importorskip("fastjet")
+pytest.importorskip("vector")
+
+from workflows.SUEP_utils import eigvalsh_3x3
+
+
+def check(matrices):
+    evals = eigvalsh_3x3(
+        matrices[:, 0, 0],
+        matrices[:, 1, 1],
+        matrices[:, 2, 2],
+        matrices[:, 0, 1],
+        matrices[:, 0, 2],
+        matrices[:, 1, 2],
+    )
+    assert evals.shape == (len(matrices), 3)
+    assert np.all(np.isfinite(evals))
+    np.testing.assert_allclose(
+        evals, np.linalg.eigvalsh(matrices), rtol=1e-6, atol=1e-9
+    )
+
+
+def rotations(rng, n):
+    # orthogonal matrices, from the QR decomposition of random ones
+    q, r = np.linalg.qr(rng.normal(size=(n, 3, 3)))
+    return q * np.sign(np.diagonal(r, axis1=1, axis2=2))[:, None, :]
+
+
+def test_random():
+    rng = np.random.default_rng(1)
+    a = rng.normal(size=(1000, 3, 3))
+    check(a + a.transpose(0, 2, 1))
+
+    # sphericity tensors: positive semi-definite, with unit trace
+    p = rng.exponential(size=(1000, 20, 3))
+    s = np.einsum("nti,ntj->nij", p, p)
+    check(s / np.trace(s, axis1=1, axis2=2)[:, None, None])
+
+
+def test_diagonal():
+    rng = np.random.default_rng(2)
+    check(np.einsum("ni,ij->nij", rng.normal(size=(100, 3)), np.eye(3)))
+
+
+def test_degenerate():
+    rng = np.random.default_rng(3)
+
+    # p == 0: multiples of the identity, including the null matrix
+    scales = np.concatenate(([0.0], rng.normal(size=99)))
+    check(scales[:, None, None] * np.eye(3))
+
+    # two, or three, repeated eigenvalues in a rotated frame
+    q = rotations(rng, 300)
+    evals = rng.normal(size=(300, 3))
+    evals[:100, 1] = evals[:100, 0]
+    evals[100:200, 2] = evals[100:200, 1]
+    evals[200:, 1:] = evals[200:, :1]
+    check(np.einsum("nij,nj,nkj->nik", q, evals, q))
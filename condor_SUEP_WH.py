@@ -8,7 +8,8 @@ from histmaker.fill_utils import get_git_info
 
 # SUEP Repo Specific
 from workflows import SUEP_coffea_WH
-from workflows.utils import pandas_utils
+from workflows.CMS_corrections import correction_registry
+from workflows.utils import branch_manifest, pandas_utils
 
 
 def form_ntuple(options, output):
@@ -52,8 +53,30 @@ def main():
     parser.add_argument("--maxChunks", type=int, default=None, help="")
     parser.add_argument("--chunkSize", type=int, default=100000, help="")
     parser.add_argument("--doInf", type=str, default=-1, help="")
+    parser.add_argument(
+        "--format",
+        type=str,
+        default="hdf5",
+        choices=["hdf5", "parquet"],
+        help="ntuple output format",
+    )
+    parser.add_argument(
+        "--h5table",
+        type=int,
+        default=0,
+        help="write the HDF5 ntuple in the queryable PyTables table format",
+    )
+    parser.add_argument(
+        "--preload",
+        type=int,
+        default=0,
+        help="read only the branches declared by the processor, in bulk, before running",
+    )
     options = parser.parse_args()
 
+    # load the corrections once, before processing the first chunk
+    correction_registry.warmup(options.era, options.isMC)
+
     out_dir = os.getcwd()
     modules_era = []
 
@@ -73,6 +96,20 @@ def main():
     )
 
     for instance in modules_era:
+        infile = options.infile
+        if options.preload:
+            branch_manifest.preload(
+                options.infile,
+                instance.branchManifest(),
+                "preload.root",
+                step_size=options.chunkSize,
+                entry_stop=(
+                    options.maxChunks * options.chunkSize if options.maxChunks else None
+                ),
+                timeout=120,
+            )
+            infile = "preload.root"
+
         runner = processor.Runner(
             executor=processor.FuturesExecutor(compression=None, workers=1),
             schema=processor.NanoAODSchema,
@@ -85,7 +122,7 @@ def main():
             retries=3,
             skipbadfiles=False,
             func=runner.run,
-            fileset={options.dataset: [options.infile]},
+            fileset={options.dataset: [infile]},
             treename="Events",
             processor_instance=instance,
         )
@@ -93,7 +130,17 @@ def main():
         # save output
         df = form_ntuple(options, output)
         metadata = form_metadata(options, output)
-        pandas_utils.save_dfs(instance, [df], ["vars"], "out.hdf5", metadata=metadata)
+        pandas_utils.save_dfs(
+            instance,
+            [df],
+            ["vars"],
+            "out." + options.format,
+            metadata=metadata,
+            table=options.h5table,
+        )
+
+        if options.preload:
+            os.remove("preload.root")
 
 
 if __name__ == "__main__":
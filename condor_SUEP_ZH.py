@@ -7,6 +7,8 @@ from coffea.processor import Runner, futures_executor, run_uproot_job
 
 # SUEP Repo Specific
 from workflows import SUEP_coffea_ZH, merger
+from workflows.CMS_corrections import correction_registry
+from workflows.utils import branch_manifest
 
 # Begin argparse
 parser = argparse.ArgumentParser("")
@@ -35,10 +37,19 @@ parser.add_argument(
     default=False,
     help="Activate to save the gen-level of the Z pT, needed to clean the overlap in DY samples",
 )
+parser.add_argument(
+    "--preload",
+    type=int,
+    default=0,
+    help="read only the branches declared by the processor, in bulk, before running",
+)
 
 
 options = parser.parse_args()
 
+# load the corrections once, before processing the first chunk
+correction_registry.warmup(options.era, options.isMC)
+
 out_dir = os.getcwd()
 modules_era = []
 
@@ -60,6 +71,13 @@ modules_era.append(
 )
 
 for instance in modules_era:
+    infile = options.infile
+    if options.preload:
+        branch_manifest.preload(
+            options.infile, instance.branchManifest(), "preload.root", timeout=60
+        )
+        infile = "preload.root"
+
     runner = processor.Runner(
         executor=processor.FuturesExecutor(compression=None, workers=1),
         schema=processor.NanoAODSchema,
@@ -71,9 +89,12 @@ for instance in modules_era:
         retries=3,
         skipbadfiles=False,
         func=runner.run,
-        fileset={options.dataset: [options.infile]},
+        fileset={options.dataset: [infile]},
         treename="Events",
         processor_instance=instance,
     )
 
     merger.merge(options, pattern="condor_*.hdf5", outFile="out.hdf5")
+
+    if options.preload:
+        os.remove("preload.root")
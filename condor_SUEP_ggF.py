@@ -6,9 +6,10 @@ from coffea import processor
 from coffea.processor import Runner, futures_executor, run_uproot_job
 
 from workflows import SUEP_coffea
+from workflows.CMS_corrections import correction_registry
 
 # SUEP Repo Specific
-from workflows.utils import merger
+from workflows.utils import branch_manifest, merger, skim_cache
 
 # Begin argparse
 parser = argparse.ArgumentParser("")
@@ -19,9 +20,31 @@ parser.add_argument("--doSyst", type=int, default=1, help="")
 parser.add_argument("--infile", required=True, type=str, default=None, help="")
 parser.add_argument("--dataset", type=str, default="X", help="")
 parser.add_argument("--nevt", type=str, default=-1, help="")
+parser.add_argument(
+    "--format",
+    type=str,
+    default="hdf5",
+    choices=["hdf5", "parquet"],
+    help="ntuple output format",
+)
 parser.add_argument("--doInf", type=int, default=0, help="")
+parser.add_argument(
+    "--preload",
+    type=int,
+    default=0,
+    help="read only the branches declared by the processor, in bulk, before running",
+)
+parser.add_argument(
+    "--skimCache",
+    type=str,
+    default="",
+    help="directory of the skim cache, with the entries passing the early selections",
+)
 options = parser.parse_args()
 
+# load the corrections once, before processing the first chunk
+correction_registry.warmup(options.era, options.isMC)
+
 out_dir = os.getcwd()
 modules_era = []
 
@@ -42,20 +65,52 @@ modules_era.append(
 )
 
 for instance in modules_era:
-    runner = processor.Runner(
-        executor=processor.FuturesExecutor(compression=None, workers=1),
-        schema=processor.NanoAODSchema,
-        xrootdtimeout=60,
-        chunksize=1000000,
-    )
+    # the entries that passed the early selections in a previous run, if cached
+    entries = None
+    if options.skimCache:
+        cache = skim_cache.SkimCache(options.skimCache, instance.skimVersion())
+        entries = cache.setup(instance, options.infile)
 
-    runner.automatic_retries(
-        retries=3,
-        skipbadfiles=False,
-        func=runner.run,
-        fileset={options.dataset: [options.infile]},
-        treename="Events",
-        processor_instance=instance,
+    infile = options.infile
+    if entries is not None and len(entries) == 0:
+        # no events passed the early selections, there is nothing to run over
+        skim_cache.write_empty(instance, "ntuple_skim.hdf5")
+    else:
+        if options.preload or entries is not None:
+            branch_manifest.preload(
+                options.infile,
+                instance.branchManifest(),
+                "preload.root",
+                step_size=1000000,
+                timeout=60,
+                entries=entries,
+            )
+            infile = "preload.root"
+
+        runner = processor.Runner(
+            executor=processor.FuturesExecutor(compression=None, workers=1),
+            schema=processor.NanoAODSchema,
+            xrootdtimeout=60,
+            chunksize=1000000,
+        )
+
+        output = runner.automatic_retries(
+            retries=3,
+            skipbadfiles=False,
+            func=runner.run,
+            fileset={options.dataset: [infile]},
+            treename="Events",
+            processor_instance=instance,
+        )
+
+    merger.merge(
+        options,
+        pattern="ntuple_*.hdf5",
+        outFile="out." + options.format,
     )
 
-    merger.merge(options, pattern="ntuple_*.hdf5", outFile="out.hdf5")
+    if instance.skim == "write":
+        cache.fill(options.infile, output)
+
+    if infile == "preload.root":
+        os.remove("preload.root")
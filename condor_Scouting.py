@@ -6,9 +6,11 @@ from coffea import processor
 from coffea.processor import Runner, futures_executor, run_uproot_job
 
 from workflows import SUEP_coffea
+from workflows.CMS_corrections import correction_registry
 
 # SUEP Repo Specific
-from workflows.utils import merger, root_rewrite
+from workflows.utils import branch_manifest, merger, skim_cache
+from workflows.utils.scouting_schema import ScoutingSchema
 
 # Begin argparse
 parser = argparse.ArgumentParser("")
@@ -20,13 +22,33 @@ parser.add_argument("--doInf", type=int, default=0, help="")
 parser.add_argument("--infile", type=str, default=None, help="")
 parser.add_argument("--dataset", type=str, default="X", help="")
 parser.add_argument("--nevt", type=str, default=-1, help="")
+parser.add_argument(
+    "--format",
+    type=str,
+    default="hdf5",
+    choices=["hdf5", "parquet"],
+    help="ntuple output format",
+)
+parser.add_argument(
+    "--preload",
+    type=int,
+    default=0,
+    help="read only the branches declared by the processor, in bulk, before running",
+)
+parser.add_argument(
+    "--skimCache",
+    type=str,
+    default="",
+    help="directory of the skim cache, with the entries passing the early selections",
+)
 options = parser.parse_args()
 
+# load the corrections once, before processing the first chunk
+correction_registry.warmup(options.era, options.isMC)
+
 out_dir = os.getcwd()
 modules_era = []
 
-root_rewrite.rewrite(options.infile)
-
 modules_era.append(
     SUEP_coffea.SUEP_cluster(
         isMC=options.isMC,
@@ -43,24 +65,53 @@ modules_era.append(
     )
 )
 
-processor.NanoAODSchema.mixins["PFcand"] = "PFCand"
 for instance in modules_era:
-    runner = processor.Runner(
-        executor=processor.FuturesExecutor(compression=None, workers=1),
-        schema=processor.NanoAODSchema,
-        xrootdtimeout=60,
-        chunksize=10000,
-    )
+    # the entries that passed the early selections in a previous run, if cached
+    entries = None
+    if options.skimCache:
+        cache = skim_cache.SkimCache(options.skimCache, instance.skimVersion())
+        entries = cache.setup(instance, options.infile)
+
+    infile = options.infile
+    if entries is not None and len(entries) == 0:
+        # no events passed the early selections, there is nothing to run over
+        skim_cache.write_empty(instance, "ntuple_skim.hdf5")
+    else:
+        if options.preload or entries is not None:
+            branch_manifest.preload(
+                options.infile,
+                instance.branchManifest(),
+                "preload.root",
+                treename="mmtree/tree",
+                timeout=60,
+                entries=entries,
+            )
+            infile = "preload.root"
+
+        runner = processor.Runner(
+            executor=processor.FuturesExecutor(compression=None, workers=1),
+            schema=ScoutingSchema,
+            xrootdtimeout=60,
+            chunksize=10000,
+        )
+
+        output = runner.automatic_retries(
+            retries=3,
+            skipbadfiles=False,
+            func=runner.run,
+            fileset={options.dataset: [infile]},
+            treename="mmtree/tree",
+            processor_instance=instance,
+        )
 
-    runner.automatic_retries(
-        retries=3,
-        skipbadfiles=False,
-        func=runner.run,
-        fileset={options.dataset: ["rewrite.root"]},
-        treename="tree",
-        processor_instance=instance,
+    merger.merge(
+        options,
+        pattern="ntuple_*.hdf5",
+        outFile="out." + options.format,
     )
 
-    merger.merge(options, pattern="ntuple_*.hdf5", outFile="out.hdf5")
+    if instance.skim == "write":
+        cache.fill(options.infile, output)
 
-os.system("rm rewrite.root")
+    if infile == "preload.root":
+        os.remove("preload.root")
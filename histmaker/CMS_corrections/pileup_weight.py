@@ -55,14 +55,3 @@ def pileup_weight(era):
     )
 
     return weights, weights_plus, weights_minus
-
-
-def get_pileup_weights(df, sys, puweights, puweights_up, puweights_down):
-    Pileup_nTrueInt = np.array(df["Pileup_nTrueInt"]).astype(int)
-    if "puweights_up" in sys:
-        pu = puweights_up[Pileup_nTrueInt]
-    elif "puweights_down" in sys:
-        pu = puweights_down[Pileup_nTrueInt]
-    else:
-        pu = puweights[Pileup_nTrueInt]
-    return pu
@@ -0,0 +1,124 @@
+"""
+Per-era weight providers for the histmaker.
+The correction tables (pileup profiles, trigger scale factors, ...) are loaded once per
+process and era, the first time they are requested with get(), and shared by all the
+files and systematics filled by that process.
+weights(df) returns the nominal, up and down weights of the events of df together,
+with vectorized lookups, weight(df, syst) the one to use for the systematic syst, and
+weight_matrix(df, systs) those of several systematics at once.
+
+e.g.
+    puweights = weight_providers.get("pileup", options.era)
+    df["event_weight"] *= puweights.weight(df, syst)
+"""
+import abc
+import functools
+
+import numpy as np
+from CMS_corrections import higgs_reweight, pileup_weight, triggerSF
+
+
+class WeightProvider(abc.ABC):
+    # the systematics of this weight are <name>_up and <name>_down
+    name = ""
+
+    @abc.abstractmethod
+    def weights(self, df):
+        """nominal, up and down weights of the events of df"""
+
+    def weight(self, df, syst=""):
+        return self.weight_matrix(df, [syst])[syst]
+
+    def weight_matrix(self, df, systs, **kwargs):
+        """{syst: weight(df, syst)} for all of systs, evaluating the weights once"""
+        nominal, up, down = self.weights(df, **kwargs)
+        matrix = {}
+        for syst in systs:
+            if f"{self.name}_up" in syst:
+                matrix[syst] = up
+            elif f"{self.name}_down" in syst:
+                matrix[syst] = down
+            else:
+                matrix[syst] = nominal
+        return matrix
+
+
+class PileupWeights(WeightProvider):
+    name = "puweights"
+
+    def __init__(self, era):
+        self.tables = pileup_weight.pileup_weight(era)
+
+    def weights(self, df):
+        nTrueInt = np.array(df["Pileup_nTrueInt"]).astype(int)
+        return tuple(table[nTrueInt] for table in self.tables)
+
+
+class TriggerSF(WeightProvider):
+    name = "trigSF"
+
+    def __init__(self, era):
+        self.bins, *self.tables = triggerSF.triggerSF(era)
+
+    def weights(self, df):
+        ht = np.array(df["ht"]).astype(int)
+        ht_bin = np.digitize(ht, self.bins) - 1  # digitize the values to bins
+        ht_bin = np.clip(ht_bin, 0, 49)  # Set overl flow to last SF
+        return tuple(table[ht_bin] for table in self.tables)
+
+
+class ScoutTriggerSF(WeightProvider):
+    name = "trigSF"
+
+    def __init__(self, era):
+        self.bins = None
+        if "16" not in era:
+            self.bins, trigwgts, wgterr = np.loadtxt(
+                f"../data/trigSF/scout_trigSF_{era}.txt", delimiter=","
+            )
+            self.trigwgts = np.insert(trigwgts, 0, 0)
+            self.wgterr = np.insert(wgterr, 0, 0)
+
+    def weights(self, df):
+        if self.bins is None:
+            ones = np.ones(len(df))
+            return ones, ones, ones
+        htbin = np.digitize(np.array(df["ht"]).astype(int), self.bins)
+        nominal = np.take(self.trigwgts, htbin)
+        err = np.take(self.wgterr, htbin)
+        return nominal, nominal + err, nominal - err
+
+
+class HiggsWeights(WeightProvider):
+    """
+    Higgs pT reweighting, see higgs_reweight: the factors are fixed, but they are
+    normalized to keep the number of events of gen_pt, the SUEP_genPt of all the
+    events of the file (by default, those of df).
+    """
+
+    name = "higgs_weights"
+
+    def __init__(self, era=None):
+        # the factors are the same for all the eras, see higgs_reweight
+        pass
+
+    def weights(self, df, gen_pt=None):
+        if gen_pt is None:
+            gen_pt = df["SUEP_genPt"]
+        bins, *tables = higgs_reweight.higgs_reweight(gen_pt)
+        gen_bin = np.digitize(np.array(df["SUEP_genPt"]).astype(int), bins) - 1
+        return tuple(table[gen_bin] for table in tables)
+
+
+PROVIDERS = {
+    "pileup": PileupWeights,
+    "trigSF": TriggerSF,
+    "scout_trigSF": ScoutTriggerSF,
+    "higgs": HiggsWeights,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get(name, era):
+    """The provider name of PROVIDERS for an era, created once per process."""
+    return PROVIDERS[name](str(era))
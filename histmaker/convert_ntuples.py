@@ -0,0 +1,79 @@
+"""
+Convert HDF5 ntuples written in the (default) fixed format to the queryable PyTables
+table format, in place. The metadata is kept, and the analysis-critical columns
+(pandas_utils.H5_DATA_COLUMNS) are indexed as data columns, so that make_hists only
+reads the columns and the events it needs from them (see fill_utils.h5load).
+Files that are already in the table format are skipped, so it is safe to run again.
+
+e.g.
+python convert_ntuples.py --tag <tag> --sample <sample>
+python convert_ntuples.py --input /path/to/ntuples/ /path/to/another/file.hdf5
+"""
+import argparse
+import getpass
+import logging
+import os
+import sys
+
+from tqdm import tqdm
+
+sys.path.append("..")
+from workflows.utils import pandas_utils
+
+parser = argparse.ArgumentParser(description="Convert HDF5 ntuples to table format")
+parser.add_argument(
+    "-i",
+    "--input",
+    type=str,
+    nargs="*",
+    default=[],
+    help="HDF5 files, or directories of HDF5 files, to convert",
+)
+parser.add_argument("-sample", "--sample", type=str, default=None, help="sample name")
+parser.add_argument(
+    "-t", "--tag", type=str, default="IronMan", help="production tag", required=False
+)
+parser.add_argument(
+    "--dataDirLocal",
+    type=str,
+    default="/data/submit//cms/store/user/" + getpass.getuser() + "/SUEP/{}/{}/",
+    help="Local data directory, used with --tag and --sample",
+)
+parser.add_argument(
+    "--dataColumns",
+    type=str,
+    default=None,
+    help="Comma separated list of data columns (default: pandas_utils.H5_DATA_COLUMNS)",
+)
+options = parser.parse_args()
+
+logging.basicConfig(level=logging.INFO)
+
+inputs = list(options.input)
+if options.sample is not None:
+    inputs.append(options.dataDirLocal.format(options.tag, options.sample))
+files = []
+for path in inputs:
+    if os.path.isdir(path):
+        files += [os.path.join(path, f) for f in sorted(os.listdir(path))]
+    else:
+        files.append(path)
+files = [f for f in files if f.endswith(".hdf5")]
+
+data_columns = None
+if options.dataColumns is not None:
+    data_columns = options.dataColumns.split(",")
+
+nconverted = 0
+nfailed = 0
+for ifile in tqdm(files):
+    try:
+        if pandas_utils.h5_to_table(ifile, "vars", data_columns=data_columns):
+            nconverted += 1
+    except Exception as e:
+        logging.warning(f"Could not convert {ifile}: {e}")
+        nfailed += 1
+
+logging.info(
+    f"Converted {nconverted} files, {len(files) - nconverted - nfailed} were already tables, {nfailed} failed."
+)
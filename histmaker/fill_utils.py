@@ -1,6 +1,7 @@
 import json
 import logging
 import os
+import re
 import subprocess
 import sys
 from collections import defaultdict
@@ -10,50 +11,106 @@ import numpy as np
 import pandas as pd
 
 
-def h5load(ifile: str, label: str):
+def h5load(ifile: str, label: str, columns: list = None, where: str = None):
     """
     Load a pandas DataFrame from a HDF5 file, including metadata.
+    Only the columns (which exist in the file) are returned, and the selection where,
+    e.g. "(ht_JEC > 1200) & (ntracks > 0)", is applied to the events.
+    For stores in the PyTables table format, only those columns are read, and the
+    selection runs inside PyTables if it only uses data columns (see
+    pandas_utils.H5_DATA_COLUMNS). Otherwise, it is applied with DataFrame.query.
     Nota bene: metadata is unstable, we have found that using pandas==1.4.1 and pytables==3.7.0 works.
     """
     try:
         with pd.HDFStore(ifile, "r") as store:
             try:
-                data = store[label]
-                metadata = store.get_storer(label).attrs.metadata
+                storer = store.get_storer(label)
+                metadata = storer.attrs.metadata
+                if storer.is_table:
+                    all_columns = list(storer.non_index_axes[0][1])
+                else:
+                    data = store[label]
+                    all_columns = list(data.columns)
+                if where is not None and not where_columns(where) <= set(all_columns):
+                    where = None
+                if columns is not None:
+                    columns = set(columns)
+                    columns = [c for c in all_columns if c in columns]
+
+                if storer.is_table:
+                    if where is not None and where_columns(where) <= set(
+                        storer.data_columns
+                    ):
+                        data = store.select(label, where=where, columns=columns)
+                        return data, metadata
+                    read_columns = columns
+                    if where is not None and columns is not None:
+                        read_columns = set(columns) | where_columns(where)
+                        read_columns = [c for c in all_columns if c in read_columns]
+                    data = store.select(label, columns=read_columns)
+
+                if where is not None:
+                    data = data.query(where)
+                if columns is not None:
+                    data = data[columns]
                 return data, metadata
 
             except KeyError:
-                logging.warning("No key", label, ifile)
+                logging.warning(f"No key {label} in {ifile}")
                 return 0, 0
     except BaseException:
-        logging.warning("Some error occurred", ifile)
+        logging.warning(f"Some error occurred reading {ifile}")
         return 0, 0
 
 
-def open_ntuple(
-    ifile: str, redirector: str = "root://submit50.mit.edu/", xrootd: bool = False
-):
+def where_columns(where: str) -> set:
     """
-    Open a ntuple, either locally or on xrootd.
+    Variables used in a selection string, see h5load.
     """
-    if not xrootd and "root://" not in ifile:
-        return h5load(ifile, "vars")
-    else:
-        if "root://" in ifile:
-            xrd_file = ifile
-        else:
-            xrd_file = redirector + ifile
-        just_file = ifile.split("/")[-1].split(".")[0]
-        os.system(f"xrdcp -s {xrd_file} {just_file}.hdf5")
-        return h5load(just_file + ".hdf5", "vars")
+    return set(re.findall(r"(?<![\w.])[A-Za-z_]\w*", where))
+
+
+def filters_to_where(filters: list) -> str:
+    """
+    Selection string for h5load of filters, in the disjunctive normal form of pyarrow.
+    """
+    return " | ".join(
+        "(" + " & ".join(f"({var} {op} {value!r})" for var, op, value in conj) + ")"
+        for conj in filters
+    )
 
 
-def close_ntuple(ifile: str) -> None:
+def parquet_load(ifile: str, columns: list = None, filters: list = None):
     """
-    Delete the ntuple after it has been copied over via xrootd (see open_ntuple).
+    Load a pandas DataFrame from a Parquet file, including metadata, with
+    workflows/utils/pandas_utils.parquet_load (columns and filters as there).
+    Returns (0, 0) if the file can not be read, as h5load.
     """
-    just_file = ifile.split("/")[-1].split(".")[0]
-    os.system(f"rm {just_file}.hdf5")
+    # imported here: pandas_utils needs coffea, which the rest of fill_utils does not
+    from workflows.utils import pandas_utils
+
+    try:
+        return pandas_utils.parquet_load(ifile, columns, filters)
+    except Exception as e:
+        logging.warning(f"Some error occurred reading {ifile}: {e}")
+        return 0, 0
+
+
+def open_ntuple(ifile: str, columns: list = None, filters: list = None):
+    """
+    Open a local ntuple (HDF5 or Parquet), remote ones are copied over first by
+    prefetch.Prefetcher.
+    If columns is given, only those (which exist in the ntuple) are returned,
+    and filters, in the disjunctive normal form of pyarrow (see get_pushdown_filters),
+    are applied to the events.
+    For Parquet ntuples and HDF5 ntuples in the table format, both are pushed down
+    to the reader, so that only the needed columns and events are read.
+    """
+    if ifile.endswith(".parquet"):
+        return parquet_load(ifile, columns, filters)
+
+    where = filters_to_where(filters) if filters is not None else None
+    return h5load(ifile, "vars", columns=columns, where=where)
 
 
 def get_git_info(path="."):
@@ -149,6 +206,7 @@ def apply_scaling_weights(
     x_var="SUEP_S1_CL",
     y_var="SUEP_nconst_CL",
     z_var="ht",
+    weight_columns=["event_weight"],
 ):
     """
     df: input DataFrame to scale
@@ -156,6 +214,7 @@ def apply_scaling_weights(
     scaling_weights: nested dictionary, region x (bins or ratios)
     regions: string of ordered regions, used to apply corrections
     *_var: x/y are of the ABCD plane, z of the scaling histogram
+    weight_columns: columns of event weights to scale
     """
 
     x_var_regions = abcd["x_var_regions"]
@@ -188,12 +247,77 @@ def apply_scaling_weights(
                 yslice = (df[y_var] >= y_val_lo) & (df[y_var] < y_val_hi)
                 xslice = (df[x_var] >= x_val_lo) & (df[x_var] < x_val_hi)
 
-                df.loc[xslice & yslice & zslice, "event_weight"] *= ratio
+                df.loc[xslice & yslice & zslice, weight_columns] *= ratio
 
             iRegion += 1
     return df
 
 
+def compile_selections(
+    config: dict, label_out: str, blind: bool = True, isMC: bool = False
+) -> list:
+    """
+    Compile the selections of prepare_DataFrame into a list of steps, (cutflow key,
+    function of the DataFrame returning a boolean mask), in the order they apply:
+    1. events that passed this method (xvar is not null), if any defined,
+    2. blinding of the signal regions of data: SR, which is required, and SR2,
+    3. the selections, counted in the cutflow.
+    The steps that are not counted in the cutflow have a None key.
+    """
+    steps = []
+
+    # 1. keep only events that passed this method, if any defined
+    if config.get("xvar"):
+        xvar = config["xvar"]
+        steps.append((None, lambda df: df[xvar].notnull().to_numpy()))
+
+    # 2. blind
+    if blind and not isMC:
+        if "SR" not in config.keys():
+            sys.exit(
+                label_out
+                + ": Cannot blind the data without a signal region SR. Exiting."
+            )
+        steps.append((None, blinding_mask(config["SR"], label_out)))
+        if "SR2" in config.keys():
+            steps.append((None, blinding_mask(config["SR2"], label_out)))
+
+    # 3. apply selections
+    for sel in config.get("selections", []):
+        if type(sel) is str:
+            sel = sel.split(" ")
+        variable, operator, value = sel[0], sel[1], sel[2]
+        if type(value) is str and value.isdigit():
+            value = float(value)  # convert to float if it's a number
+
+        def mask(df, variable=variable, operator=operator, value=value):
+            if variable not in df.keys():
+                raise Exception(
+                    f"Trying to apply a cut on a variable {variable} that does not exist in the DataFrame"
+                )
+            return make_selection(df, variable, operator, value, apply=False).to_numpy()
+
+        # summed over the files
+        key = variable + "_" + operator + "_" + str(value) + "_" + label_out
+        steps.append((key, mask))
+
+    return steps
+
+
+def apply_selections(df: pd.DataFrame, steps: list, cutflow: dict = {}) -> np.ndarray:
+    """
+    Evaluate the steps of compile_selections on df, returns the mask of the selected
+    events. The cutflow counts are the events passing each step and all the previous
+    ones, from the running product of the masks.
+    """
+    mask = np.ones(df.shape[0], dtype=bool)
+    for key, step in steps:
+        mask &= step(df)
+        if key is not None:
+            cutflow[key] = cutflow.get(key, 0) + int(np.count_nonzero(mask))
+    return mask
+
+
 def prepare_DataFrame(
     df: pd.DataFrame,
     config: dict,
@@ -201,6 +325,7 @@ def prepare_DataFrame(
     blind: bool = True,
     isMC: bool = False,
     cutflow: dict = {},
+    columns: set = None,
 ) -> pd.DataFrame:
     """
     Applies blinding, selections, and makes new variables. See README.md for more details.
@@ -210,38 +335,26 @@ def prepare_DataFrame(
         config:  dictionary of definitions of ABCD regions, signal region, event selections.
         label_out: label associated with the output (e.g. "ISRRemoval"), as keys in
                    the config dictionary.
-        sys: str of systematic being applied.
+        columns: if given, only these columns (and the inputs of the new variables)
+                 are kept in the output.
 
-    OUTPUT: df: input DataFrame prepared for plotting
+    OUTPUT: df: new DataFrame, with the selected events, prepared for plotting
     """
 
-    # 1. keep only events that passed this method, if any defined
-    if config.get("xvar"):
-        if config["xvar"] not in df.columns:
-            return None
-        df = df[~df[config["xvar"]].isnull()]
-
-    # 2. blind
-    if blind and not isMC:
-        df = blind_DataFrame(df, label_out, config["SR"])
-        if "SR2" in config.keys():
-            df = blind_DataFrame(df, label_out, config["SR2"])
+    if config.get("xvar") and config["xvar"] not in df.columns:
+        return None
 
-    # 3. apply selections
-    if "selections" in config.keys():
-        for sel in config["selections"]:
-            if type(sel) is str:
-                sel = sel.split(" ")
-            if sel[0] not in df.keys():
-                raise Exception(
-                    f"Trying to apply a cut on a variable {sel[0]} that does not exist in the DataFrame"
-                )
-            if type(sel[2]) is str and sel[2].isdigit():
-                sel[2] = float(sel[2])  # convert to float if it's a number
-            df = make_selection(df, sel[0], sel[1], sel[2], apply=True)
-            cutflow[
-                sel[0] + "_" + sel[1] + "_" + str(sel[2]) + "_" + label_out
-            ] = df.shape[0]
+    # 1-3. the selections, evaluated as masks, the rows are copied only once
+    mask = apply_selections(
+        df, compile_selections(config, label_out, blind, isMC), cutflow
+    )
+    if columns is not None:
+        columns = set(columns)
+        for var in config.get("new_variables", []):
+            columns.update(var[2])
+        df = df.loc[mask, [c for c in df.columns if c in columns]]
+    else:
+        df = df.loc[mask]
 
     # 4. make new variables
     if "new_variables" in config.keys():
@@ -262,28 +375,209 @@ def make_new_variable(
     return df
 
 
-def fill_2d_distributions(df, output, label_out, input_method):
-    keys = list(output.keys())
-    keys_2Dhists = [k for k in keys if "2D" in k]
-    df_keys = list(df.keys())
+# operators of make_selection, as understood by the pyarrow filters
+FILTER_OPERATORS = {
+    "greater than": ">",
+    "gt": ">",
+    ">": ">",
+    "greater than or equal to": ">=",
+    ">=": ">=",
+    "less than": "<",
+    "lt": "<",
+    "<": "<",
+    "less than or equal to": "<=",
+    "<=": "<=",
+    "equal to": "==",
+    "eq": "==",
+    "==": "==",
+}
+
+
+def get_config_columns(config: dict) -> set:
+    """
+    Columns of the ntuple used by a config: ABCD variables, signal regions,
+    selections, and inputs of the new variables.
+    """
+    columns = set()
+    for key in ["xvar", "yvar"]:
+        if config.get(key):
+            columns.add(config[key])
+    for key in ["SR", "SR2", "selections"]:
+        for sel in config.get(key, []):
+            if type(sel) is str:
+                sel = sel.split(" ")
+            columns.add(sel[0])
+    for var in config.get("new_variables", []):
+        columns.update(var[2])
+    return columns
 
-    for key in keys_2Dhists:
-        if not key.endswith(label_out):
+
+def get_hist_columns(output: dict, label_out: str, input_method: str) -> set:
+    """
+    Columns of the ntuple that auto_fill can fill in the histograms of output
+    with label_out, following the naming of auto_fill and fill_2d_distributions.
+    """
+    columns = set()
+    suffix = "_" + label_out
+    for key in output.keys():
+        if not key.endswith(suffix):
             continue
-        string = key[
-            len("2D") + 1 : -(len(label_out) + 1)
-        ]  # cut out "2D_" and output label
-        var1 = string.split("_vs_")[0]
-        var2 = string.split("_vs_")[1]
-        if var1 not in df_keys:
-            var1 += "_" + input_method
-            if var1 not in df_keys:
-                continue
-        if var2 not in df_keys:
-            var2 += "_" + input_method
-            if var2 not in df_keys:
-                continue
-        output[key].fill(df[var1], df[var2], weight=df["event_weight"])
+        name = key[: -len(suffix)]
+        if name.startswith("2D_"):
+            variables = name[len("2D_") :].split("_vs_")
+        elif len(name) > 2 and name[0].isupper() and name[1] == "_":
+            # ABCD region, e.g. A_SUEP_S1
+            variables = [name, name[2:]]
+        else:
+            variables = [name]
+        for var in variables:
+            columns.update([var, var + "_" + input_method])
+    return columns
+
+
+def get_pushdown_filters(configs: list):
+    """
+    Selections that can be applied while reading the ntuples, in the disjunctive
+    normal form of pyarrow: the first selection of each config.
+    An event is only dropped if it fails all of them, so the histograms and the
+    cutflows of every config are unchanged.
+    Returns None if this is not possible, e.g. a config has no selections.
+    """
+    filters = []
+    for config in configs:
+        if len(config.get("selections", [])) == 0:
+            return None
+        sel = config["selections"][0]
+        if type(sel) is str:
+            sel = sel.split(" ")
+        value = sel[2]
+        if type(value) is str:
+            if not value.isdigit():
+                return None
+            value = float(value)
+        if sel[1] not in FILTER_OPERATORS:
+            return None
+        conj = [(sel[0], FILTER_OPERATORS[sel[1]], value)]
+        if conj not in filters:
+            filters.append(conj)
+    return filters if len(filters) > 0 else None
+
+
+def parse_2d_hist(key: str, label_out: str, input_method: str, columns) -> tuple:
+    """
+    Columns (var1, var2) filled in the 2D histogram key, 2D_<var1>_vs_<var2>_<label_out>,
+    trying var and var_<input_method>; None if they are not in columns.
+    """
+    string = key[
+        len("2D") + 1 : -(len(label_out) + 1)
+    ]  # cut out "2D_" and output label
+    var1 = string.split("_vs_")[0]
+    var2 = string.split("_vs_")[1]
+    if var1 not in columns:
+        var1 += "_" + input_method
+        if var1 not in columns:
+            return None
+    if var2 not in columns:
+        var2 += "_" + input_method
+        if var2 not in columns:
+            return None
+    return var1, var2
+
+
+# histograms that could not be bound to any column, reported once per process
+_unbound_reported = set()
+
+
+def compile_fill_plan(
+    output: dict,
+    columns,
+    config: dict,
+    label_out: str,
+    weights: dict = None,
+    do_abcd: bool = False,
+) -> list:
+    """
+    Bind the histograms of label_out declared in output to the columns of a DataFrame.
+    Returns the fill plan, a list of (histogram, columns, weight column, region):
+    - event wide variables, filled in <column>_<label>,
+    - method variables, <column>_<input_method> filled in <column>_<label>,
+    - 2D distributions, 2D_<var1>_vs_<var2>_<label>, see parse_2d_hist,
+    - if do_abcd, the variables in each region r (the region index, see
+      get_region_index), filled in <letter>_<histogram>, otherwise region is None.
+    weights maps output labels to weight columns, see auto_fill. The histograms of
+    label_out that are not bound are reported (once).
+    """
+    input_method = config["input_method"]
+    if weights is None:
+        weights = {label_out: "event_weight"}
+    columns = list(columns)
+
+    plan = []
+    bound = set()
+
+    def bind(names, cols, region=None):
+        # names(label) is the name of the histogram of label, filled if declared
+        for label, weight in weights.items():
+            name = names(label)
+            if name in output:
+                plan.append((output[name], cols, weight, region))
+                bound.add(name)
+
+    # 1. the distributions as they are saved in the dataframes
+    # 1a. event wide variables
+    event_plot_labels = [key for key in columns if key + "_" + label_out in output]
+    for plot in event_plot_labels:
+        bind(lambda label: plot + "_" + label, (plot,))
+
+    # 1b. method variables
+    method_plot_labels = [
+        key
+        for key in columns
+        if key.replace(input_method, label_out) in output and key.endswith(input_method)
+    ]
+    for plot in method_plot_labels:
+        bind(lambda label: plot.replace(input_method, label), (plot,))
+
+    # 2. some 2D distributions
+    for key in [k for k in output.keys() if "2D" in k and k.endswith(label_out)]:
+        cols = parse_2d_hist(key, label_out, input_method, columns)
+        if cols is not None:
+            bind(lambda label: key[: len(key) - len(label_out)] + label, cols)
+
+    # 3. the variables in each region
+    # by default, we only plot the ABCD variables in each region, to reduce the size of the output
+    # the option do_abcd created a histogram of each variable for each region
+    if do_abcd:
+        regions = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+        nregions = (len(config["xvar_regions"]) - 1) * (len(config["yvar_regions"]) - 1)
+        for iRegion in range(nregions):
+            r = regions[iRegion] + "_"
+            for plot in event_plot_labels:
+                if r + plot + "_" + label_out in output:
+                    bind(lambda label: r + plot + "_" + label, (plot,), iRegion)
+            for plot in method_plot_labels:
+                if r + plot.replace(input_method, label_out) in output:
+                    bind(
+                        lambda label: r + plot.replace(input_method, label),
+                        (plot,),
+                        iRegion,
+                    )
+
+    unbound = sorted(
+        key
+        for key in output.keys()
+        if key != "labels"
+        and key.endswith("_" + label_out)
+        and key not in bound
+        and key not in _unbound_reported
+    )
+    if unbound:
+        _unbound_reported.update(unbound)
+        logging.warning(
+            f"{len(unbound)} histograms of {label_out} have no matching columns, "
+            f"they will not be filled: {unbound}"
+        )
+    return plan
 
 
 def auto_fill(
@@ -293,103 +587,66 @@ def auto_fill(
     label_out: str,
     isMC: bool = False,
     do_abcd: bool = False,
+    weights: dict = None,
+    plans: dict = None,
 ) -> None:
-    input_method = config["input_method"]
+    """
+    Fill the histograms of label_out declared in output with the variables of df.
+    weights maps output labels to columns of event weights, to fill the histograms
+    of several weight variations (e.g. label_out_puweights_up) with the same events,
+    by default {label_out: "event_weight"}.
+    The fill plan (see compile_fill_plan) is compiled once per label and columns of
+    df, and kept in plans, if given, to be reused for the next DataFrames.
+    """
+    if weights is None:
+        weights = {label_out: "event_weight"}
 
     #####################################################################################
     # ---- Fill Histograms
     # Automatically fills all histograms that are declared in the output dict.
     #####################################################################################
 
-    # 1. fill the distributions as they are saved in the dataframes
-    # 1a. fill event wide variables
-    event_plot_labels = [
-        key for key in df.keys() if key + "_" + label_out in list(output.keys())
-    ]
-    for plot in event_plot_labels:
-        output[plot + "_" + label_out].fill(df[plot], weight=df["event_weight"])
-
-    # 1b. fill method variables
-    method_plot_labels = [
-        key
-        for key in df.keys()
-        if key.replace(input_method, label_out) in list(output.keys())
-        and key.endswith(input_method)
-    ]
-    for plot in method_plot_labels:
-        output[plot.replace(input_method, label_out)].fill(
-            df[plot], weight=df["event_weight"]
+    key = (label_out, tuple(df.columns), tuple(weights.items()), do_abcd)
+    plan = plans.get(key) if plans is not None else None
+    if plan is None:
+        plan = compile_fill_plan(
+            output, df.columns, config, label_out, weights, do_abcd
         )
+        if plans is not None:
+            plans[key] = plan
 
-    # 2. fill some 2D distributions
-    fill_2d_distributions(df, output, label_out, input_method)
-
-    # 3. divide the dfs by region
+    # indices of the events of each region, from a single sort of the region index
     if do_abcd:
-        regions = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-        xvar = config["xvar"]
-        yvar = config["yvar"]
-        xvar_regions = config["xvar_regions"]
-        yvar_regions = config["yvar_regions"]
-        iRegion = 0
-        for i in range(len(xvar_regions) - 1):
-            x_val_lo = xvar_regions[i]
-            x_val_hi = xvar_regions[i + 1]
-
-            for j in range(len(yvar_regions) - 1):
-                r = regions[iRegion] + "_"
-
-                y_val_lo = yvar_regions[j]
-                y_val_hi = yvar_regions[j + 1]
-
-                x_cut = make_selection(
-                    df, xvar, ">=", x_val_lo, False
-                ) & make_selection(df, xvar, "<", x_val_hi, False)
-                y_cut = make_selection(
-                    df, yvar, ">=", y_val_lo, False
-                ) & make_selection(df, yvar, "<", y_val_hi, False)
-                df_r = df.loc[(x_cut & y_cut)]
-
-                # double check the region is defined correctly
-                assert (
-                    df_r[
-                        (df_r[xvar] > float(x_val_hi)) | (df_r[xvar] < float(x_val_lo))
-                    ].shape[0]
-                    == 0
-                )
+        nregions = (len(config["xvar_regions"]) - 1) * (len(config["yvar_regions"]) - 1)
+        region_index = get_region_index(df, config)
+        order = np.argsort(region_index, kind="stable")
+        bounds = np.searchsorted(region_index[order], np.arange(nregions + 1))
+
+    values = {}
+    for hist, cols, weight, region in plan:
+        for col in cols + (weight,):
+            if col not in values:
+                values[col] = df[col].to_numpy()
+        if region is None:
+            hist.fill(*[values[col] for col in cols], weight=values[weight])
+        else:
+            idx = order[bounds[region] : bounds[region + 1]]
+            hist.fill(*[values[col][idx] for col in cols], weight=values[weight][idx])
 
-                # double check blinding
-                if (
-                    iRegion == (len(xvar_regions) - 1) * (len(yvar_regions) - 1)
-                    and not isMC
-                ):
-                    if df_r.shape[0] > 0:
-                        sys.exit(
-                            label_out + ": You are not blinding correctly! Exiting."
-                        )
-
-                # by default, we only plot the ABCD variables in each region, to reduce the size of the output
-                # the option do_abcd created a histogram of each variable for each region
-
-                # 3a. fill event wide variables
-                for plot in event_plot_labels:
-                    if r + plot + "_" + label_out not in list(output.keys()):
-                        continue
-                    output[r + plot + "_" + label_out].fill(
-                        df_r[plot], weight=df_r["event_weight"]
-                    )
 
-                # 3b. fill method variables
-                for plot in method_plot_labels:
-                    if r + plot.replace(input_method, label_out) not in list(
-                        output.keys()
-                    ):
-                        continue
-                    output[r + plot.replace(input_method, label_out)].fill(
-                        df_r[plot], weight=df_r["event_weight"]
-                    )
-
-                iRegion += 1
+def get_region_index(df: pd.DataFrame, config: dict) -> np.ndarray:
+    """
+    ABCD region of each event of df, as the index iRegion = i * ny + j of the x bin i
+    and y bin j (in [lo, hi) of xvar_regions and yvar_regions), the same ordering as
+    the region letters. Events outside of all regions (or NaN) get the number of
+    regions, nx * ny.
+    """
+    x_bin = np.digitize(df[config["xvar"]].to_numpy(), config["xvar_regions"]) - 1
+    y_bin = np.digitize(df[config["yvar"]].to_numpy(), config["yvar_regions"]) - 1
+    nx = len(config["xvar_regions"]) - 1
+    ny = len(config["yvar_regions"]) - 1
+    inside = (x_bin >= 0) & (x_bin < nx) & (y_bin >= 0) & (y_bin < ny)
+    return np.where(inside, x_bin * ny + y_bin, nx * ny)
 
 
 def apply_normalization(plots: dict, norm: float) -> dict:
@@ -444,11 +701,10 @@ def read_in_weights(fweights):
     return scaling_weights
 
 
-def blind_DataFrame(df: pd.DataFrame, label_out: str, SR: list) -> pd.DataFrame:
+def blinding_mask(SR: list, label_out: str):
     """
-    Blind a DataFrame df by removing events that pass the signal region SR definition.
-    Expects a SR defined as a list of lists,
-    e.g. SR = [["SUEP_S1_CL", ">=", 0.5], ["SUEP_nconst_CL", ">=", 70]],
+    Function of a DataFrame returning the mask of the events outside of the signal
+    region SR, see blind_DataFrame.
     """
     if len(SR) != 2:
         sys.exit(
@@ -457,10 +713,20 @@ def blind_DataFrame(df: pd.DataFrame, label_out: str, SR: list) -> pd.DataFrame:
             For now we only support a two-variable SR, because of the way
             this function was written. Exiting."""
         )
-    df = df.loc[
-        ~(
+
+    def mask(df):
+        return ~(
             make_selection(df, SR[0][0], SR[0][1], SR[0][2], apply=False)
             & make_selection(df, SR[1][0], SR[1][1], SR[1][2], apply=False)
-        )
-    ]
-    return df
+        ).to_numpy()
+
+    return mask
+
+
+def blind_DataFrame(df: pd.DataFrame, label_out: str, SR: list) -> pd.DataFrame:
+    """
+    Blind a DataFrame df by removing events that pass the signal region SR definition.
+    Expects a SR defined as a list of lists,
+    e.g. SR = [["SUEP_S1_CL", ">=", 0.5], ["SUEP_nconst_CL", ">=", 70]],
+    """
+    return df.loc[blinding_mask(SR, label_out)(df)]
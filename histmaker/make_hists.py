@@ -1,6 +1,6 @@
 """
 Automatic histogram maker from the ntuples.
-This script can make histograms for either a particular file, or a whole directory/sample of files (files here are intended as the ntuple hdf5 files).
+This script can make histograms for either a particular file, or a whole directory/sample of files (files here are intended as the ntuple hdf5 or parquet files).
 It will fill all histograms that are part of the output dictionary (initialized in hist_defs.py), if it finds a matching variable in the ntuple dataframe.
 (If doing an ABCD method, it will also fill each variable for each region.)
 It can apply selections, blind, apply corrections and systematics, do ABCD method, make cutflows, and more.
@@ -10,8 +10,10 @@ e.g.
 python make_hists.py --sample <sample> --output <output_tag> --tag <tag> --era <year> --isMC <bool> --doSyst <bool> --channel <channel>
 """
 import argparse
+import functools
 import getpass
 import logging
+import multiprocessing
 import os
 import subprocess
 import sys
@@ -23,13 +25,8 @@ from tqdm import tqdm
 sys.path.append("..")
 import fill_utils
 import hist_defs
-from CMS_corrections import (
-    GNN_syst,
-    higgs_reweight,
-    pileup_weight,
-    track_killing,
-    triggerSF,
-)
+import prefetch
+from CMS_corrections import GNN_syst, track_killing, weight_providers
 
 import plotting.plot_utils
 
@@ -127,6 +124,41 @@ def makeParser(parser=None):
         help="xrootd redirector",
         required=False,
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes filling the histograms, each on a part of the files (default=1)",
+        required=False,
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=2,
+        help="Number of files to copy in the background with xrootd, while filling (default=2)",
+        required=False,
+    )
+    parser.add_argument(
+        "--scratchDir",
+        type=str,
+        default=".",
+        help="Local directory for the files copied with xrootd",
+        required=False,
+    )
+    parser.add_argument(
+        "--scratchBudget",
+        type=float,
+        default=-1,
+        help="Maximum size in GB of the files copied with xrootd waiting to be filled (default=None, no limit)",
+        required=False,
+    )
+    parser.add_argument(
+        "--transferTimeout",
+        type=float,
+        default=600,
+        help="Timeout in seconds of each xrootd transfer attempt (default=600)",
+        required=False,
+    )
     parser.add_argument(
         "--maxFiles",
         type=int,
@@ -147,102 +179,108 @@ def makeParser(parser=None):
 ### Main plotting function  ######################################################################################
 
 
-def plot_systematic(df, metadata, config, syst, options, output, cutflow={}):
-    # we might modify this for systematics, so make a copy
-    config = config.copy()
+def get_event_weights(df, metadata, systs, options, higgs_genPt=None):
+    """
+    Event weights of each systematic in systs ("" for nominal), as a dict of columns:
+    the (events x variations) weight matrix. Each correction is evaluated once, for
+    all of its variations together.
+    higgs_genPt is the SUEP_genPt of all the events of the file, over which the Higgs
+    pT weights are normalized, if df is only part of them (see fill_files).
+    """
+    if not options.isMC:
+        return {syst: np.ones(df.shape[0]) for syst in systs}
 
-    # prepare new event weight
-    if options.isMC:
-        df["event_weight"] = df["genweight"].to_numpy()
-    else:
-        df["event_weight"] = np.ones(df.shape[0])
-
-    # apply systematics and weights
-    if options.isMC == 1:
-        if options.channel == "ggF":
-            # 1) pileup weights
-            puweights, puweights_up, puweights_down = pileup_weight.pileup_weight(
-                options.era
-            )
-            pu = pileup_weight.get_pileup_weights(
-                df, syst, puweights, puweights_up, puweights_down
+    weights = {syst: df["genweight"].to_numpy() for syst in systs}
+
+    def apply(factors):
+        for syst in systs:
+            weights[syst] = weights[syst] * factors[syst]
+
+    def columns(nominal, name):
+        # systematics stored as columns of the ntuples, e.g. prefire_up
+        return {
+            syst: (
+                df[syst].to_numpy() if name in syst and syst in df.keys() else nominal
             )
-            df["event_weight"] *= pu
-
-            if options.scouting != 1:
-                # 2) TriggerSF weights
-                (
-                    trig_bins,
-                    trig_weights,
-                    trig_weights_up,
-                    trig_weights_down,
-                ) = triggerSF.triggerSF(options.era)
-                trigSF = triggerSF.get_trigSF_weight(
-                    df,
-                    syst,
-                    trig_bins,
-                    trig_weights,
-                    trig_weights_up,
-                    trig_weights_down,
-                )
-                df["event_weight"] *= trigSF
+            for syst in systs
+        }
 
-                # 4) prefire weights
-                if options.era == "2016" or options.era == "2017":
-                    if "prefire" in syst and syst in df.keys():
-                        df["event_weight"] *= df[syst]
-                    else:
-                        df["event_weight"] *= df["prefire_nom"]
+    if options.channel == "ggF":
+        # 1) pileup weights
+        apply(weight_providers.get("pileup", options.era).weight_matrix(df, systs))
 
-            else:
-                # 2) TriggerSF weights
-                trigSF = triggerSF.get_scout_trigSF_weight(
-                    np.array(df["ht"]).astype(int), syst, options.era
-                )
-                df["event_weight"] *= trigSF
+        if options.scouting != 1:
+            # 2) TriggerSF weights
+            trigSF = weight_providers.get("trigSF", options.era)
+            apply(trigSF.weight_matrix(df, systs))
 
-                # 4) prefire weights
-                # no prefire weights for scouting
+            # 4) prefire weights
+            if options.era == "2016" or options.era == "2017":
+                apply(columns(df["prefire_nom"].to_numpy(), "prefire"))
 
-            # 4) PS weights
-            if "PSWeight" in syst and syst in df.keys():
-                df["event_weight"] *= df[syst]
+        else:
+            # 2) TriggerSF weights
+            trigSF = weight_providers.get("scout_trigSF", options.era)
+            apply(trigSF.weight_matrix(df, systs))
+
+            # 4) prefire weights
+            # no prefire weights for scouting
+
+        # 4) PS weights
+        apply(columns(1.0, "PSWeight"))
+
+        # 5) Higgs_pt weights
+        if "mS125" in metadata["sample"]:
+            higgs = weight_providers.get("higgs", options.era)
+            apply(higgs.weight_matrix(df, systs, gen_pt=higgs_genPt))
+
+    elif options.channel == "WH":
+        pass
+        # FILL IN
+        # should we keep these separate or try to, as much as possible, use the same code for systematics for both channels?
+        # which systematics are applied and which aren't should be defined outside IMO, as is now
+        # and in here we should just apply them as much as possible in the same way
+        # with flags for the differences
+
+    return weights
+
+
+def plot_systematic(
+    df,
+    metadata,
+    config,
+    syst,
+    options,
+    output,
+    cutflow={},
+    weight_systs=[],
+    fill_plans=None,
+    higgs_genPt=None,
+):
+    """
+    Fill the histograms of a systematic (or nominal, for syst ""). The systematics of
+    weight_systs, which only change the event weights, share its selections: they
+    are filled in the same pass, each with its own column of event weights.
+    fill_plans caches the fill plans of output across files, see fill_utils.auto_fill.
+    higgs_genPt normalizes the Higgs pT weights, see get_event_weights.
+    """
+    # we might modify this for systematics, so make a copy
+    config = config.copy()
 
-            # 5) Higgs_pt weights
-            if "mS125" in metadata["sample"]:
-                (
-                    higgs_bins,
-                    higgs_weights,
-                    higgs_weights_up,
-                    higgs_weights_down,
-                ) = higgs_reweight.higgs_reweight(df["SUEP_genPt"])
-                higgs_weight = higgs_reweight.get_higgs_weight(
-                    df,
-                    syst,
-                    higgs_bins,
-                    higgs_weights,
-                    higgs_weights_up,
-                    higgs_weights_down,
-                )
-                df["event_weight"] *= higgs_weight
-
-            # 6) track killing
-            if "track_down" in syst:
-                # update configuration to cut on track_down variables
-                config = fill_utils.get_track_killing_config(config)
-
-            # 7) jet energy corrections
-            if any([j in syst for j in ["JER", "JES"]]):
-                # update configuration to cut on jet energy correction variables
-                config = fill_utils.get_jet_correction_config(config, syst)
-
-        elif options.channel == "WH":
-            pass
-            # FILL IN
-            # should we keep these separate or try to, as much as possible, use the same code for systematics for both channels?
-            # which systematics are applied and which aren't should be defined outside IMO, as is now
-            # and in here we should just apply them as much as possible in the same way
-            # with flags for the differences
+    # prepare new event weights, one column per variation
+    weight_columns = {"": "event_weight"}
+    weight_columns.update({w: "event_weight_" + w for w in weight_systs})
+    weights = get_event_weights(
+        df, metadata, [syst] + weight_systs, options, higgs_genPt
+    )
+    df["event_weight"] = weights[syst]
+    for w in weight_systs:
+        df[weight_columns[w]] = weights[w]
+
+    # 6) track killing and 7) jet energy corrections
+    # update configuration to cut on the track_down/jet energy correction variables
+    if options.isMC == 1 and options.channel == "ggF":
+        config = get_syst_config(config, syst)
 
     # scaling weights
     # N.B.: these are just an optional, arbitrary scaling of weights you're passing in
@@ -256,6 +294,7 @@ def plot_systematic(df, metadata, config, syst, options, output, cutflow={}):
             x_var="SUEP_S1_CL",
             y_var="SUEP_nconst_CL",
             z_var="ht",
+            weight_columns=list(weight_columns.values()),
         )
 
     for label_out, config_out in config.items():
@@ -263,18 +302,38 @@ def plot_systematic(df, metadata, config, syst, options, output, cutflow={}):
         if len(syst) > 0:
             label_out = label_out + "_" + syst
 
-        # initialize new hists for this output tag, if we haven't already
-        hist_defs.initialize_histograms(output, label_out, options, config_out)
+        # output label of each weight variation -> its column of weights
+        labels = {
+            (label_out + "_" + w if w else label_out): column
+            for w, column in weight_columns.items()
+        }
+
+        # initialize new hists for these output tags, if we haven't already
+        for label in labels:
+            hist_defs.initialize_histograms(output, label, options, config_out)
 
         # prepare the DataFrame for plotting: blind, selections, new variables
+        # only the selected events, and the columns that can be filled, are copied
+        columns = fill_utils.get_hist_columns(
+            output, label_out, config_out["input_method"]
+        )
+        columns |= fill_utils.get_config_columns(config_out)
+        columns |= set(labels.values())
+        passed = {}
         df_plot = fill_utils.prepare_DataFrame(
-            df.copy(),
+            df,
             config_out,
             label_out,
             isMC=options.isMC,
             blind=options.blind,
-            cutflow=cutflow,
+            cutflow=passed,
+            columns=columns,
         )
+        # the selections are the same for all the weight variations
+        for label in labels:
+            for key, n in passed.items():
+                key = key[: -len(label_out)] + label
+                cutflow[key] = cutflow.get(key, 0) + n
 
         # auto fill all histograms
         fill_utils.auto_fill(
@@ -284,20 +343,127 @@ def plot_systematic(df, metadata, config, syst, options, output, cutflow={}):
             label_out,
             isMC=options.isMC,
             do_abcd=options.doABCD,
+            weights=labels,
+            plans=fill_plans,
         )
 
+    # the next systematics start from the original columns
+    df.drop(columns=[weight_columns[w] for w in weight_systs], inplace=True)
 
-def main():
-    parser = makeParser()
-    options = parser.parse_args()
 
-    logging.basicConfig(level=logging.INFO)
-    if options.verbose:
-        logging.getLogger().setLevel(logging.DEBUG)
+def get_systematics(options, sample=None):
+    """
+    Systematics to loop over for a sample. If sample is None, all the systematics
+    that can be run for this channel are returned.
+    """
+    sys_loop = []
+    if options.channel == "ggF":
+        sys_loop = [
+            "puweights_up",
+            "puweights_down",
+            "trigSF_up",
+            "trigSF_down",
+            "PSWeight_ISR_up",
+            "PSWeight_ISR_down",
+            "PSWeight_FSR_up",
+            "PSWeight_FSR_down",
+            "track_down",
+            "JER_up",
+            "JER_down",
+            "JES_up",
+            "JES_down",
+        ]
+        if sample is None or "mS125" in sample:
+            sys_loop += [
+                "higgs_weights_up",
+                "higgs_weights_down",
+            ]
+        if options.scouting == 0:
+            sys_loop += [
+                "prefire_up",
+                "prefire_down",
+            ]
+    elif options.channel == "WH":
+        sys_loop = [
+            "puweights_up",
+            "puweights_down",
+            "PSWeight_ISR_up",
+            "PSWeight_ISR_down",
+            "PSWeight_FSR_up",
+            "PSWeight_FSR_down",
+            "prefire_up",
+            "prefire_down",
+            "track_down",
+            "JER_up",
+            "JER_down",
+            "JES_up",
+            "JES_down",
+        ]
+        if sample is None or "mS125" in sample:
+            sys_loop += [
+                "higgs_weights_up",
+                "higgs_weights_down",
+            ]
+    return sys_loop
+
+
+def is_shape_systematic(syst):
+    """
+    Systematics that change the selected events and variables (see get_syst_config),
+    and need their own pass; the others only change the event weights.
+    """
+    return "track_down" in syst or any([j in syst for j in ["JER", "JES"]])
+
+
+def get_syst_config(config, syst):
+    """
+    Update the configuration to cut on the track_down or jet energy correction
+    variables, for those systematics.
+    """
+    if "track_down" in syst:
+        config = fill_utils.get_track_killing_config(config)
+    if any([j in syst for j in ["JER", "JES"]]):
+        config = fill_utils.get_jet_correction_config(config, syst)
+    return config
+
+
+def get_ntuple_columns(config, options):
+    """
+    Columns of the ntuples needed to make the histograms, selections, and weights
+    of the configuration, for all the systematics, and the selections that can be
+    applied while reading the ntuples (see fill_utils.get_pushdown_filters).
+    """
+    # used for the event weights
+    columns = {"empty", "genweight", "Pileup_nTrueInt", "ht", "SUEP_genPt"}
+    columns.update(["prefire_nom", "SUEP_S1_CL", "SUEP_nconst_CL"])
+    configs = []
+    systs = [""]
+    if options.isMC and options.doSyst:
+        systs += get_systematics(options)
+    for syst in systs:
+        # weights of the systematic
+        columns.add(syst)
+        syst_config = config
+        if options.isMC and options.channel == "ggF":
+            syst_config = get_syst_config(config, syst)
+        for label_out, config_out in syst_config.items():
+            if len(syst) > 0:
+                label_out = label_out + "_" + syst
+            hists = {"labels": []}
+            hist_defs.initialize_histograms(hists, label_out, options, config_out)
+            columns |= fill_utils.get_hist_columns(
+                hists, label_out, config_out["input_method"]
+            )
+            columns |= fill_utils.get_config_columns(config_out)
+            configs.append(config_out)
+    columns.discard("")
+    return sorted(columns), fill_utils.get_pushdown_filters(configs)
+
+
+### Script Parameters ############################################################################################
 
-    ##################################################################################################################
-    # Script Parameters
-    ##################################################################################################################
+
+def get_config(options):
     """
     Define output plotting methods, each draws from an input_method (outputs of SUEPCoffea),
     and can have its own selections, ABCD regions, and signal region.
@@ -401,53 +567,69 @@ def main():
                 }
             )
 
-    ### Script preamble and set up ###################################################################################
+    return config
+
+
+def fill_files(files, options):
+    """
+    Fill the histograms for a list of ntuple files.
+    Returns a dictionary of the histograms (output), the cutflow, the total gensumweight,
+    the sample, and the number of files that failed to be read, see merge_results.
+    """
+    config = get_config(options)
+
+    # only read the columns, and events, that can end up in the histograms
+    columns, filters = get_ntuple_columns(config, options)
+    logging.debug(f"Reading {len(columns)} columns, with filters {filters}.")
 
     # variables that will be filled
     nfailed = 0
-    ntotal = 0
     total_gensumweight = 0
     output = {"labels": []}
     cutflow = {}
+    sample = None
 
-    # get list of files
-    if options.file:
-        files = [options.file]
-    elif options.xrootd:
-        dataDir = (
-            options.dataDirXRootD.format(options.tag, options.sample)
-            if options.dataDirXRootD.count("{}") == 2
-            else options.dataDirXRootD
+    # how the histograms of output are filled, compiled once per label and columns
+    fill_plans = {}
+
+    # remote files are copied in the background, while the previous ones are filled
+    if options.xrootd or any(["root://" in f for f in files]):
+        ntuples = prefetch.Prefetcher(
+            files,
+            prefetch.XRootDTransport(options.redirector),
+            nprefetch=options.prefetch,
+            scratch_dir=options.scratchDir,
+            # the scratch budget is shared by all the workers
+            scratch_budget=(
+                options.scratchBudget * 1e9 / max(1, options.workers)
+                if options.scratchBudget > 0
+                else None
+            ),
+            timeout=options.transferTimeout,
         )
-        if options.merged:
-            dataDir += "/merged/"
-        result = subprocess.check_output(["xrdfs", options.redirector, "ls", dataDir])
-        result = result.decode("utf-8")
-        files = result.split("\n")
-        files = [f for f in files if len(f) > 0]
     else:
-        dataDir = (
-            options.dataDirLocal.format(options.tag, options.sample)
-            if options.dataDirLocal.count("{}") == 2
-            else options.dataDir
-        )
-        if options.merged:
-            dataDir += "merged/"
-        files = [dataDir + f for f in os.listdir(dataDir)]
-    if options.maxFiles > 0:
-        files = files[: options.maxFiles]
-    files = [f for f in files if ".hdf5" in f]
-    ntotal = len(files)
+        ntuples = [(f, f) for f in files]
 
-    ### Plotting loop ################################################################################################
+    for ifile, local_file in tqdm(
+        ntuples, total=len(files), disable=options.workers > 1
+    ):
+        if local_file is None:
+            nfailed += 1
+            logging.warning(f"Could not copy file {ifile}, skipping.")
+            continue
 
-    logging.info("Setup ready, filling histograms now.")
+        # the Higgs pT weights are normalized over all the events of the file, not
+        # only those passing the filters: mS125 files (and the first file, before the
+        # sample is known) are read without them, and they are applied in memory
+        read_filters = filters
+        if options.isMC and (sample is None or "mS125" in sample):
+            read_filters = None
 
-    sample = None
-    for ifile in tqdm(files):
         # get the file
         df, metadata = fill_utils.open_ntuple(
-            ifile, redirector=options.redirector, xrootd=options.xrootd
+            local_file,
+            columns=columns,
+            filters=read_filters,
         )
         logging.debug(f"Opened file {ifile}")
 
@@ -485,6 +667,13 @@ def main():
         if "empty" in list(df.keys()):
             logging.debug("No events passed the selections, skipping.")
             continue
+
+        higgs_genPt = None
+        if filters is not None and read_filters is None:
+            if "mS125" in metadata["sample"]:
+                higgs_genPt = df["SUEP_genPt"].to_numpy()
+            df = df.query(fill_utils.filters_to_where(filters))
+
         if df.shape[0] == 0:
             logging.debug("No events in file, skipping.")
             continue
@@ -492,65 +681,158 @@ def main():
         # define which systematics to loop over
         sys_loop = []
         if options.isMC and options.doSyst:
-            if options.channel == "ggF":
-                sys_loop = [
-                    "puweights_up",
-                    "puweights_down",
-                    "trigSF_up",
-                    "trigSF_down",
-                    "PSWeight_ISR_up",
-                    "PSWeight_ISR_down",
-                    "PSWeight_FSR_up",
-                    "PSWeight_FSR_down",
-                    "track_down",
-                    "JER_up",
-                    "JER_down",
-                    "JES_up",
-                    "JES_down",
-                ]
-                if "mS125" in metadata["sample"]:
-                    sys_loop += [
-                        "higgs_weights_up",
-                        "higgs_weights_down",
-                    ]
-                if options.scouting == 0:
-                    sys_loop += [
-                        "prefire_up",
-                        "prefire_down",
-                    ]
-            elif options.channel == "WH":
-                sys_loop = [
-                    "puweights_up",
-                    "puweights_down",
-                    "PSWeight_ISR_up",
-                    "PSWeight_ISR_down",
-                    "PSWeight_FSR_up",
-                    "PSWeight_FSR_down",
-                    "prefire_up",
-                    "prefire_down",
-                    "track_down",
-                    "JER_up",
-                    "JER_down",
-                    "JES_up",
-                    "JES_down",
-                ]
-                if "mS125" in metadata["sample"]:
-                    sys_loop += [
-                        "higgs_weights_up",
-                        "higgs_weights_down",
-                    ]
-
-        logging.debug("Running nominal histograms.")
-        plot_systematic(df, metadata, config, "", options, output, cutflow)
+            sys_loop = get_systematics(options, metadata["sample"])
+
+        # the weight-only systematics are filled with the nominal histograms
+        weight_systs = [syst for syst in sys_loop if not is_shape_systematic(syst)]
+        logging.debug(f"Running nominal histograms, and systematics {weight_systs}.")
+        plot_systematic(
+            df,
+            metadata,
+            config,
+            "",
+            options,
+            output,
+            cutflow,
+            weight_systs,
+            fill_plans,
+            higgs_genPt,
+        )
 
         for syst in sys_loop:
+            if not is_shape_systematic(syst):
+                continue
             logging.debug(f"Running systematic {syst}")
-            plot_systematic(df, metadata, config, syst, options, output, cutflow)
+            plot_systematic(
+                df,
+                metadata,
+                config,
+                syst,
+                options,
+                output,
+                cutflow,
+                fill_plans=fill_plans,
+                higgs_genPt=higgs_genPt,
+            )
+
+    return {
+        "output": output,
+        "cutflow": cutflow,
+        "gensumweight": total_gensumweight,
+        "sample": sample,
+        "nfailed": nfailed,
+    }
+
+
+def merge_results(a, b):
+    """
+    Merge two results of fill_files: add the histograms, cutflows, gensumweights,
+    and failed files.
+    """
+    if a["sample"] is not None and b["sample"] is not None:
+        assert (
+            a["sample"] == b["sample"]
+        ), "This script should only run on one sample at a time."
+    output = dict(a["output"])
+    for k, v in b["output"].items():
+        if k == "labels":
+            output[k] = output[k] + [l for l in v if l not in output[k]]
+        elif k in output:
+            output[k] = output[k] + v
+        else:
+            output[k] = v
+    cutflow = dict(a["cutflow"])
+    for k, v in b["cutflow"].items():
+        cutflow[k] = cutflow[k] + v if k in cutflow else v
+    return {
+        "output": output,
+        "cutflow": cutflow,
+        "gensumweight": a["gensumweight"] + b["gensumweight"],
+        "sample": a["sample"] if a["sample"] is not None else b["sample"],
+        "nfailed": a["nfailed"] + b["nfailed"],
+    }
+
+
+def tree_reduce(results, merge):
+    """
+    Merge a list of results pairwise, (0, 1), (2, 3), ..., then again on the merged
+    results, until one is left. The order of the additions only depends on the
+    length of the list, so the output is reproducible.
+    """
+    while len(results) > 1:
+        results = [
+            merge(results[i], results[i + 1]) if i + 1 < len(results) else results[i]
+            for i in range(0, len(results), 2)
+        ]
+    return results[0]
+
+
+def main():
+    parser = makeParser()
+    options = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if options.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    ### Script preamble and set up ###################################################################################
+
+    # get list of files
+    if options.file:
+        files = [options.file]
+    elif options.xrootd:
+        dataDir = (
+            options.dataDirXRootD.format(options.tag, options.sample)
+            if options.dataDirXRootD.count("{}") == 2
+            else options.dataDirXRootD
+        )
+        if options.merged:
+            dataDir += "/merged/"
+        result = subprocess.check_output(["xrdfs", options.redirector, "ls", dataDir])
+        result = result.decode("utf-8")
+        files = result.split("\n")
+        files = [f for f in files if len(f) > 0]
+    else:
+        dataDir = (
+            options.dataDirLocal.format(options.tag, options.sample)
+            if options.dataDirLocal.count("{}") == 2
+            else options.dataDir
+        )
+        if options.merged:
+            dataDir += "merged/"
+        files = [dataDir + f for f in os.listdir(dataDir)]
+    if options.maxFiles > 0:
+        files = files[: options.maxFiles]
+    files = [f for f in files if ".hdf5" in f or ".parquet" in f]
+    ntotal = len(files)
+
+    ### Plotting loop ################################################################################################
 
-        # remove file at the end of loop
-        if options.xrootd:
-            logging.debug(f"Removing file {ifile}")
-            fill_utils.close_ntuple(ifile)
+    logging.info("Setup ready, filling histograms now.")
+
+    if options.workers > 1 and len(files) > 1:
+        # split the files in contiguous groups, one per worker, and merge what they fill
+        nworkers = min(options.workers, len(files))
+        groups = [
+            list(g) for g in np.array_split(np.array(files, dtype=object), nworkers)
+        ]
+        with multiprocessing.Pool(nworkers) as pool:
+            results = list(
+                tqdm(
+                    pool.imap(functools.partial(fill_files, options=options), groups),
+                    total=len(groups),
+                )
+            )
+        result = tree_reduce(results, merge_results)
+    else:
+        result = fill_files(files, options)
+
+    config = get_config(options)
+    output = result["output"]
+    cutflow = result["cutflow"]
+    total_gensumweight = result["gensumweight"]
+    sample = result["sample"]
+    nfailed = result["nfailed"]
 
     if nfailed > 0:
         logging.warning("Number of files that failed to be read: " + str(nfailed))
@@ -1,14 +1,16 @@
 import argparse
 import getpass
-import multiprocessing
 import os
 import subprocess
 import sys
 
 import fill_utils
-import pandas as pd
+import prefetch
 from tqdm import tqdm
 
+sys.path.append("..")
+from workflows.utils.merger import NtupleMerger
+
 parser = argparse.ArgumentParser(description="Famous Submitter")
 parser.add_argument(
     "-sample", "--sample", type=str, default="QCD", help="sample name", required=True
@@ -17,6 +19,25 @@ parser.add_argument(
     "-t", "--tag", type=str, default="IronMan", help="production tag", required=False
 )
 parser.add_argument("--isMC", type=int, default=1, help="Is this MC or data")
+parser.add_argument(
+    "--maxEvents",
+    type=int,
+    default=5000000,
+    help="Number of events after which a new merged file is started",
+)
+parser.add_argument(
+    "--format",
+    type=str,
+    default="hdf5",
+    choices=["hdf5", "parquet"],
+    help="Format of the merged files",
+)
+parser.add_argument(
+    "--prefetch",
+    type=int,
+    default=4,
+    help="Number of files to copy in the background, while merging",
+)
 options = parser.parse_args()
 
 # script parameters
@@ -39,133 +60,57 @@ if not os.path.isdir(localOutDir):
 result = subprocess.check_output(["xrdfs", redirector, "ls", dataDir])
 result = result.decode("utf-8")
 files = result.split("\n")
-files = [f for f in files if (".hdf5" in f) and ("merged" not in f)]
-
-
-# SAVE OUTPUTS
-def save_dfs(df_tot, output):
-    if type(df_tot) == int:
-        print("No events in df_tot.")
-        df_tot = pd.DataFrame(["empty"], columns=["empty"])
-    store = pd.HDFStore(output)
-    store.put("vars", df_tot)
-    store.get_storer("vars").attrs.metadata = metadata_tot
-    store.close()
-
-
-def move(q, infile, outfile):
-    returncode = q.get()
-    result = subprocess.run(["xrdcp", "-s", infile, outfile, "-f"])
-    q.put(result.returncode)
-    # return result
-
-
-def time_limited_move(infile, outfile, time_limit=60, max_attempts=5):
-    # Make max_attempts to move a file, each attempt within a time_limit
-    attempt = 0
-    while attempt < max_attempts:
-        returncode = -1
-        q = multiprocessing.Manager().Queue()
-        q.put(returncode)
-        p = multiprocessing.Process(
-            target=move, name="move_" + infile, args=(q, infile, outfile)
-        )
-        p.start()
-        # Wait a maximum of time_limit seconds for foo
-        # Usage: join([timeout in seconds])
-        p.join(time_limit)
-        # If thread is active
-        if p.is_alive():
-            print("TIME ERROR", file, "taking too long to be transferred")
-            p.terminate()
-            p.join()
-            attempt += 1
-        # thread finished
-        else:
-            returncode = q.get()
-            # something failed in the transfer
-            if returncode != 0:
-                print("XRootD ERROR:", returncode, "for file", infile, "to", outfile)
-                attempt += 1
-            # thread finished and everything worked
-            else:
-                return 1
-    return 0
-
-
-df_tot = 0
-metadata_tot = 0
-i_out = 0
-for ifile, file in enumerate(tqdm(files)):
-    if os.path.exists(sample + ".hdf5"):
-        subprocess.run(["rm", sample + ".hdf5"])
-    xrd_file = redirector + file
-
+files = [f for f in files if (".hdf5" in f or ".parquet" in f) and ("merged" not in f)]
+
+
+def move(outfile, time_limit=600, max_attempts=3):
+    """
+    Copy a merged file to the output directory, and delete it.
+    Allow a couple resubmissions in case of xrootd failures.
+    """
+    print(f"xrdcp {outfile} {redirector + outDir}")
+    for attempt in range(max_attempts):
+        try:
+            subprocess.run(
+                ["xrdcp", "-s", outfile, redirector + outDir, "-f"],
+                check=True,
+                timeout=time_limit,
+            )
+            subprocess.run(["rm", outfile])
+            return
+        except subprocess.TimeoutExpired:
+            print("TIME ERROR", outfile, "taking too long to be transferred")
+        except subprocess.CalledProcessError as e:
+            print("XRootD ERROR:", e.returncode, "for file", outfile)
+    print("Something messed up with file " + outfile)
+
+
+# the inputs are copied in the background, and appended one at a time to the
+# merged file, which is moved to the output directory every maxEvents events
+merger = NtupleMerger(
+    sample + "_merged_{}." + options.format,
+    max_rows=options.maxEvents,
+    on_close=move,
+)
+ntuples = prefetch.Prefetcher(
+    files,
+    prefetch.XRootDTransport(redirector),
+    nprefetch=options.prefetch,
+    timeout=120,
+)
+for ifile, local_file in tqdm(ntuples, total=len(files)):
     # If this script is running for a while, some xrdcp start to hang for too long,
     # so we re-attempt it a couple times before quitting
-    result = time_limited_move(
-        xrd_file, sample + ".hdf5", time_limit=120, max_attempts=3
-    )
-    if result == 0:
-        sys.exit("Result of xrootd transfer was 0: " + xrd_file)
+    if local_file is None:
+        sys.exit("Result of xrootd transfer was 0: " + redirector + ifile)
 
-    df, metadata = fill_utils.h5load(sample + ".hdf5", "vars")
+    df, metadata = fill_utils.open_ntuple(local_file)
 
     # corrupted
     if type(df) == int:
         continue
 
-    ### MERGE METADATA
-    if options.isMC:
-        if type(metadata_tot) == int:
-            metadata_tot = metadata
-        else:
-            metadata_tot["gensumweight"] += metadata["gensumweight"]
-
-    # don't need to add empty ones
-    if "empty" in list(df.keys()):
-        subprocess.run(["rm", sample + ".hdf5"])
-        continue
-
-    if df.shape[0] == 0:
-        subprocess.run(["rm", sample + ".hdf5"])
-        continue
-
-    ### MERGE DF VARS
-    if type(df_tot) == int:
-        df_tot = df
-    else:
-        df_tot = pd.concat((df_tot, df))
-
-    subprocess.run(["rm", sample + ".hdf5"])
-
-    # save every N events
-    if df_tot.shape[0] > 5000000:
-        output_file = sample + "_merged_" + str(i_out) + ".hdf5"
-        save_dfs(df_tot, output_file)
-        print(f"xrdcp {output_file} {redirector + outDir}")
-
-        # Allow a couple resubmissions in case of xrootd failures
-        result = time_limited_move(
-            output_file, redirector + outDir, time_limit=600, max_attempts=3
-        )
-        if result == 0:
-            print("Something messed up with file " + xrd_file)
-        else:
-            subprocess.run(["rm", output_file])
-        i_out += 1
-        df_tot = 0
-        metadata_tot = 0
+    merger.add(df, metadata)
 
 # save last file as well
-output_file = sample + "_merged_" + str(i_out) + ".hdf5"
-save_dfs(df_tot, output_file)
-print(f"xrdcp {output_file} {redirector + outDir}")
-# Allow a couple resubmissions in case of xrootd failures
-result = time_limited_move(
-    output_file, redirector + outDir, time_limit=600, max_attempts=3
-)
-if result == 0:
-    print("Result of xrootd transfer was 0: " + xrd_file)
-else:
-    subprocess.run(["rm", output_file])
+merger.close()
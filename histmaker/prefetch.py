@@ -0,0 +1,170 @@
+"""
+Background prefetching of the ntuples for make_hists.
+While a file is being histogrammed, the next ones are copied to a local scratch
+directory by a pool of threads, so that transfers and filling overlap.
+The transport (XRootD, or a plain local directory, e.g. for tests) is pluggable:
+any object with a fetch(ifile, local_file, timeout) method, raising an exception
+if the transfer fails, can be used.
+
+e.g.
+    prefetcher = Prefetcher(files, XRootDTransport(redirector), nprefetch=4)
+    for ifile, local_file in prefetcher:
+        df, metadata = fill_utils.open_ntuple(local_file)
+        ...
+"""
+import logging
+import os
+import shutil
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class XRootDTransport:
+    """
+    Copy files with xrdcp, from the redirector if the path is not already a root:// url.
+    """
+
+    def __init__(self, redirector: str = "root://submit50.mit.edu/"):
+        self.redirector = redirector
+
+    def url(self, ifile: str) -> str:
+        return ifile if "root://" in ifile else self.redirector + ifile
+
+    def fetch(self, ifile: str, local_file: str, timeout: float = None) -> None:
+        subprocess.run(
+            ["xrdcp", "-s", "-f", self.url(ifile), local_file],
+            check=True,
+            timeout=timeout,
+        )
+
+
+class LocalTransport:
+    """
+    Copy files from a local directory (or from their absolute path, if source_dir is None).
+    Stands in for XRootDTransport, e.g. to test the prefetching without a network.
+    """
+
+    def __init__(self, source_dir: str = None):
+        self.source_dir = source_dir
+
+    def path(self, ifile: str) -> str:
+        if self.source_dir is None:
+            return ifile
+        return os.path.join(self.source_dir, os.path.basename(ifile))
+
+    def fetch(self, ifile: str, local_file: str, timeout: float = None) -> None:
+        shutil.copyfile(self.path(ifile), local_file)
+
+
+class Prefetcher:
+    """
+    Iterate over (ifile, local_file) pairs, with up to nprefetch files being copied
+    in the background while the current one is used.
+    local_file is None if the transfer failed after all the retries.
+    Each local file is deleted when the iteration moves on to the next one.
+    If scratch_budget (in bytes) is set, no new transfer is started while the file in
+    use, the ones already copied, and those being copied take more than that.
+    """
+
+    def __init__(
+        self,
+        files: list,
+        transport,
+        nprefetch: int = 2,
+        scratch_dir: str = ".",
+        scratch_budget: float = None,
+        retries: int = 3,
+        timeout: float = 600,
+    ):
+        self.files = list(files)
+        self.transport = transport
+        self.nprefetch = max(1, nprefetch)
+        self.scratch_dir = scratch_dir
+        self.scratch_budget = scratch_budget
+        self.retries = retries
+        self.timeout = timeout
+        self.wait_time = 0.0
+
+    def __len__(self):
+        return len(self.files)
+
+    def local_file(self, i: int, ifile: str) -> str:
+        # prefix with the process and position, files from different directories
+        # can have the same name, and several processes can share the scratch directory
+        return os.path.join(
+            self.scratch_dir, f"prefetch_{os.getpid()}_{i}_{os.path.basename(ifile)}"
+        )
+
+    def fetch(self, i: int, ifile: str):
+        """Copy ifile to the scratch directory, returns its path, or None if it failed."""
+        local_file = self.local_file(i, ifile)
+        for attempt in range(self.retries):
+            try:
+                self.transport.fetch(ifile, local_file, timeout=self.timeout)
+                return local_file
+            except Exception as e:
+                logging.warning(
+                    f"Transfer of {ifile} failed (attempt {attempt + 1}/{self.retries}): {e}"
+                )
+                remove(local_file)
+        return None
+
+    def __iter__(self):
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        todo = deque(enumerate(self.files))
+        pending = deque()
+        current = []
+
+        def scratch_used():
+            # the file in use, the ones already copied, waiting to be used, and the
+            # transfers in flight, estimated from the average size of the files so far
+            done = [f.result() for _, f in pending if f.done()]
+            sizes = [os.path.getsize(f) for f in current + done if f is not None]
+            in_flight = len([f for _, f in pending if not f.done()])
+            estimate = sum(sizes) / len(sizes) if sizes else self.scratch_budget
+            return sum(sizes) + in_flight * estimate
+
+        def submit():
+            # keep up to nprefetch transfers ahead of the file in use, within the scratch budget
+            while todo and len(pending) < self.nprefetch:
+                if (
+                    self.scratch_budget is not None
+                    and len(pending) > 0
+                    and scratch_used() >= self.scratch_budget
+                ):
+                    break
+                i, ifile = todo.popleft()
+                pending.append((ifile, pool.submit(self.fetch, i, ifile)))
+
+        pool = ThreadPoolExecutor(max_workers=self.nprefetch)
+        try:
+            submit()
+            while pending:
+                ifile, future = pending.popleft()
+                start = time.perf_counter()
+                local_file = future.result()
+                self.wait_time += time.perf_counter() - start
+                current[:] = [local_file]
+                submit()
+                try:
+                    yield ifile, local_file
+                finally:
+                    current.clear()
+                    if local_file is not None:
+                        remove(local_file)
+            logging.debug(f"Waited {self.wait_time:.1f}s for transfers.")
+        finally:
+            # if the iteration is stopped early, clean up the transfers in flight
+            for _, future in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
+            for _, future in pending:
+                if not future.cancelled() and future.result() is not None:
+                    remove(future.result())
+
+
+def remove(local_file: str) -> None:
+    if os.path.exists(local_file):
+        os.remove(local_file)
@@ -32,8 +32,8 @@ sleep $[ ( $RANDOM % 1000 )  + 1 ]s
 pip install h5py
 
 echo "----- Found Proxy in: $X509_USER_PROXY"
-echo "python3 {condor_file} --jobNum=$1 --isMC={ismc} --era={era} --doInf={doInf} --doSyst={doSyst} --dataset={dataset} --infile=$2"
-python3 {condor_file} --jobNum=$1 --isMC={ismc} --era={era} --doInf={doInf} --doSyst={doSyst} --dataset={dataset} --infile=$2
+echo "python3 {condor_file} --jobNum=$1 --isMC={ismc} --era={era} --doInf={doInf} --doSyst={doSyst} --dataset={dataset} --infile=$2{condor_args}"
+python3 {condor_file} --jobNum=$1 --isMC={ismc} --era={era} --doInf={doInf} --doSyst={doSyst} --dataset={dataset} --infile=$2{condor_args}
 
 #echo "----- transferring output to scratch :"
 echo "xrdcp {outfile}.{file_ext} {redirector}/{outdir}/$3.{file_ext}"
@@ -127,6 +127,19 @@ def main():
     parser.add_argument(
         "-ML", "--ML", type=int, default=0, help="ML samples production."
     )
+    parser.add_argument(
+        "--format",
+        type=str,
+        default="hdf5",
+        choices=["hdf5", "parquet"],
+        help="ntuple output format (not for ML samples).",
+    )
+    parser.add_argument(
+        "--h5table",
+        type=int,
+        default=0,
+        help="Write the HDF5 ntuples in the queryable PyTables table format (WH, the others always are).",
+    )
 
     options = parser.parse_args()
 
@@ -154,7 +167,7 @@ def main():
         if options.scout == 1:
             condor_file = "condor_Scouting.py"
             outfile = "out"
-            file_ext = "hdf5"
+            file_ext = options.format
         elif options.ML == 1:
             condor_file = "condor_ML.py"
             outfile = "out"
@@ -162,11 +175,18 @@ def main():
         else:
             condor_file = "condor_SUEP_ggF.py"
             outfile = "out"
-            file_ext = "hdf5"
+            file_ext = options.format
     elif options.channel == "WH":
         condor_file = "condor_SUEP_WH.py"
         outfile = "out"
-        file_ext = "hdf5"
+        file_ext = options.format
+    # ntuple format options, for the ntuple makers that support them
+    # (the ntuples merged in the job are always HDF5 tables)
+    condor_args = ""
+    if condor_file != "condor_ML.py":
+        condor_args = f" --format={options.format}"
+    if condor_file == "condor_SUEP_WH.py":
+        condor_args += f" --h5table={options.h5table}"
 
     # Making sure that the proxy is good
     lifetime = check_proxy(time_min=100)
@@ -304,6 +324,7 @@ def main():
                     outdir=fin_outdir_condor,
                     dataset=sample_name,
                     condor_file=condor_file,
+                    condor_args=condor_args,
                     outfile=outfile,
                     file_ext=file_ext,
                     redirector=redirector,
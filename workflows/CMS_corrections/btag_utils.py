@@ -1,19 +1,11 @@
-import pickle
-
 import awkward as ak
-import correctionlib
 import numpy as np
 
+from workflows.CMS_corrections import correction_registry
 
-def doBTagWeights(events, jetsPre, era, wp="L", do_syst=False):
-    jetsPre = jetsPre[jetsPre.pt >= 30]
-    jets, njets = ak.flatten(jetsPre), np.array(ak.num(jetsPre))
-    hadronFlavourLightAsB = np.array(
-        np.where(jets.hadronFlavour == 0, 5, jets.hadronFlavour)
-    )
-    hadronFlavourBCAsLight = np.array(
-        np.where(jets.hadronFlavour != 0, 0, jets.hadronFlavour)
-    )
+
+def btagFiles(era):
+    """SF files for the heavy (b, c) and light flavour jets"""
     if era == 2015:
         btagfile = "data/BTagUL16APV/btagging.json.gz"
         btagfileL = "data/BTagUL16/btagging.json.gz"
@@ -26,142 +18,106 @@ def doBTagWeights(events, jetsPre, era, wp="L", do_syst=False):
     if era == 2018:
         btagfile = "data/BTagUL18/btagging.json.gz"
         btagfileL = btagfile
-    corrector = correctionlib.CorrectionSet.from_file(btagfile)
-    correctorL = correctionlib.CorrectionSet.from_file(btagfileL)
-    SF = {}
-    flattened_pt = np.array(jets.pt)
-    flattened_eta = np.array(np.abs(jets.eta))
-    SF["central"] = corrector["deepJet_comb"].evaluate(
-        "central", wp, hadronFlavourLightAsB, flattened_eta, flattened_pt
-    )  # SF per jet, later argument is dummy as will be overwritten next
-    SF["central"] = np.where(
-        abs(jets.hadronFlavour) == 0,
-        correctorL["deepJet_incl"].evaluate(
-            "central", wp, hadronFlavourBCAsLight, flattened_eta, flattened_pt
-        ),
-        SF["central"],
-    )
-    if do_syst:
-        SF["HFcorrelated_Up"] = np.where(
-            (abs(jets.hadronFlavour) == 4) | (abs(jets.hadronFlavour) == 5),
-            corrector["deepJet_comb"].evaluate(
-                "up_correlated", wp, hadronFlavourLightAsB, flattened_eta, flattened_pt
-            ),
-            SF["central"],
-        )
-        SF["HFcorrelated_Dn"] = np.where(
-            (abs(jets.hadronFlavour) == 4) | (abs(jets.hadronFlavour) == 5),
-            corrector["deepJet_comb"].evaluate(
-                "down_correlated",
-                wp,
-                hadronFlavourLightAsB,
-                flattened_eta,
-                flattened_pt,
-            ),
-            SF["central"],
-        )
-        SF["HFuncorrelated_Up"] = np.where(
-            (abs(jets.hadronFlavour) == 4) | (abs(jets.hadronFlavour) == 5),
-            corrector["deepJet_comb"].evaluate(
-                "up_uncorrelated",
-                wp,
-                hadronFlavourLightAsB,
-                flattened_eta,
-                flattened_pt,
-            ),
-            SF["central"],
-        )
-        SF["HFuncorrelated_Dn"] = np.where(
-            (abs(jets.hadronFlavour) == 4) | (abs(jets.hadronFlavour) == 5),
-            corrector["deepJet_comb"].evaluate(
-                "down_uncorrelated",
-                wp,
-                hadronFlavourLightAsB,
-                flattened_eta,
-                flattened_pt,
-            ),
-            SF["central"],
-        )
-        SF["LFcorrelated_Up"] = np.where(
-            abs(jets.hadronFlavour) == 0,
-            correctorL["deepJet_incl"].evaluate(
-                "up_correlated", wp, hadronFlavourBCAsLight, flattened_eta, flattened_pt
-            ),
-            SF["central"],
-        )
-        SF["LFcorrelated_Dn"] = np.where(
-            abs(jets.hadronFlavour) == 0,
-            correctorL["deepJet_incl"].evaluate(
-                "down_correlated",
-                wp,
-                hadronFlavourBCAsLight,
-                flattened_eta,
-                flattened_pt,
-            ),
-            SF["central"],
-        )
-        SF["LFuncorrelated_Up"] = np.where(
-            abs(jets.hadronFlavour) == 0,
-            correctorL["deepJet_incl"].evaluate(
-                "up_uncorrelated",
-                wp,
-                hadronFlavourBCAsLight,
-                flattened_eta,
-                flattened_pt,
-            ),
-            SF["central"],
-        )
-        SF["LFuncorrelated_Dn"] = np.where(
-            abs(jets.hadronFlavour) == 0,
-            correctorL["deepJet_incl"].evaluate(
-                "down_uncorrelated",
-                wp,
-                hadronFlavourBCAsLight,
-                flattened_eta,
-                flattened_pt,
-            ),
-            SF["central"],
+    return btagfile, btagfileL
+
+
+def btagEffFile(era):
+    if era == 2015:
+        return "data/BTagUL16APV/eff.pickle"
+    if era == 2016:
+        return "data/BTagUL16/eff.pickle"
+    if era == 2017:
+        return "data/BTagUL17/eff.pickle"
+    if era == 2018:
+        return "data/BTagUL18/eff.pickle"
+
+
+@correction_registry.warmup_hook
+def warmup(era, isMC):
+    if not isMC:
+        return
+    era = correction_registry.era_int(era)
+    for f in correction_registry.existing(*btagFiles(era)):
+        correction_registry.correction_set(f)
+    for f in correction_registry.existing(btagEffFile(era)):
+        correction_registry.pickle_file(f)
+
+
+# systematic variations of the b-tagging SFs: name -> (correction variation, jets it applies to)
+BTAG_SYSTEMATICS = {
+    "HFcorrelated_Up": ("up_correlated", "heavy"),
+    "HFcorrelated_Dn": ("down_correlated", "heavy"),
+    "HFuncorrelated_Up": ("up_uncorrelated", "heavy"),
+    "HFuncorrelated_Dn": ("down_uncorrelated", "heavy"),
+    "LFcorrelated_Up": ("up_correlated", "light"),
+    "LFcorrelated_Dn": ("down_correlated", "light"),
+    "LFuncorrelated_Up": ("up_uncorrelated", "light"),
+    "LFuncorrelated_Dn": ("down_uncorrelated", "light"),
+}
+
+
+def doBTagWeights(events, jetsPre, era, wp="L", do_syst=False):
+    """
+    Per-event b-tagging weights, method (1.a) of
+    https://twiki.cern.ch/twiki/bin/view/CMS/BTagSFMethods
+    Returns a dictionary with the central weights and, if do_syst, the weights of
+    each of the BTAG_SYSTEMATICS.
+    """
+    jetsPre = jetsPre[jetsPre.pt >= 30]
+    jets, njets = ak.flatten(jetsPre), np.array(ak.num(jetsPre))
+    flavour = np.abs(ak.to_numpy(jets.hadronFlavour))
+    pt = ak.to_numpy(jets.pt)
+    abseta = np.abs(ak.to_numpy(jets.eta))
+
+    # b and c jets use the comb SFs, light jets the incl ones,
+    # each correction is only evaluated on the jets it applies to
+    subsets = {"heavy": (flavour == 4) | (flavour == 5), "light": flavour == 0}
+    btagfile, btagfileL = btagFiles(era)
+    correctors = {
+        "heavy": correction_registry.correction_set(btagfile)["deepJet_comb"],
+        "light": correction_registry.correction_set(btagfileL)["deepJet_incl"],
+    }
+
+    def evaluate(var, subset):
+        mask = subsets[subset]
+        return correctors[subset].evaluate(
+            var, wp, flavour[mask], abseta[mask], pt[mask]
         )
-    effs = getBTagEffs(events, jets, era, wp)
+
+    SF = {"central": np.ones(len(pt))}
+    for subset in subsets:
+        if subsets[subset].any():
+            SF["central"][subsets[subset]] = evaluate("central", subset)
+    if do_syst:
+        for syst_var, (var, subset) in BTAG_SYSTEMATICS.items():
+            SF[syst_var] = SF["central"].copy()
+            if subsets[subset].any():
+                SF[syst_var][subsets[subset]] = evaluate(var, subset)
+
+    # all the variations as the columns of a (jets x variations) array
     wps = {"L": "Loose", "M": "Medium", "T": "Tight"}  # For safe conversion
-    weights = {}
-    effs = ak.unflatten(effs, njets)
-    for key in SF:
-        SF[key] = ak.unflatten(SF[key], njets)
-    for (
-        syst_var
-    ) in (
-        SF.keys()
-    ):  # Method (1.a) here: https://twiki.cern.ch/twiki/bin/view/CMS/BTagSFMethods
-        mceff = ak.prod(
-            np.where(jetsPre.btag >= btagcuts(wps[wp], era), effs, 1 - effs), axis=1
-        )
-        dataeff = ak.prod(
-            np.where(
-                jetsPre.btag >= btagcuts(wps[wp], era),
-                SF[syst_var] * effs,
-                1 - SF[syst_var] * effs,
-            ),
-            axis=1,
-        )
-        weights[syst_var] = dataeff / mceff
+    tagged = ak.to_numpy(jets.btag) >= btagcuts(wps[wp], era)
+    effs = np.asarray(getBTagEffs(events, jets, era, wp))
+    SFs = np.stack(list(SF.values()), axis=1)
+    mceff = np.where(tagged, effs, 1 - effs)
+    dataeff = np.where(tagged[:, None], SFs * effs[:, None], 1 - SFs * effs[:, None])
 
-    return weights
+    # one segmented product over the jets of each event, for mc and all variations
+    ratios = np.ones((len(njets), SFs.shape[1]))
+    nonempty = njets > 0
+    if nonempty.any():
+        starts = (np.cumsum(njets) - njets)[nonempty]
+        factors = np.column_stack([mceff, dataeff])
+        products = np.multiply.reduceat(factors, starts, axis=0)
+        ratios[nonempty] = products[:, 1:] / products[:, :1]
+
+    return {syst_var: ak.Array(ratios[:, i]) for i, syst_var in enumerate(SF)}
 
 
 def getBTagEffs(events, jets, era, wp="L"):
     if wp != "L":
         print("Warning, efficiencies are computed for the Loose WP only!")
-    if era == 2015:
-        btagfile = "data/BTagUL16APV/eff.pickle"
-    if era == 2016:
-        btagfile = "data/BTagUL16/eff.pickle"
-    if era == 2017:
-        btagfile = "data/BTagUL17/eff.pickle"
-    if era == 2018:
-        btagfile = "data/BTagUL18/eff.pickle"
-    bfile = open(btagfile, "rb")
-    effsLoad = pickle.load(bfile)
+    effsLoad = correction_registry.pickle_file(btagEffFile(era))
     effs = effsLoad["L"](jets.pt, np.abs(jets.eta))
     effs = np.where(
         abs(jets.hadronFlavour) == 4, effsLoad["C"](jets.pt, np.abs(jets.eta)), effs
@@ -0,0 +1,143 @@
+"""
+Process-wide registry of the correction inputs (correctionlib JSONs, efficiency
+pickles, text tables, lumi masks, ...).
+Each file is opened once per process, and the same evaluator is handed out to
+every chunk processed by that worker. The CMS_corrections modules register
+warm-up hooks, so that the entry points can load everything an era needs when
+a worker starts, rather than during the first chunk.
+Load times and hit counts are kept for each file, see stats() and print_stats().
+"""
+
+import os
+import pickle
+import threading
+import time
+
+import correctionlib
+import numpy as np
+
+_cache = {}
+_stats = {}
+_lock = threading.RLock()
+_warmup_hooks = []
+# directories where the inputs are looked for, if not found at their relative path,
+# e.g. "dask-worker-space/" where the data directory is uploaded to the workers
+_prefixes = []
+
+
+def get(path, loader, *args, **kwargs):
+    """
+    Return loader(path, *args, **kwargs), loading it only the first time it is
+    requested in this process. path is looked up with resolve().
+    """
+    key = (getattr(loader, "__qualname__", repr(loader)), path, args)
+    if kwargs:
+        key += tuple(sorted(kwargs.items()))
+    with _lock:
+        if key in _cache:
+            _stats[key]["hits"] += 1
+            return _cache[key]
+        start = time.perf_counter()
+        _cache[key] = loader(resolve(path), *args, **kwargs)
+        _stats[key] = {"load_time": time.perf_counter() - start, "hits": 0}
+        return _cache[key]
+
+
+def _load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def correction_set(path):
+    """correctionlib.CorrectionSet of a (gzipped) JSON file."""
+    return get(path, correctionlib.CorrectionSet.from_file)
+
+
+def pickle_file(path):
+    return get(path, _load_pickle)
+
+
+def text_table(path, delimiter=","):
+    """numpy array of a text table. Do not modify it in place, it is shared."""
+    return get(path, np.loadtxt, delimiter=delimiter)
+
+
+def stats():
+    """{(loader, path, ...): {"load_time": seconds, "hits": number of cache hits}}"""
+    with _lock:
+        return {key: dict(value) for key, value in _stats.items()}
+
+
+def print_stats():
+    for key, value in stats().items():
+        print(
+            "{:<70} loaded in {:.3f}s, {} hits".format(
+                key[1], value["load_time"], value["hits"]
+            )
+        )
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+        _stats.clear()
+
+
+def warmup_hook(func):
+    """
+    Decorator registering func(era, isMC) to be called by warmup().
+    era is the era string of the entry points, e.g. "2018" or "2016apv".
+    """
+    _warmup_hooks.append(func)
+    return func
+
+
+def add_prefix(prefix):
+    """Look for the inputs under prefix too, see resolve()."""
+    with _lock:
+        if prefix not in _prefixes:
+            _prefixes.append(prefix)
+
+
+def resolve(path):
+    """path if it exists, otherwise the first existing one under the prefixes."""
+    if os.path.isfile(path):
+        return path
+    for prefix in _prefixes:
+        if os.path.isfile(os.path.join(prefix, path)):
+            return os.path.join(prefix, path)
+    return path
+
+
+def warmup(era, isMC=1, prefix=None):
+    """
+    Load all the corrections registered by the warm-up hooks for an era.
+    prefix is where the inputs are, if not at their relative path, see add_prefix.
+    """
+    if prefix:
+        add_prefix(prefix)
+    start = time.perf_counter()
+    for hook in _warmup_hooks:
+        try:
+            hook(str(era).lower(), isMC)
+        except Exception as e:
+            print("WARNING: warm-up of", hook.__module__, "failed:", e)
+    print(
+        "Loaded {} correction inputs in {:.2f}s".format(
+            len(_cache), time.perf_counter() - start
+        )
+    )
+
+
+def era_int(era):
+    """Integer era used by the correction modules, 2016apv is 2015."""
+    era = str(era).lower()
+    return 2015 if era == "2016apv" else int(era)
+
+
+def existing(*paths):
+    """
+    Paths which exist on disk (see resolve), used by the warm-up hooks to skip
+    missing inputs.
+    """
+    return [path for path in paths if os.path.isfile(resolve(path))]
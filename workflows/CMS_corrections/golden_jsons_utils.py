@@ -1,33 +1,100 @@
-from coffea import lumi_tools
+import json
+from types import SimpleNamespace
 
+import numpy as np
 
-def applyGoldenJSON(self, events):
+from workflows.CMS_corrections import correction_registry
+
+
+class LumiIndex:
+    """
+    Certified luminosity sections of a golden JSON, as sorted, non-overlapping
+    intervals of (run << 32 | lumi) keys, evaluated with np.searchsorted.
+    Calling it with the run and lumi arrays returns the mask of certified events,
+    whole chunks are accepted or rejected from their run/lumi range when possible.
+    """
+
+    def __init__(self, path):
+        with open(path) as f:
+            golden = json.load(f)
+        intervals = sorted(
+            (int(run), lo, hi) for run, ranges in golden.items() for lo, hi in ranges
+        )
+        self.runs = np.unique([run for run, _, _ in intervals]).astype(np.int64)
+        starts, ends = [], []
+        for run, lo, hi in intervals:
+            start, end = (run << 32) | lo, (run << 32) | hi
+            if ends and start <= ends[-1] + 1:
+                # merge overlapping or adjacent ranges
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        self.starts = np.array(starts, dtype=np.int64)
+        self.ends = np.array(ends, dtype=np.int64)
+
+    def __call__(self, runs, lumis):
+        runs = np.asarray(runs, dtype=np.int64)
+        if len(runs) == 0:
+            return np.zeros(0, dtype=bool)
+
+        # no certified run in the run range of the chunk
+        i = np.searchsorted(self.runs, runs.min())
+        if i == len(self.runs) or self.runs[i] > runs.max():
+            return np.zeros(len(runs), dtype=bool)
+
+        keys = (runs << 32) | np.asarray(lumis, dtype=np.int64)
+
+        # the whole chunk falls in a single certified interval
+        j = np.searchsorted(self.starts, keys.min(), side="right") - 1
+        if j >= 0 and keys.max() <= self.ends[j]:
+            return np.ones(len(runs), dtype=bool)
+
+        idx = np.searchsorted(self.starts, keys, side="right") - 1
+        return (idx >= 0) & (keys <= self.ends[np.maximum(idx, 0)])
+
+
+def goldenJSONFile(self):
     if self.era == "2016" or self.era == "2016apv" and self.scouting != 1:
-        LumiJSON = lumi_tools.LumiMask(
+        return (
             "data/GoldenJSON/Cert_271036-284044_13TeV_Legacy2016_Collisions16_JSON.txt"
         )
     elif self.era == "2016" and self.scouting == 1:
-        LumiJSON = lumi_tools.LumiMask(
-            "data/GoldenJSON/Cert_271036-284044_13TeV_Legacy2016_Collisions16_JSON_scout.txt"
-        )
+        return "data/GoldenJSON/Cert_271036-284044_13TeV_Legacy2016_Collisions16_JSON_scout.txt"
     elif self.era == "2016apv" and self.scouting == 1:
-        LumiJSON = lumi_tools.LumiMask(
-            "data/GoldenJSON/Cert_271036-284044_13TeV_Legacy2016_Collisions16APV_JSON_scout.txt"
-        )
+        return "data/GoldenJSON/Cert_271036-284044_13TeV_Legacy2016_Collisions16APV_JSON_scout.txt"
     elif self.era == "2017":
-        LumiJSON = lumi_tools.LumiMask(
-            "data/GoldenJSON/Cert_294927-306462_13TeV_UL2017_Collisions17_GoldenJSON.txt"
-        )
+        return "data/GoldenJSON/Cert_294927-306462_13TeV_UL2017_Collisions17_GoldenJSON.txt"
     elif self.era == "2018":
-        LumiJSON = lumi_tools.LumiMask(
+        return (
             "data/GoldenJSON/Cert_314472-325175_13TeV_Legacy2018_Collisions18_JSON.txt"
         )
     else:
         print("No era is defined. Please specify the year")
 
+
+@correction_registry.warmup_hook
+def warmup(era, isMC):
+    if isMC:
+        return
+    for scouting in [0, 1]:
+        # only needs the era and scouting attributes of the processor
+        settings = SimpleNamespace(era=era, scouting=scouting)
+        json_file = goldenJSONFile(settings)
+        if json_file:
+            for f in correction_registry.existing(json_file):
+                correction_registry.get(f, LumiIndex)
+
+
+def applyGoldenJSON(self, events):
+    lumiIndex = correction_registry.get(goldenJSONFile(self), LumiIndex)
+
     if self.scouting == 1:
-        events = events[LumiJSON(events.run, events.lumSec)]
+        mask = lumiIndex(events.run, events.lumSec)
     else:
-        events = events[LumiJSON(events.run, events.luminosityBlock)]
+        mask = lumiIndex(events.run, events.luminosityBlock)
 
-    return events
+    # avoid copying the events if the whole chunk is certified
+    if mask.all():
+        return events
+    return events[mask]
@@ -1,3 +1,7 @@
+import os
+import pickle
+import threading
+
 import awkward as ak
 import cachetools
 import numpy as np
@@ -26,6 +30,130 @@ def load_jets(self, events):
     return vals_jet0
 
 
+# Directory where the compiled JEC/JER lookup tables are persisted, so that a new
+# worker can load them instead of parsing the text files again. Disabled if not set.
+JEC_CACHE_DIR = os.environ.get("SUEP_JEC_CACHE_DIR")
+
+
+def jec_stack_names(isMC, jecdir, jerdir):
+    # WARNING
+    # Make sure the acorrections are applied in the right order:
+    # https://twiki.cern.ch/twiki/bin/view/CMS/IntroToJEC#Mandatory_Jet_Energy_Corrections
+    if isMC:
+        return [
+            jecdir + "_L1FastJet_AK4PFchs",  # looks to be 0
+            # jecdir + "_L1RC_AK4PFchs", # needs area
+            # jecdir + "_L2L3Residual_AK4PFchs",
+            # jecdir + "_L2Residual_AK4PFchs",
+            jecdir + "_L2Relative_AK4PFchs",
+            jecdir + "_L3Absolute_AK4PFchs",  # looks to be 1, no change
+            jerdir + "_PtResolution_AK4PFchs",
+            jerdir + "_SF_AK4PFchs",
+            jecdir + "_Uncertainty_AK4PFchs",
+        ]
+    else:
+        return [
+            jecdir + "_L1FastJet_AK4PFchs",  # looks to be 0
+            jecdir + "_L1RC_AK4PFchs",  # needs area
+            jecdir + "_L2Relative_AK4PFchs",
+            jecdir + "_L3Absolute_AK4PFchs",  # looks to be 1, no change
+            jecdir + "_L2L3Residual_AK4PFchs",
+            jecdir + "_L2Residual_AK4PFchs",
+        ]
+
+
+def jec_files(isMC, jecdir, jerdir, prefix=""):
+    """Text files defining the weight sets of the JEC stack."""
+    jec_path = prefix + "data/jetmet/JEC/" + jecdir + "/"
+    jer_path = prefix + "data/jetmet/JER/" + jerdir + "/"
+    extensions = {
+        "_PtResolution_AK4PFchs": ".jr.txt",
+        "_SF_AK4PFchs": ".jersf.txt",
+        "_Uncertainty_AK4PFchs": ".junc.txt",
+    }
+    files = []
+    for name in jec_stack_names(isMC, jecdir, jerdir):
+        path = jer_path if name.startswith(jerdir) else jec_path
+        ext = next((e for k, e in extensions.items() if name.endswith(k)), ".jec.txt")
+        files.append(path + name + ext)
+    return files
+
+
+def load_jec_inputs(isMC, jecdir, jerdir, prefix=""):
+    """
+    Parse the JEC/JER text files into coffea lookup tables, name -> lookup.
+    If JEC_CACHE_DIR is set, the tables are read from/written to a pickled blob
+    there, which is rebuilt whenever one of the text files is newer.
+    """
+    files = jec_files(isMC, jecdir, jerdir, prefix)
+    names = jec_stack_names(isMC, jecdir, jerdir)
+
+    blob = None
+    if JEC_CACHE_DIR:
+        blob = os.path.join(
+            JEC_CACHE_DIR,
+            "{}_{}_{}.pkl".format(jecdir, jerdir, "MC" if isMC else "DATA"),
+        )
+        if os.path.isfile(blob) and os.path.getmtime(blob) >= max(
+            os.path.getmtime(f) for f in files
+        ):
+            try:
+                with open(blob, "rb") as f:
+                    return pickle.load(f)
+            except Exception as e:
+                print("WARNING: could not load the cached JECs from", blob, e)
+
+    # Defined the weight sets we want to use
+    ext_ak4 = extractor()
+    ext_ak4.add_weight_sets(["* * " + f for f in files])
+    ext_ak4.finalize()
+    evaluator_ak4 = ext_ak4.make_evaluator()
+    jec_inputs_ak4 = {name: evaluator_ak4[name] for name in names}
+
+    if blob is not None:
+        # write to a temporary file first, other workers might be reading the blob
+        os.makedirs(JEC_CACHE_DIR, exist_ok=True)
+        tmp = "{}.{}.tmp".format(blob, os.getpid())
+        with open(tmp, "wb") as f:
+            pickle.dump(jec_inputs_ak4, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, blob)
+
+    return jec_inputs_ak4
+
+
+@cachetools.cached(cachetools.LRUCache(maxsize=8), lock=threading.Lock())
+def get_jec_factories(isMC, jecdir, jerdir, prefix=""):
+    """
+    Corrected jet and MET factories for a set of JECs/JERs.
+    Building them means parsing all the text files, so they are cached for the
+    lifetime of the process and shared by all the chunks it processes.
+    """
+    jec_stack_ak4 = JECStack(load_jec_inputs(isMC, jecdir, jerdir, prefix))
+
+    # Create the map (for both MC and data)
+    name_map = jec_stack_ak4.blank_name_map
+    name_map["JetPt"] = "pt"
+    name_map["JetMass"] = "mass"
+    name_map["JetEta"] = "eta"
+    name_map["JetA"] = "area"
+    name_map["Rho"] = "rho"
+    name_map["massRaw"] = "mass_raw"
+    name_map["ptRaw"] = "pt_raw"
+    if isMC:
+        name_map["ptGenJet"] = "pt_gen"
+    jet_factory = CorrectedJetsFactory(name_map, jec_stack_ak4)
+
+    name_map = dict(name_map)
+    name_map["METpt"] = "pt"
+    name_map["METphi"] = "phi"
+    name_map["JetPhi"] = "phi"
+    name_map["UnClusteredEnergyDeltaX"] = "MetUnclustEnUpDeltaX"
+    name_map["UnClusteredEnergyDeltaY"] = "MetUnclustEnUpDeltaY"
+    met_factory = CorrectedMETFactory(name_map)
+
+    return jet_factory, met_factory
+
+
 def apply_jecs(self, Sample, events, prefix=""):
     # Find the Collection we want to look at
     if self.isMC:
@@ -80,80 +208,7 @@ def apply_jecs(self, Sample, events, prefix=""):
         else:
             print("WARNING: Unable to find the correct JECs for Data!")
 
-    # Start working here
-    jec_path = prefix + "data/jetmet/JEC/" + jecdir + "/"
-    jer_path = prefix + "data/jetmet/JER/" + jerdir + "/"
-
-    # Defined the weight sets we want to use
-    ext_ak4 = extractor()
-    if self.isMC:
-        ext_ak4.add_weight_sets(
-            [  # change to correct files
-                "* * "
-                + jec_path
-                + jecdir
-                + "_L1FastJet_AK4PFchs.jec.txt",  # looks to be 0,
-                #'* * ' + jec_path + jecdir +"_L1RC_AK4PFchs.jec.txt", #needs area
-                #'* * ' + jec_path + jecdir +"_L2L3Residual_AK4PFchs.jec.txt",
-                #'* * ' + jec_path + jecdir +"_L2Residual_AK4PFchs.jec.txt",
-                "* * " + jec_path + jecdir + "_L2Relative_AK4PFchs.jec.txt",
-                "* * "
-                + jec_path
-                + jecdir
-                + "_L3Absolute_AK4PFchs.jec.txt",  # looks to be 1, no change
-                "* * " + jec_path + jecdir + "_Uncertainty_AK4PFchs.junc.txt",
-                "* * " + jer_path + jerdir + "_PtResolution_AK4PFchs.jr.txt",
-                "* * " + jer_path + jerdir + "_SF_AK4PFchs.jersf.txt",
-            ]
-        )
-    else:
-        ext_ak4.add_weight_sets(
-            [  # change to correct files
-                "* * "
-                + jec_path
-                + jecdir
-                + "_L1FastJet_AK4PFchs.jec.txt",  # looks to be 0,
-                "* * " + jec_path + jecdir + "_L1RC_AK4PFchs.jec.txt",  # needs area
-                "* * " + jec_path + jecdir + "_L2Relative_AK4PFchs.jec.txt",
-                "* * "
-                + jec_path
-                + jecdir
-                + "_L3Absolute_AK4PFchs.jec.txt",  # looks to be 1, no change
-                "* * " + jec_path + jecdir + "_L2L3Residual_AK4PFchs.jec.txt",
-                "* * " + jec_path + jecdir + "_L2Residual_AK4PFchs.jec.txt",
-            ]
-        )
-
-    ext_ak4.finalize()
-    evaluator_ak4 = ext_ak4.make_evaluator()
-
-    # WARNING
-    # Make sure the acorrections are applied in the right order:
-    # https://twiki.cern.ch/twiki/bin/view/CMS/IntroToJEC#Mandatory_Jet_Energy_Corrections
-    if self.isMC:
-        jec_stack_names_ak4 = [
-            jecdir + "_L1FastJet_AK4PFchs",
-            # jecdir + "_L1RC_AK4PFchs",
-            # jecdir + "_L2L3Residual_AK4PFchs",
-            # jecdir + "_L2Residual_AK4PFchs",
-            jecdir + "_L2Relative_AK4PFchs",
-            jecdir + "_L3Absolute_AK4PFchs",
-            jerdir + "_PtResolution_AK4PFchs",
-            jerdir + "_SF_AK4PFchs",
-            jecdir + "_Uncertainty_AK4PFchs",
-        ]
-    else:
-        jec_stack_names_ak4 = [
-            jecdir + "_L1FastJet_AK4PFchs",
-            jecdir + "_L1RC_AK4PFchs",
-            jecdir + "_L2Relative_AK4PFchs",
-            jecdir + "_L3Absolute_AK4PFchs",
-            jecdir + "_L2L3Residual_AK4PFchs",
-            jecdir + "_L2Residual_AK4PFchs",
-        ]
-
-    jec_inputs_ak4 = {name: evaluator_ak4[name] for name in jec_stack_names_ak4}
-    jec_stack_ak4 = JECStack(jec_inputs_ak4)
+    jet_factory, met_factory = get_jec_factories(self.isMC, jecdir, jerdir, prefix)
 
     # Prepare the jets from the events
     if self.scouting == 1:
@@ -167,34 +222,15 @@ def apply_jecs(self, Sample, events, prefix=""):
                 ak.fill_none(jets.matched_gen.pt, 0), np.float32
             )
         jets["rho"] = ak.broadcast_arrays(events.fixedGridRhoFastjetAll, jets.pt)[0]
-    # Create the map (for both MC and data)
-    name_map = jec_stack_ak4.blank_name_map
-    name_map["JetPt"] = "pt"
-    name_map["JetMass"] = "mass"
-    name_map["JetEta"] = "eta"
-    name_map["JetA"] = "area"
-    name_map["Rho"] = "rho"
-    name_map["massRaw"] = "mass_raw"
-    name_map["ptRaw"] = "pt_raw"
-    if self.isMC:
-        name_map["ptGenJet"] = "pt_gen"
 
     # create and return the corrected jet collection
     jec_cache = cachetools.Cache(np.inf)
-    jet_factory = CorrectedJetsFactory(name_map, jec_stack_ak4)
     corrected_jets = jet_factory.build(jets, lazy_cache=jec_cache)
 
     if self.scouting == 1:
         return corrected_jets, None
 
     else:
-        name_map["METpt"] = "pt"
-        name_map["METphi"] = "phi"
-        name_map["JetPhi"] = "phi"
-        name_map["UnClusteredEnergyDeltaX"] = "MetUnclustEnUpDeltaX"
-        name_map["UnClusteredEnergyDeltaY"] = "MetUnclustEnUpDeltaY"
-
-        met_factory = CorrectedMETFactory(name_map)
         met = ak.packed(events.MET, highlevel=True)
         met["pt"] = met["pt"]
         met["phi"] = met["phi"]
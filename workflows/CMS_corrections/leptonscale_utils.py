@@ -2,53 +2,95 @@ import awkward as ak
 import numpy as np
 from coffea import lookup_tools
 
+from workflows.CMS_corrections import correction_registry
+from workflows.utils.random_utils import MUON_SMEARING_STREAM, object_random
+
+
+def rochesterFile(era):
+    return "data/MuScale/roccor.Run2.v3/RoccoR%i.txt" % (era if era != 2015 else 2016)
+
+
+class RochesterCorrections:
+    """
+    Rochester muon momentum corrections of an era, parsed once per process
+    (through the correction registry) and shared by all chunks.
+    """
+
+    def __init__(self, path):
+        rochester_data = lookup_tools.txt_converters.convert_rochester_file(
+            path, loaduncs=True
+        )
+        self.lookup = lookup_tools.rochester_lookup.rochester_lookup(rochester_data)
+
+    def muonPts(self, events, muons):
+        """
+        Corrected pT of the MC muons and its up and down variations, all from the
+        same random numbers and gen matching. Gen-matched muons (aux1 >= 0) get
+        the spread correction, the others the smearing one, each only evaluated
+        on the muons it applies to.
+        """
+        murand, nmuons = object_random(events, muons, MUON_SMEARING_STREAM)
+        genidx = ak.to_numpy(ak.flatten(muons.aux1))
+        matched = genidx >= 0
+        charge = ak.to_numpy(ak.flatten(muons.charge))
+        pt = ak.to_numpy(ak.flatten(muons.pt))
+        eta = ak.to_numpy(ak.flatten(muons.eta))
+        phi = ak.to_numpy(ak.flatten(muons.phi))
+
+        SF = np.ones(len(pt))
+        SFErr = np.zeros(len(pt))
+        if matched.any():
+            genpt = ak.to_numpy(
+                ak.flatten(
+                    events.GenPart.pt[
+                        ak.values_astype(
+                            ak.where(muons.aux1 >= 0, muons.aux1, 0), "int64"
+                        )
+                    ]
+                )
+            )[matched]
+            args = (charge[matched], pt[matched], eta[matched], phi[matched], genpt)
+            SF[matched] = self.lookup.kSpreadMC(*args)
+            SFErr[matched] = self.lookup.kSpreadMCerror(*args)
+        if (~matched).any():
+            nlayers = ak.to_numpy(ak.flatten(muons.aux3))[~matched]
+            args = (
+                charge[~matched],
+                pt[~matched],
+                eta[~matched],
+                phi[~matched],
+                nlayers,
+                murand[~matched],
+            )
+            SF[~matched] = self.lookup.kSmearMC(*args)
+            SFErr[~matched] = self.lookup.kSmearMCerror(*args)
+
+        return (
+            ak.unflatten(pt * SF, nmuons),
+            ak.unflatten(pt * (SF + SFErr), nmuons),
+            ak.unflatten(pt * (SF - SFErr), nmuons),
+        )
+
+
+@correction_registry.warmup_hook
+def warmup(era, isMC):
+    if not isMC:
+        return
+    era = correction_registry.era_int(era)
+    for f in correction_registry.existing(rochesterFile(era)):
+        correction_registry.get(f, RochesterCorrections)
+
 
 def doLeptonScaleVariations(events, leptons, era):
     ## First the muons
     muonIndexes = abs(leptons.pdgId) == 13
     muons = leptons[muonIndexes]
-    rochester_data = lookup_tools.txt_converters.convert_rochester_file(
-        "data/MuScale/roccor.Run2.v3/RoccoR%i.txt" % (era if era != 2015 else 2016),
-        loaduncs=True,
-    )
-    rochester = lookup_tools.rochester_lookup.rochester_lookup(rochester_data)
-    murand = ak.unflatten(np.random.random(ak.sum(ak.num(muons))), ak.num(muons))
-
-    # muSF is the correction
-    muSF = rochester.kSmearMC(
-        muons.charge,
-        muons.pt,
-        muons.eta,
-        muons.phi,
-        muons.aux3,
-        murand,
-    )
-    genpt = events.GenPart.pt[
-        ak.values_astype(ak.where(muons.aux1 >= 0, muons.aux1, 0), "int64")
-    ]
-    muSF = ak.where(
-        muons.aux1 >= 0,
-        rochester.kSpreadMC(muons.charge, muons.pt, muons.eta, muons.phi, genpt),
-        muSF,
-    )
-    # muSFErr is the uncertainty
-    muSFErr = rochester.kSmearMCerror(
-        muons.charge,
-        muons.pt,
-        muons.eta,
-        muons.phi,
-        muons.aux3,
-        murand,
-    )
-    muSFErr = ak.where(
-        muons.aux1 >= 0,
-        rochester.kSpreadMCerror(muons.charge, muons.pt, muons.eta, muons.phi, genpt),
-        muSFErr,
-    )
+    rochester = correction_registry.get(rochesterFile(era), RochesterCorrections)
+    muPt, muPtUp, muPtDn = rochester.muonPts(events, muons)
 
     muCentral = ak.zip(
         {
-            "pt": muons.pt * muSF,
+            "pt": muPt,
             "eta": muons.eta,
             "phi": muons.phi,
             "mass": muons.mass,
@@ -59,7 +101,7 @@ def doLeptonScaleVariations(events, leptons, era):
 
     muUp = ak.zip(
         {
-            "pt": muons.pt * (muSF + muSFErr),
+            "pt": muPtUp,
             "eta": muons.eta,
             "phi": muons.phi,
             "mass": muons.mass,
@@ -69,7 +111,7 @@ def doLeptonScaleVariations(events, leptons, era):
     )
     muDn = ak.zip(
         {
-            "pt": muons.pt * (muSF - muSFErr),
+            "pt": muPtDn,
             "eta": muons.eta,
             "phi": muons.phi,
             "mass": muons.mass,
@@ -1,11 +1,44 @@
 import awkward as ak
-import correctionlib
 import numpy as np
 
+from workflows.CMS_corrections import correction_registry
+
+TRIGGER_SF_FILE = "data/LeptonTriggerSF/masterJSON.json"
+ELECTRON_SF_FILE = "data/EGammaUL%s/electron.json"
+MUON_SF_FILE = "data/MuUL%s/muon_Z.json"
+
+
+def leptonSFTags(era):
+    """Tags of the lepton SF files and of the era in the corrections"""
+    if era == 2015:
+        tag = "16APV"
+        etag = "2016preVFP"
+    elif era == 2016:
+        tag = "16"
+        etag = "2016postVFP"
+    elif era == 2017:
+        tag = "17"
+        etag = "2017"
+    elif era == 2018:
+        tag = "18"
+        etag = "2018"
+    return tag, etag
+
+
+@correction_registry.warmup_hook
+def warmup(era, isMC):
+    if not isMC:
+        return
+    tag, _ = leptonSFTags(correction_registry.era_int(era))
+    for f in correction_registry.existing(
+        TRIGGER_SF_FILE, ELECTRON_SF_FILE % tag, MUON_SF_FILE % tag
+    ):
+        correction_registry.correction_set(f)
+
 
 def doTriggerSFs(electrons, muons, era, do_syst=False):
-    ceval = correctionlib.CorrectionSet.from_file(
-        "data/LeptonTriggerSF/masterJSON.json"
+    ceval = correction_registry.correction_set(
+        TRIGGER_SF_FILE
     )  ## Assuming we always run from root dir
     year = str(era)
     SF = {}
@@ -81,29 +114,18 @@ def doTriggerSFs(electrons, muons, era, do_syst=False):
 
 
 def doLeptonSFs(electrons, muons, era):
-    if era == 2015:
-        tag = "16APV"
-        etag = "2016preVFP"
-    elif era == 2016:
-        tag = "16"
-        etag = "2016postVFP"
-    elif era == 2017:
-        tag = "17"
-        etag = "2017"
-    elif era == 2018:
-        tag = "18"
-        etag = "2018"
+    tag, etag = leptonSFTags(era)
 
     elecs, nelecs = ak.flatten(electrons), np.array(ak.num(electrons))
     mus, nmus = ak.flatten(muons), np.array(ak.num(muons))
 
-    elall = correctionlib.CorrectionSet.from_file(
-        "data/EGammaUL%s/electron.json" % tag
-    )["UL-Electron-ID-SF"]
-    muid = correctionlib.CorrectionSet.from_file("data/MuUL%s/muon_Z.json" % tag)[
+    elall = correction_registry.correction_set(ELECTRON_SF_FILE % tag)[
+        "UL-Electron-ID-SF"
+    ]
+    muid = correction_registry.correction_set(MUON_SF_FILE % tag)[
         "NUM_LooseID_DEN_TrackerMuons"
     ]
-    muiso = correctionlib.CorrectionSet.from_file("data/MuUL%s/muon_Z.json" % tag)[
+    muiso = correction_registry.correction_set(MUON_SF_FILE % tag)[
         "NUM_LooseRelIso_DEN_LooseID"
     ]
 
@@ -1,8 +1,40 @@
 import awkward as ak
 import numpy as np
 
+from workflows.CMS_corrections import correction_registry
+from workflows.utils.random_utils import TRACK_KILLING_STREAM, object_random
 
-def track_killing(self, tracks):
+TRACK_DATASCALING_FILE = "data/tracks/track_datascaling_2018_pt.txt"
+TRACK_OFFLINESCALING_FILE = "data/tracks/track_offlinescaling_2018_pt.txt"
+TRACK_DROP_FILE = "data/tracks/track_drop_2018.txt"
+TRACK_MULTIPLICITY_FILE = "data/tracks/track_multiplicity_ratio_2018.txt"
+
+
+@correction_registry.warmup_hook
+def warmup(era, isMC):
+    if not isMC:
+        return
+    for f in correction_registry.existing(
+        TRACK_DATASCALING_FILE,
+        TRACK_OFFLINESCALING_FILE,
+        TRACK_DROP_FILE,
+        TRACK_MULTIPLICITY_FILE,
+    ):
+        correction_registry.text_table(f)
+
+
+def drop_tracks(events, tracks, drop_probs):
+    """
+    Drop each track with its own probability, given as a flat array over the
+    content of tracks. The random numbers are keyed on (run, event, track index),
+    so the same tracks are dropped independently of the chunking.
+    """
+    rands, counts = object_random(events, tracks, TRACK_KILLING_STREAM)
+    keep = rands >= drop_probs
+    return tracks[ak.unflatten(keep, counts)]
+
+
+def track_killing(self, tracks, events):
     """
     Drop 2.7%, 2.2%, and 2.1% of the tracks randomly at reco-level
     for charged-particles with 1 < pT < 20 GeV in simulation for 2016, 2017, and
@@ -18,36 +50,14 @@ def track_killing(self, tracks):
         block1_percent = year_percent[str(self.era)]
         block2_percent = 0.01
 
-    block0_indices = tracks.pt <= 1
-    block1_indices = (tracks.pt > 1) & (tracks.pt < 20)
-    block2_indices = tracks.pt >= 20
-
-    new_indices = []
-
-    for i in range(len(tracks)):
-        event_indices = np.arange(len(tracks[i]))
-        event_bool = np.array([True] * len(tracks[i]))
-
-        block1_event_indices = event_indices[block1_indices[i]]
-        block1_event_indices_drop = np.random.choice(
-            block1_event_indices, int((block1_percent) * len(block1_event_indices))
-        )
-        event_bool[block1_event_indices_drop] = False
-
-        block2_event_indices = event_indices[block2_indices[i]]
-        block2_event_indices_drop = np.random.choice(
-            block2_event_indices, int((block2_percent) * len(block2_event_indices))
-        )
-        event_bool[block2_event_indices_drop] = False
-
-        new_indices.append(list(event_bool))
-
-    new_indices = ak.Array(new_indices)
-    tracks = tracks[new_indices]
-    return tracks
+    pt = ak.to_numpy(ak.flatten(tracks.pt))
+    drop_probs = np.select(
+        [(pt > 1) & (pt < 20), pt >= 20], [block1_percent, block2_percent], 0.0
+    )
+    return drop_tracks(events, tracks, drop_probs)
 
 
-def scout_track_killing(self, tracks):
+def scout_track_killing(self, tracks, events):
     """
     Drop 2.5% of the tracks randomly at reco-level
     for charged-particles with 1 < pT < 20 GeV in simulation when reclustering the constituents.
@@ -61,55 +71,42 @@ def scout_track_killing(self, tracks):
     """
 
     # Read in the scaling files
-    np.random.seed(2022)  # random seed to get repeatable results
     pt_bins = np.array(
         [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.75, 1, 1.25, 1.5, 2.0, 3, 10, 20, 50]
     )
-    datascale = np.loadtxt("data/tracks/track_datascaling_2018_pt.txt", delimiter=",")
-    qcdscale = np.loadtxt("data/tracks/track_offlinescaling_2018_pt.txt", delimiter=",")
+    datascale = correction_registry.text_table(TRACK_DATASCALING_FILE)
+    qcdscale = correction_registry.text_table(TRACK_OFFLINESCALING_FILE)
 
     # Create the scaling and apply it to the random killing
     scaling = np.divide(qcdscale, datascale)
     scaling = np.append(scaling, scaling[-1])
-    trackbin = np.digitize(ak.flatten(tracks.pt), pt_bins) - 1
+    pt = ak.to_numpy(ak.flatten(tracks.pt))
+    trackbin = np.digitize(pt, pt_bins) - 1
     scale = np.take(scaling, trackbin)
-    probs = ak.where(
-        ak.flatten(tracks["pt"]) < 20, 0.025 * scale, 0.01 * scale
-    )  # 5% if pt < 1, otherwise 2%.
-    rands = np.random.rand(len(probs)) > probs
-    trk_killer = ak.Array(
-        ak.layout.ListOffsetArray64(tracks.layout.offsets, ak.layout.NumpyArray(rands))
-    )
+    drop_probs = np.where(pt < 20, 0.025 * scale, 0.01 * scale)
 
     # Create the new track collection with killed tracks
-    tracks = tracks[trk_killer]
-    return tracks
+    return drop_tracks(events, tracks, drop_probs)
 
 
-def scout_track_killingOffline(self, tracks):
+def scout_track_killingOffline(self, tracks, events):
     # Read in the scaling files
-    np.random.seed(2022)  # random seed to get repeatable results
     pt_bins = np.array(
         [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.75, 1, 1.25, 1.5, 2.0, 3, 10, 20, 50]
     )
     eta_bins = np.array(range(-250, 275, 25)) / 100.0
-    trackwgts = np.loadtxt("data/tracks/track_drop_2018.txt", delimiter=",")
+    trackwgts = correction_registry.text_table(TRACK_DROP_FILE)
     trackwgts = np.vstack((trackwgts, trackwgts[-1]))  # repeat last bin for overflow
     trackwgts = trackwgts.flatten()
 
     # Create the scaling and apply it to the random killing
-    ptbin = np.digitize(ak.flatten(tracks["pt"]), pt_bins) - 1
-    etabin = np.digitize(ak.flatten(tracks["eta"]), eta_bins) - 1
+    ptbin = np.digitize(ak.to_numpy(ak.flatten(tracks["pt"])), pt_bins) - 1
+    etabin = np.digitize(ak.to_numpy(ak.flatten(tracks["eta"])), eta_bins) - 1
     bins = np.add((ptbin) * (len(eta_bins) - 1), etabin)
-    probs = np.take(trackwgts, bins)
-    rands = np.random.rand(len(probs)) < probs  # keep track is less than probability
-    trk_killer = ak.Array(
-        ak.layout.ListOffsetArray64(tracks.layout.offsets, ak.layout.NumpyArray(rands))
-    )
+    keep_probs = np.take(trackwgts, bins)
 
     # Create the new track collection with killed tracks
-    tracks = tracks[trk_killer]
-    return tracks
+    return drop_tracks(events, tracks, 1 - keep_probs)
 
 
 def scaleTracksOffline(self, spherex):
@@ -168,10 +165,8 @@ def scaleTracksOffline(self, spherex):
             300.0,
         ]
     )
-    trackwgts = np.loadtxt(
-        "data/tracks/track_multiplicity_ratio_2018.txt", delimiter=","
-    )
-    trackwgts[trackwgts == 0] = 0.12907325
+    trackwgts = correction_registry.text_table(TRACK_MULTIPLICITY_FILE)
+    trackwgts = np.where(trackwgts == 0, 0.12907325, trackwgts)
     trackbin = np.digitize(spherex.FatJet.nconst, track_bins) - 1
     probs = np.take(trackwgts, trackbin)
     spherex["wgt"] = spherex["wgt"] * 1 / probs
@@ -9,7 +9,6 @@ from typing import Optional
 
 import awkward as ak
 import numpy as np
-import pandas as pd
 import vector
 from coffea import processor
 
@@ -18,7 +17,11 @@ import workflows.SUEP_utils as SUEP_utils
 import workflows.ZH_utils as ZH_utils
 
 # Importing CMS corrections
-from workflows.CMS_corrections.golden_jsons_utils import applyGoldenJSON
+from workflows.CMS_corrections import correction_registry, golden_jsons_utils
+from workflows.CMS_corrections.golden_jsons_utils import (
+    applyGoldenJSON,
+    goldenJSONFile,
+)
 from workflows.CMS_corrections.HEM_utils import jetHEMFilter
 from workflows.CMS_corrections.jetmet_utils import apply_jecs
 from workflows.CMS_corrections.PartonShower_utils import GetPSWeights
@@ -29,7 +32,9 @@ from workflows.CMS_corrections.track_killing_utils import (
 )
 
 # IO utils
-from workflows.utils import pandas_utils
+from workflows.utils import pandas_utils, scouting_schema, skim_cache
+from workflows.utils.branch_manifest import BranchManifest, met_filters
+from workflows.utils.column_store import ColumnStore
 
 # Set vector behavior
 vector.register_awkward()
@@ -50,6 +55,7 @@ class SUEP_cluster(processor.ProcessorABC):
         output_location: Optional[str],
         accum: Optional[bool] = None,
         trigger: Optional[str] = None,
+        skim: Optional[str] = None,
     ) -> None:
         self._flag = flag
         self.output_location = output_location
@@ -68,7 +74,9 @@ class SUEP_cluster(processor.ProcessorABC):
         self.doOF = False
         self.accum = accum
         self.trigger = trigger
-        self.out_vars = pd.DataFrame()
+        self.skim = skim  # None, "write" or "read", see utils.skim_cache
+        self.skim_gensumweight = 0.0
+        self.out_vars = ColumnStore()
 
         if self.do_inf:
             # ML settings
@@ -99,6 +107,81 @@ class SUEP_cluster(processor.ProcessorABC):
     def accumulator(self):
         return self._accumulator
 
+    def branchManifest(self):
+        """
+        Branches read by this configuration (see utils.branch_manifest), the ones
+        not declared here are not read by the preloading.
+        """
+        manifest = BranchManifest(["run", "event", "Jet_*"])
+        if self.scouting == 1:
+            # names in the scouting ntuples, masses are "_m", see utils.scouting_schema
+            manifest.add("lumSec", "scouting_trig", "rho", "Vertex_x")
+            manifest.collection("PFcand", ["pt", "eta", "phi", "m", "vertex", "q"])
+            manifest.add("Muon_*", "Electron_*")
+            if "2016" in self.era:
+                manifest.add("OffJet_*")
+                manifest.collection(
+                    "offlineTrack", ["pt", "eta", "phi", "m", "quality"]
+                )
+            if self.isMC:
+                manifest.add("PU_num", "PSweights")
+                if self.era in ["2016", "2016apv", "2017"]:
+                    manifest.add("prefire", "prefireup", "prefiredown")
+                if "SUEP" in self.sample:
+                    manifest.collection("scalar", ["pt", "eta", "phi", "m"])
+            return manifest
+
+        manifest.add("luminosityBlock", "fixedGridRhoFastjetAll", "MET_*")
+        manifest.add("PV_npvs", "PV_npvsGood", "Muon_*", "Electron_*")
+        manifest.add(*met_filters(self.era))
+        manifest.add("HLT_PFHT900" if "2016" in self.era else "HLT_PFHT1050")
+        if self.trigger == "TripleMu":
+            if self.era in ["2016", "2016apv"]:
+                manifest.add("HLT_TripleMu_5_3_3")
+            elif self.era == "2017":
+                manifest.add("HLT_TripleMu_5_3_3_Mass3p8to60_DZ")
+            else:
+                manifest.add("HLT_TripleMu_5_3_3_Mass3p8_DZ")
+        manifest.collection(
+            "PFCands", ["trkPt", "trkEta", "trkPhi", "mass", "fromPV", "dz", "dzErr"]
+        )
+        manifest.collection("lostTracks", ["pt", "eta", "phi", "fromPV", "dz", "dzErr"])
+        if self.isMC:
+            manifest.add("genWeight", "Pileup_nTrueInt", "PSWeight", "GenJet_*")
+            manifest.collection("GenPart", ["pt", "eta", "phi", "mass", "pdgId"])
+            if self.era in ["2016", "2016apv", "2017"]:
+                manifest.add("L1PreFiringWeight_*")
+        return manifest
+
+    def skimVersion(self):
+        """
+        Version of the early selections (see earlySelection and utils.skim_cache), it
+        changes with their code, that of the modules of the helpers they call, and
+        their configuration.
+        """
+        return skim_cache.selection_version(
+            [
+                SUEP_cluster.earlySelection,
+                SUEP_cluster.eventSelection,
+                SUEP_cluster.selectByFilters,
+                applyGoldenJSON,
+                ZH_utils.selectByLeptons,
+            ],
+            modules=[
+                ZH_utils,
+                golden_jsons_utils,
+                correction_registry,
+                scouting_schema,
+            ],
+            config=dict(
+                era=self.era,
+                isMC=self.isMC,
+                scouting=self.scouting,
+                trigger=self.trigger,
+            ),
+            files=[] if self.isMC else [goldenJSONFile(self)],
+        )
+
     def jet_awkward(self, Jets):
         """
         Create awkward array of jets. Applies basic selections.
@@ -357,6 +440,32 @@ class SUEP_cluster(processor.ProcessorABC):
 
         return looseElectrons, looseMuons
 
+    def getGenSUEP(self, events):
+        """Mass, pt, eta, phi of the generated SUEP scalar for each event."""
+        SUEP_genMass = np.zeros(len(events))
+        SUEP_genPt = np.zeros(len(events))
+        SUEP_genEta = np.zeros(len(events))
+        SUEP_genPhi = np.zeros(len(events))
+
+        if self.isMC and not self.scouting:
+            genParts = self.getGenTracks(events)
+            genSUEP = genParts[(abs(genParts.pdgID) == 25)]
+
+            # we need to grab the last SUEP in the chain for each event
+            genSUEP = SUEP_utils.genKinematics(genSUEP)
+            SUEP_genMass = genSUEP["mass"]
+            SUEP_genPt = genSUEP["pt"]
+            SUEP_genPhi = genSUEP["phi"]
+            SUEP_genEta = genSUEP["eta"]
+
+        if self.isMC and self.scouting and "SUEP" in self.sample:
+            SUEP_genMass = events.scalar.mass
+            SUEP_genPt = events.scalar.pt
+            SUEP_genPhi = events.scalar.phi
+            SUEP_genEta = events.scalar.eta
+
+        return SUEP_genMass, SUEP_genPt, SUEP_genEta, SUEP_genPhi
+
     def storeEventVars(
         self,
         events,
@@ -365,6 +474,7 @@ class SUEP_cluster(processor.ProcessorABC):
         ak_inclusive_cluster,
         electrons,
         muons,
+        gen_SUEP,
         out_label="",
     ):
         # select out ak4jets
@@ -373,71 +483,68 @@ class SUEP_cluster(processor.ProcessorABC):
         else:
             ak4jets = self.jet_awkward(events.Jet)
 
-        # work on JECs and systematics
-        prefix = ""
-        if self.accum:
-            if "dask" in self.accum:
-                prefix = "dask-worker-space/"
-        jets_c, met_c = apply_jecs(
-            self, Sample=self.sample, events=events, prefix=prefix
-        )
-        jet_HEM_Cut, _ = jetHEMFilter(self, jets_c, events.run)
-        jets_c = jets_c[jet_HEM_Cut]
-        jets_jec = self.jet_awkward(jets_c)
-        if self.isMC:
-            jets_jec_JERUp = self.jet_awkward(jets_c["JER"].up)
-            jets_jec_JERDown = self.jet_awkward(jets_c["JER"].down)
-            jets_jec_JESUp = self.jet_awkward(jets_c["JES_jes"].up)
-            jets_jec_JESDown = self.jet_awkward(jets_c["JES_jes"].down)
-        # For data set these all to nominal so we can plot without switching all of the names
-        else:
-            jets_jec_JERUp = jets_jec
-            jets_jec_JERDown = jets_jec
-            jets_jec_JESUp = jets_jec
-            jets_jec_JESDown = jets_jec
-
         # save per event variables to a dataframe
-        self.out_vars["event" + out_label] = events.event.to_list()
+        self.out_vars["event" + out_label] = events.event
         self.out_vars["run" + out_label] = events.run
 
         if self.scouting == 1:
             self.out_vars["lumi" + out_label] = events.lumSec
         else:
             self.out_vars["luminosityBlock" + out_label] = events.luminosityBlock
-        self.out_vars["ntracks" + out_label] = ak.num(tracks).to_list()
-        self.out_vars["ngood_fastjets" + out_label] = ak.num(
-            ak_inclusive_jets
-        ).to_list()
+        self.out_vars["ntracks" + out_label] = ak.num(tracks)
+        self.out_vars["ngood_fastjets" + out_label] = ak.num(ak_inclusive_jets)
 
         if out_label == "":
-            self.out_vars["ht" + out_label] = ak.sum(ak4jets.pt, axis=-1).to_list()
-            self.out_vars["ht_JEC" + out_label] = ak.sum(jets_jec.pt, axis=-1).to_list()
+            # work on JECs and systematics, they don't depend on the tracks
+            # so they are only needed once, for the nominal variables
+            prefix = ""
+            if self.accum:
+                if "dask" in self.accum:
+                    prefix = "dask-worker-space/"
+            jets_c, met_c = apply_jecs(
+                self, Sample=self.sample, events=events, prefix=prefix
+            )
+            jet_HEM_Cut, _ = jetHEMFilter(self, jets_c, events.run)
+            jets_c = jets_c[jet_HEM_Cut]
+            jets_jec = self.jet_awkward(jets_c)
+            if self.isMC:
+                jets_jec_JERUp = self.jet_awkward(jets_c["JER"].up)
+                jets_jec_JERDown = self.jet_awkward(jets_c["JER"].down)
+                jets_jec_JESUp = self.jet_awkward(jets_c["JES_jes"].up)
+                jets_jec_JESDown = self.jet_awkward(jets_c["JES_jes"].down)
+            # For data set these all to nominal so we can plot without switching all of the names
+            else:
+                jets_jec_JERUp = jets_jec
+                jets_jec_JERDown = jets_jec
+                jets_jec_JESUp = jets_jec
+                jets_jec_JESDown = jets_jec
+
+            self.out_vars["ht" + out_label] = ak.sum(ak4jets.pt, axis=-1)
+            self.out_vars["ht_JEC" + out_label] = ak.sum(jets_jec.pt, axis=-1)
             self.out_vars["ht_JEC" + out_label + "_JER_up"] = ak.sum(
                 jets_jec_JERUp.pt, axis=-1
-            ).to_list()
+            )
             self.out_vars["ht_JEC" + out_label + "_JER_down"] = ak.sum(
                 jets_jec_JERDown.pt, axis=-1
-            ).to_list()
+            )
             self.out_vars["ht_JEC" + out_label + "_JES_up"] = ak.sum(
                 jets_jec_JESUp.pt, axis=-1
-            ).to_list()
+            )
             self.out_vars["ht_JEC" + out_label + "_JES_down"] = ak.sum(
                 jets_jec_JESDown.pt, axis=-1
-            ).to_list()
+            )
             self.out_vars["n_sel_electrons"] = ak.to_numpy(ak.num(electrons))
             self.out_vars["n_sel_muons"] = ak.to_numpy(ak.num(muons))
             self.out_vars["n_sel_leps"] = ak.to_numpy(ak.num(electrons)) + ak.to_numpy(
                 ak.num(muons)
             )
-            self.out_vars["ngood_ak4jets" + out_label] = ak.num(ak4jets).to_list()
+            self.out_vars["ngood_ak4jets" + out_label] = ak.num(ak4jets)
 
             # store event weights for MC
             if self.isMC and self.scouting == 0:
                 self.out_vars["genweight"] = events.genWeight
             elif self.isMC and self.scouting == 1:
-                self.out_vars["genweight"] = [
-                    1.0 for e in (len(events) * [0])
-                ]  # create awkward array of ones
+                self.out_vars["genweight"] = np.ones(len(events))
 
             if "2016" in self.era and self.scouting == 0:
                 self.out_vars["HLT_PFHT900" + out_label] = events.HLT.PFHT900
@@ -471,27 +578,7 @@ class SUEP_cluster(processor.ProcessorABC):
                 self.out_vars["prefire_down"] = prefireweights[2]
 
         # get gen SUEP kinematics
-        SUEP_genMass = len(events) * [0]
-        SUEP_genPt = len(events) * [0]
-        SUEP_genEta = len(events) * [0]
-        SUEP_genPhi = len(events) * [0]
-
-        if self.isMC and not self.scouting:
-            genParts = self.getGenTracks(events)
-            genSUEP = genParts[(abs(genParts.pdgID) == 25)]
-
-            # we need to grab the last SUEP in the chain for each event
-            SUEP_genMass = [g[-1].mass if len(g) > 0 else 0 for g in genSUEP]
-            SUEP_genPt = [g[-1].pt if len(g) > 0 else 0 for g in genSUEP]
-            SUEP_genPhi = [g[-1].phi if len(g) > 0 else 0 for g in genSUEP]
-            SUEP_genEta = [g[-1].eta if len(g) > 0 else 0 for g in genSUEP]
-
-        if self.isMC and self.scouting and "SUEP" in self.sample:
-            SUEP_genMass = events.scalar.mass
-            SUEP_genPt = events.scalar.pt
-            SUEP_genPhi = events.scalar.phi
-            SUEP_genEta = events.scalar.eta
-
+        SUEP_genMass, SUEP_genPt, SUEP_genEta, SUEP_genPhi = gen_SUEP
         self.out_vars["SUEP_genMass" + out_label] = SUEP_genMass
         self.out_vars["SUEP_genPt" + out_label] = SUEP_genPt
         self.out_vars["SUEP_genEta" + out_label] = SUEP_genEta
@@ -536,12 +623,11 @@ class SUEP_cluster(processor.ProcessorABC):
         for iCol in range(len(self.columns)):
             self.columns[iCol] = self.columns[iCol] + label
 
-    def analysis(self, events, do_syst=False, col_label=""):
-        #####################################################################################
-        # ---- Trigger event selection
-        # Cut based on ak4 jets to replicate the trigger
-        #####################################################################################
-
+    def earlySelection(self, events):
+        """
+        Golden JSON, lepton veto, trigger and MET filters, the selections whose
+        passing entries are stored in the skim cache (see utils.skim_cache).
+        """
         # golden jsons for offline data
         if self.isMC == 0:
             events = applyGoldenJSON(self, events)
@@ -549,34 +635,64 @@ class SUEP_cluster(processor.ProcessorABC):
         events = self.eventSelection(events)
         if self.scouting != 1:
             events = self.selectByFilters(events)
+        return events
 
-        # output empty dataframe if no events pass trigger
+    def preselection(self, events):
+        """
+        Track-independent stages of the analysis: event selections, track and
+        lepton collections, gen information. These are computed once per chunk
+        and shared by the nominal and the track systematic variations.
+        """
+        #####################################################################################
+        # ---- Trigger event selection
+        # Cut based on ak4 jets to replicate the trigger
+        #####################################################################################
+
+        # the inputs of a skim are the events that already passed them
+        if self.skim != "read":
+            events = self.earlySelection(events)
+
+        presel = {"events": events}
         if len(events) == 0:
-            print("No events passed trigger. Saving empty outputs.")
-            if self.accum == "pandas_merger":
-                self.out_vars = pd.DataFrame(["empty"], columns=["empty"])
-            elif self.accum:
-                self.initializeColumns(col_label)
-                for c in self.columns:
-                    self.out_vars[c] = np.nan
-            return
+            return presel
 
         #####################################################################################
         # ---- Track selection
         # Prepare the clean PFCand matched to tracks collection
         #####################################################################################
         if self.scouting == 1:
-            tracks, Cleaned_cands = self.getScoutingTracks(events)
+            presel["tracks"], presel["Cleaned_cands"] = self.getScoutingTracks(events)
         else:
-            tracks, Cleaned_cands = self.getTracks(events)
-        looseElectrons, looseMuons = self.getLooseLeptons(events)
+            presel["tracks"], presel["Cleaned_cands"] = self.getTracks(events)
+        presel["looseElectrons"], presel["looseMuons"] = self.getLooseLeptons(events)
+        presel["gen_SUEP"] = self.getGenSUEP(events)
+
+        return presel
+
+    def analysis(self, presel, do_syst=False, col_label=""):
+        events = presel["events"]
+
+        # output empty dataframe if no events pass trigger
+        if len(events) == 0:
+            print("No events passed trigger. Saving empty outputs.")
+            if self.accum == "pandas_merger":
+                self.out_vars = ColumnStore({"empty": np.array(["empty"])})
+            elif self.accum:
+                self.initializeColumns(col_label)
+                if self.out_vars.nrows is None:
+                    self.out_vars.nrows = 0
+                self.out_vars.declare(self.columns)
+            return
+
+        tracks = presel["tracks"]
+        Cleaned_cands = presel["Cleaned_cands"]
         if self.isMC and do_syst and self.scouting == 1:
-            tracks = scout_track_killing(self, tracks)
-            Cleaned_cands = scout_track_killing(self, Cleaned_cands)
+            tracks = scout_track_killing(self, tracks, events)
+            Cleaned_cands = scout_track_killing(self, Cleaned_cands, events)
 
         if self.isMC and do_syst and self.scouting == 0:
-            tracks = track_killing(self, tracks)
-            Cleaned_cands = track_killing(self, Cleaned_cands)
+            tracks = track_killing(self, tracks, events)
+            Cleaned_cands = track_killing(self, Cleaned_cands, events)
 
         #####################################################################################
         # ---- FastJet reclustering
@@ -601,8 +717,9 @@ class SUEP_cluster(processor.ProcessorABC):
             tracks,
             ak_inclusive_jets,
             ak_inclusive_cluster,
-            looseElectrons,
-            looseMuons,
+            presel["looseElectrons"],
+            presel["looseMuons"],
+            presel["gen_SUEP"],
             out_label=col_label,
         )
 
@@ -626,8 +743,7 @@ class SUEP_cluster(processor.ProcessorABC):
         # output file if no events pass selections, avoids errors later on
         if len(tracks) == 0:
             print("No events pass clusterCut.")
-            for c in self.columns:
-                self.out_vars[c] = np.nan
+            self.out_vars.declare(self.columns)
             return
 
         tracks, indices, topTwoJets = SUEP_utils.getTopTwoJets(
@@ -665,37 +781,55 @@ class SUEP_cluster(processor.ProcessorABC):
         output = self.accumulator.identity()
         dataset = events.metadata["dataset"]
 
+        # fresh output table for this chunk
+        self.out_vars = ColumnStore()
+
         # gen weights
-        if self.isMC and self.scouting == 1:
+        if self.isMC and self.skim == "read":
+            # the input is a skim, count the gen weights of the whole file once
+            first = events.metadata.get("entrystart", 0) == 0
+            self.gensumweight = self.skim_gensumweight if first else 0.0
+        elif self.isMC and self.scouting == 1:
             self.gensumweight = ak.num(events.PFcand.pt, axis=0)
         elif self.isMC:
             self.gensumweight = ak.sum(events.genWeight)
 
+        # entry numbers, to store those that pass the early selections
+        if self.skim == "write":
+            events["entry"] = np.arange(
+                events.metadata["entrystart"], events.metadata["entrystop"]
+            )
+
+        # track-independent selections, shared by all the variations below
+        presel = self.preselection(events)
+        if self.skim == "write":
+            output["skim"] = skim_cache.skim_output(
+                events, presel["events"], self.gensumweight if self.isMC else 0.0
+            )
+
         # run the analysis with the track systematics applied
         if self.isMC and self.do_syst:
-            self.analysis(events, do_syst=True, col_label="_track_down")
+            self.analysis(presel, do_syst=True, col_label="_track_down")
 
         # run the analysis
-        self.analysis(events)
+        self.analysis(presel)
 
         # output result to dask dataframe accumulator
         if self.accum:
             if "dask" in self.accum:
-                return self.out_vars
+                return self.out_vars.to_pandas()
 
             # output result to iterative/futures accumulator
             if "iterative" in self.accum or "futures" in self.accum:
                 # Convert output to the desired format when the accumulator is used
-                for c in self.out_vars.columns:
-                    output[c] = self.out_vars[c].to_list()
-                output = {dataset: self.out_vars}
+                output = {dataset: self.out_vars.to_pandas()}
                 return output
 
             if "pandas_merger" == self.accum:
                 # save the out_vars object as a Pandas DataFrame
                 pandas_utils.save_dfs(
                     self,
-                    [self.out_vars],
+                    [self.out_vars.to_pandas()],
                     ["vars"],
                     "ntuple_"
                     + events.behavior["__events_factory__"]._partition_key.replace(
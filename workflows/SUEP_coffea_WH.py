@@ -4,6 +4,7 @@ Coffea producer for SUEP WH analysis. Uses fastjet package to recluster large je
 https://github.com/scikit-hep/fastjet
 Pietro Lugato, Chad Freer, Luca Lavezzo 2023
 """
+from collections import defaultdict
 from typing import Optional
 
 import awkward as ak
@@ -30,6 +31,7 @@ from workflows.CMS_corrections.track_killing_utils import (
 
 # IO utils
 from workflows.utils import pandas_utils
+from workflows.utils.branch_manifest import BranchManifest, met_filters
 from workflows.utils.pandas_accumulator import pandas_accumulator
 
 # Set vector behavior
@@ -69,6 +71,34 @@ class SUEP_cluster_WH(processor.ProcessorABC):
         self.trigger = trigger
         self.out_vars = pd.DataFrame()
 
+    def branchManifest(self):
+        """
+        Branches read by this configuration (see utils.branch_manifest), the ones
+        not declared here are not read by the preloading.
+        """
+        manifest = BranchManifest(["run", "event", "luminosityBlock"])
+        manifest.add("Jet_*", "Muon_*", "Electron_*", "fixedGridRhoFastjetAll")
+        manifest.add("PV_npvs", "PV_npvsGood", *met_filters(self.era))
+        for met in ["MET", "CaloMET", "ChsMET", "TkMET", "RawMET"]:
+            manifest.add(f"{met}_*")
+        manifest.add("PuppiMET_*", "RawPuppiMET_*")
+        manifest.add("HLT_IsoMu27", "HLT_Mu50")
+        manifest.add("HLT_Ele32_WPTight_Gsf", "HLT_Ele115_CaloIdVT_GsfTrkIdT")
+        manifest.add("HLT_Photon200")
+        manifest.collection(
+            "PFCands",
+            ["trkPt", "trkEta", "trkPhi", "mass", "fromPV", "dz", "d0", "puppiWeight"],
+        )
+        manifest.collection(
+            "lostTracks", ["pt", "eta", "phi", "fromPV", "dz", "d0", "puppiWeight"]
+        )
+        if self.isMC:
+            manifest.add("genWeight", "Pileup_nTrueInt", "PSWeight", "GenJet_*")
+            manifest.collection("GenPart", ["pt", "eta", "phi", "mass", "pdgId"])
+            if self.era in ["2016", "2016apv", "2017"]:
+                manifest.add("L1PreFiringWeight_*")
+        return manifest
+
     def jet_awkward(self, Jets, lepton):
         """
         Create awkward array of jets. Applies basic selections.
@@ -222,6 +252,32 @@ class SUEP_cluster_WH(processor.ProcessorABC):
 
         return tracks, Cleaned_cands
 
+    def getGenSUEP(self, events):
+        """Mass, pt, eta, phi of the generated SUEP scalar for each event."""
+        SUEP_genMass = np.zeros(len(events))
+        SUEP_genPt = np.zeros(len(events))
+        SUEP_genEta = np.zeros(len(events))
+        SUEP_genPhi = np.zeros(len(events))
+
+        if self.isMC and not self.scouting:
+            genParts = self.getGenTracks(events)
+            genSUEP = genParts[(abs(genParts.pdgID) == 25)]
+
+            # we need to grab the last SUEP in the chain for each event
+            genSUEP = SUEP_utils.genKinematics(genSUEP)
+            SUEP_genMass = genSUEP["mass"]
+            SUEP_genPt = genSUEP["pt"]
+            SUEP_genPhi = genSUEP["phi"]
+            SUEP_genEta = genSUEP["eta"]
+
+        if self.isMC and self.scouting and "SUEP" in self.sample:
+            SUEP_genMass = events.scalar.mass
+            SUEP_genPt = events.scalar.pt
+            SUEP_genPhi = events.scalar.phi
+            SUEP_genEta = events.scalar.eta
+
+        return SUEP_genMass, SUEP_genPt, SUEP_genEta, SUEP_genPhi
+
     def storeEventVars(
         self,
         events,
@@ -229,83 +285,16 @@ class SUEP_cluster_WH(processor.ProcessorABC):
         ak_inclusive_jets,
         ak_inclusive_cluster,
         lepton,
+        gen_SUEP,
         output,
         out_label="",
     ):
         # select out ak4jets
         ak4jets = self.jet_awkward(events.Jet, lepton)
 
-        # work on JECs and systematics
-        prefix = ""
-        if self.accum:
-            if "dask" in self.accum:
-                prefix = "dask-worker-space/"
-        jets_c, met_c = apply_jecs(
-            self,
-            Sample=self.sample,
-            events=events,
-            prefix=prefix,
-        )
-        jet_HEM_Cut, _ = jetHEMFilter(self, jets_c, events.run)
-        jets_c = jets_c[jet_HEM_Cut]
-        jets_jec = self.jet_awkward(jets_c, lepton)
-        if self.isMC:
-            jets_jec_JERUp = self.jet_awkward(jets_c["JER"].up, lepton)
-            jets_jec_JERDown = self.jet_awkward(jets_c["JER"].down, lepton)
-            jets_jec_JESUp = self.jet_awkward(jets_c["JES_jes"].up, lepton)
-            jets_jec_JESDown = self.jet_awkward(jets_c["JES_jes"].down, lepton)
-            PuppiMET_phi_JERUp = events.PuppiMET.phiJERUp
-            PuppiMET_phi_JERDown = events.PuppiMET.phiJERDown
-            PuppiMET_phi_JESUp = events.PuppiMET.phiJESUp
-            PuppiMET_phi_JESDown = events.PuppiMET.phiJESDown
-            PuppiMET_pt_JERUp = events.PuppiMET.ptJERUp
-            PuppiMET_pt_JERDown = events.PuppiMET.ptJERDown
-            PuppiMET_pt_JESUp = events.PuppiMET.ptJESUp
-            PuppiMET_pt_JESDown = events.PuppiMET.ptJESDown
-            MET_JEC_phi_JERUp = met_c.JER.up.phi
-            MET_JEC_phi_JERDown = met_c.JER.down.phi
-            MET_JEC_phi_JESUp = met_c.JES_jes.up.phi
-            MET_JEC_phi_JESDown = met_c.JES_jes.down.phi
-            MET_JEC_phi_UnclusteredEnergyUp = met_c.MET_UnclusteredEnergy.up.phi
-            MET_JEC_phi_UnclusteredEnergyDown = met_c.MET_UnclusteredEnergy.down.phi
-            MET_JEC_pt_JERUp = met_c.JER.up.pt
-            MET_JEC_pt_JERDown = met_c.JER.up.pt
-            MET_JEC_pt_JESUp = met_c.JES_jes.up.pt
-            MET_JEC_pt_JESDown = met_c.JES_jes.down.pt
-            MET_JEC_pt_UnclusteredEnergyUp = met_c.MET_UnclusteredEnergy.up.pt
-            MET_JEC_pt_UnclusteredEnergyDown = met_c.MET_UnclusteredEnergy.down.pt
-        # For data set these all to nominal so we can plot without switching all of the names
-        else:
-            jets_jec_JERUp = jets_jec
-            jets_jec_JERDown = jets_jec
-            jets_jec_JESUp = jets_jec
-            jets_jec_JESDown = jets_jec
-            PuppiMET_phi_JERUp = events.PuppiMET.phi
-            PuppiMET_phi_JERDown = events.PuppiMET.phi
-            PuppiMET_phi_JESUp = events.PuppiMET.phi
-            PuppiMET_phi_JESDown = events.PuppiMET.phi
-            PuppiMET_pt_JERUp = events.PuppiMET.pt
-            PuppiMET_pt_JERDown = events.PuppiMET.pt
-            PuppiMET_pt_JESUp = events.PuppiMET.pt
-            PuppiMET_pt_JESDown = events.PuppiMET.pt
-            MET_JEC_phi_JERUp = met_c.phi
-            MET_JEC_phi_JERDown = met_c.phi
-            MET_JEC_phi_JESUp = met_c.phi
-            MET_JEC_phi_JESDown = met_c.phi
-            MET_JEC_phi_UnclusteredEnergyUp = met_c.phi
-            MET_JEC_phi_UnclusteredEnergyDown = met_c.phi
-            MET_JEC_pt_JERUp = met_c.pt
-            MET_JEC_pt_JERDown = met_c.pt
-            MET_JEC_pt_JESUp = met_c.pt
-            MET_JEC_pt_JESDown = met_c.pt
-            MET_JEC_pt_UnclusteredEnergyUp = met_c.pt
-            MET_JEC_pt_UnclusteredEnergyDown = met_c.pt
-
         # save per event variables to a dataframe
-        output["vars"]["ntracks" + out_label] = ak.num(tracks).to_list()
-        output["vars"]["ngood_fastjets" + out_label] = ak.num(
-            ak_inclusive_jets
-        ).to_list()
+        output["vars"]["ntracks" + out_label] = ak.num(tracks)
+        output["vars"]["ngood_fastjets" + out_label] = ak.num(ak_inclusive_jets)
 
         # saving number of bjets for different definitions (higher or lower requirements on b-likeliness) - see btag_utils.py
         output["vars"]["nBLoose"] = ak.sum(
@@ -374,25 +363,92 @@ class SUEP_cluster_WH(processor.ProcessorABC):
         )[:, 0]
 
         if out_label == "":
-            output["vars"]["event" + out_label] = events.event.to_list()
+            # work on JECs and systematics, they don't depend on the tracks
+            # so they are only needed once, for the nominal variables
+            prefix = ""
+            if self.accum:
+                if "dask" in self.accum:
+                    prefix = "dask-worker-space/"
+            jets_c, met_c = apply_jecs(
+                self,
+                Sample=self.sample,
+                events=events,
+                prefix=prefix,
+            )
+            jet_HEM_Cut, _ = jetHEMFilter(self, jets_c, events.run)
+            jets_c = jets_c[jet_HEM_Cut]
+            jets_jec = self.jet_awkward(jets_c, lepton)
+            if self.isMC:
+                jets_jec_JERUp = self.jet_awkward(jets_c["JER"].up, lepton)
+                jets_jec_JERDown = self.jet_awkward(jets_c["JER"].down, lepton)
+                jets_jec_JESUp = self.jet_awkward(jets_c["JES_jes"].up, lepton)
+                jets_jec_JESDown = self.jet_awkward(jets_c["JES_jes"].down, lepton)
+                PuppiMET_phi_JERUp = events.PuppiMET.phiJERUp
+                PuppiMET_phi_JERDown = events.PuppiMET.phiJERDown
+                PuppiMET_phi_JESUp = events.PuppiMET.phiJESUp
+                PuppiMET_phi_JESDown = events.PuppiMET.phiJESDown
+                PuppiMET_pt_JERUp = events.PuppiMET.ptJERUp
+                PuppiMET_pt_JERDown = events.PuppiMET.ptJERDown
+                PuppiMET_pt_JESUp = events.PuppiMET.ptJESUp
+                PuppiMET_pt_JESDown = events.PuppiMET.ptJESDown
+                MET_JEC_phi_JERUp = met_c.JER.up.phi
+                MET_JEC_phi_JERDown = met_c.JER.down.phi
+                MET_JEC_phi_JESUp = met_c.JES_jes.up.phi
+                MET_JEC_phi_JESDown = met_c.JES_jes.down.phi
+                MET_JEC_phi_UnclusteredEnergyUp = met_c.MET_UnclusteredEnergy.up.phi
+                MET_JEC_phi_UnclusteredEnergyDown = met_c.MET_UnclusteredEnergy.down.phi
+                MET_JEC_pt_JERUp = met_c.JER.up.pt
+                MET_JEC_pt_JERDown = met_c.JER.up.pt
+                MET_JEC_pt_JESUp = met_c.JES_jes.up.pt
+                MET_JEC_pt_JESDown = met_c.JES_jes.down.pt
+                MET_JEC_pt_UnclusteredEnergyUp = met_c.MET_UnclusteredEnergy.up.pt
+                MET_JEC_pt_UnclusteredEnergyDown = met_c.MET_UnclusteredEnergy.down.pt
+            # For data set these all to nominal so we can plot without switching all of the names
+            else:
+                jets_jec_JERUp = jets_jec
+                jets_jec_JERDown = jets_jec
+                jets_jec_JESUp = jets_jec
+                jets_jec_JESDown = jets_jec
+                PuppiMET_phi_JERUp = events.PuppiMET.phi
+                PuppiMET_phi_JERDown = events.PuppiMET.phi
+                PuppiMET_phi_JESUp = events.PuppiMET.phi
+                PuppiMET_phi_JESDown = events.PuppiMET.phi
+                PuppiMET_pt_JERUp = events.PuppiMET.pt
+                PuppiMET_pt_JERDown = events.PuppiMET.pt
+                PuppiMET_pt_JESUp = events.PuppiMET.pt
+                PuppiMET_pt_JESDown = events.PuppiMET.pt
+                MET_JEC_phi_JERUp = met_c.phi
+                MET_JEC_phi_JERDown = met_c.phi
+                MET_JEC_phi_JESUp = met_c.phi
+                MET_JEC_phi_JESDown = met_c.phi
+                MET_JEC_phi_UnclusteredEnergyUp = met_c.phi
+                MET_JEC_phi_UnclusteredEnergyDown = met_c.phi
+                MET_JEC_pt_JERUp = met_c.pt
+                MET_JEC_pt_JERDown = met_c.pt
+                MET_JEC_pt_JESUp = met_c.pt
+                MET_JEC_pt_JESDown = met_c.pt
+                MET_JEC_pt_UnclusteredEnergyUp = met_c.pt
+                MET_JEC_pt_UnclusteredEnergyDown = met_c.pt
+
+            output["vars"]["event" + out_label] = events.event
             output["vars"]["run" + out_label] = events.run
             output["vars"]["luminosityBlock" + out_label] = events.luminosityBlock
-            output["vars"]["ht" + out_label] = ak.sum(ak4jets.pt, axis=-1).to_list()
+            output["vars"]["ht" + out_label] = ak.sum(ak4jets.pt, axis=-1)
             """output["vars"]["ht_JEC" + out_label] = ak.sum(
                 jets_jec.pt, axis=-1
-            ).to_list()
+            )
             output["vars"]["ht_JEC" + out_label + "_JER_up"] = ak.sum(
                 jets_jec_JERUp.pt, axis=-1
-            ).to_list()
+            )
             output["vars"]["ht_JEC" + out_label + "_JER_down"] = ak.sum(
                 jets_jec_JERDown.pt, axis=-1
-            ).to_list()
+            )
             output["vars"]["ht_JEC" + out_label + "_JES_up"] = ak.sum(
                 jets_jec_JESUp.pt, axis=-1
-            ).to_list()
+            )
             output["vars"]["ht_JEC" + out_label + "_JES_down"] = ak.sum(
                 jets_jec_JESDown.pt, axis=-1
-            ).to_list()"""
+            )"""
 
             output["vars"]["CaloMET_pt" + out_label] = events.CaloMET.pt
             output["vars"]["CaloMET_phi" + out_label] = events.CaloMET.phi
@@ -466,11 +522,9 @@ class SUEP_cluster_WH(processor.ProcessorABC):
             if self.isMC and self.scouting == 0:
                 output["vars"]["genweight"] = events.genWeight
             elif self.isMC and self.scouting == 1:
-                output["vars"]["genweight"] = [
-                    1.0 for e in (len(events) * [0])
-                ]  # create awkward array of ones
+                output["vars"]["genweight"] = np.ones(len(events))
 
-            output["vars"]["ngood_ak4jets" + out_label] = ak.num(ak4jets).to_list()
+            output["vars"]["ngood_ak4jets" + out_label] = ak.num(ak4jets)
 
             if self.isMC:
                 output["vars"]["Pileup_nTrueInt" + out_label] = events.Pileup.nTrueInt
@@ -497,26 +551,7 @@ class SUEP_cluster_WH(processor.ProcessorABC):
             output["vars"]["PV_npvsGood" + out_label] = events.PV.npvsGood
 
         # get gen SUEP kinematics
-        SUEP_genMass = len(events) * [0]
-        SUEP_genPt = len(events) * [0]
-        SUEP_genEta = len(events) * [0]
-        SUEP_genPhi = len(events) * [0]
-
-        if self.isMC and not self.scouting:
-            genParts = self.getGenTracks(events)
-            genSUEP = genParts[(abs(genParts.pdgID) == 25)]
-
-            # we need to grab the last SUEP in the chain for each event
-            SUEP_genMass = [g[-1].mass if len(g) > 0 else 0 for g in genSUEP]
-            SUEP_genPt = [g[-1].pt if len(g) > 0 else 0 for g in genSUEP]
-            SUEP_genPhi = [g[-1].phi if len(g) > 0 else 0 for g in genSUEP]
-            SUEP_genEta = [g[-1].eta if len(g) > 0 else 0 for g in genSUEP]
-
-        if self.isMC and self.scouting and "SUEP" in self.sample:
-            SUEP_genMass = events.scalar.mass
-            SUEP_genPt = events.scalar.pt
-            SUEP_genPhi = events.scalar.phi
-            SUEP_genEta = events.scalar.eta
+        SUEP_genMass, SUEP_genPt, SUEP_genEta, SUEP_genPhi = gen_SUEP
 
         output["vars"]["SUEP_genMass" + out_label] = SUEP_genMass
         output["vars"]["SUEP_genPt" + out_label] = SUEP_genPt
@@ -583,33 +618,39 @@ class SUEP_cluster_WH(processor.ProcessorABC):
         )
         # output["vars"]["deltaPhi_lepton_MET_JEC_func" + out_label] = WH_utils.delta_phi(lepton_phi, met_c.phi)
 
-    def analysis(self, events, output, do_syst=False, out_label=""):
+    def preselection(self, events):
+        """
+        Track-independent stages of the analysis: basic event selection, selected
+        lepton, track collection, gen information. These are computed once per
+        chunk and shared by the nominal and the track systematic variations.
+        """
         #####################################################################################
         # ---- Basic event selection
         # Apply triggers, quality filters, MET, and one lepton selections.
         #####################################################################################
 
-        output["cutflow_total" + out_label] += len(events)
+        # cutflow of the shared selections, filled into the output for each variation
+        cutflow = defaultdict(float)
+        cutflow["cutflow_total"] += len(events)
 
         # golden jsons for offline data
         if self.isMC == 0:
             events = applyGoldenJSON(self, events)
 
-        output["cutflow_goldenJSON" + out_label] += len(events)
+        cutflow["cutflow_goldenJSON"] += len(events)
 
-        events = self.triggerSelection(events, output, out_label)
-        output["cutflow_all_triggers" + out_label] += len(events)
+        events = self.triggerSelection(events, cutflow, "")
+        cutflow["cutflow_all_triggers"] += len(events)
 
         events = self.selectByFilters(events)
-        output["cutflow_qualityFilters" + out_label] += len(events)
+        cutflow["cutflow_qualityFilters"] += len(events)
 
         events, selLeptons = WH_utils.selectByLeptons(self, events, lepveto=True)
-        output["cutflow_oneLepton" + out_label] += len(events)
+        cutflow["cutflow_oneLepton"] += len(events)
 
-        # output empty dataframe if no events pass basic event selection
+        presel = {"events": events, "cutflow": cutflow}
         if len(events) == 0:
-            print("No events passed basic event selection. Saving empty outputs.")
-            return output
+            return presel
 
         #####################################################################################
         # ---- Track selection
@@ -617,10 +658,28 @@ class SUEP_cluster_WH(processor.ProcessorABC):
         # cut on tracks from the selected lepton
         #####################################################################################
 
-        tracks, _ = self.getTracks(events, lepton=selLeptons, leptonIsolation=0.4)
+        presel["tracks"], _ = self.getTracks(
+            events, lepton=selLeptons, leptonIsolation=0.4
+        )
+        presel["selLeptons"] = selLeptons
+        presel["gen_SUEP"] = self.getGenSUEP(events)
+
+        return presel
 
+    def analysis(self, presel, output, do_syst=False, out_label=""):
+        events = presel["events"]
+        for key, value in presel["cutflow"].items():
+            output[key + out_label] += value
+
+        # output empty dataframe if no events pass basic event selection
+        if len(events) == 0:
+            print("No events passed basic event selection. Saving empty outputs.")
+            return output
+
+        selLeptons = presel["selLeptons"]
+        tracks = presel["tracks"]
         if self.isMC and do_syst:
-            tracks = track_killing(self, tracks)
+            tracks = track_killing(self, tracks, events)
 
         #####################################################################################
         # ---- FastJet reclustering
@@ -641,6 +700,7 @@ class SUEP_cluster_WH(processor.ProcessorABC):
             ak_inclusive_jets,
             ak_inclusive_cluster,
             lepton=selLeptons,
+            gen_SUEP=presel["gen_SUEP"],
             output=output,
             out_label=out_label,
         )
@@ -700,33 +760,29 @@ class SUEP_cluster_WH(processor.ProcessorABC):
         if self.isMC:
             output["gensumweight"] = ak.sum(events.genWeight)
 
+        # track-independent selections, shared by all the variations below
+        presel = self.preselection(events)
+
         # run the analysis with the track systematics applied
         if self.isMC and self.do_syst:
             output.update(
                 {
-                    "total_track_down": processor.value_accumulator(float, 0),
-                    "goldenJSON_track_down": processor.value_accumulator(float, 0),
-                    "triggerSingleMuon_track_down": processor.value_accumulator(
-                        float, 0
-                    ),
-                    "triggerDoubleMuon_track_down": processor.value_accumulator(
-                        float, 0
-                    ),
-                    "triggerEGamma_track_down": processor.value_accumulator(float, 0),
-                    "all_triggers_track_down": processor.value_accumulator(float, 0),
-                    "oneLepton_track_down": processor.value_accumulator(float, 0),
-                    "qualityFilters_track_down": processor.value_accumulator(float, 0),
-                    "MET_track_down": processor.value_accumulator(float, 0),
+                    key + "_track_down": processor.value_accumulator(float, 0)
+                    for key in output.keys()
+                    if key.startswith("cutflow_")
                 }
             )
             output = self.analysis(
-                events, output, do_syst=True, out_label="_track_down"
+                presel, output, do_syst=True, out_label="_track_down"
             )
 
         # run the analysis
-        output = self.analysis(events, output)
+        output = self.analysis(presel, output)
 
         return {dataset: output}
 
     def postprocess(self, accumulator):
+        # the chunks' tables were only collected while merging, build them once here
+        for output in accumulator.values():
+            output["vars"].compact()
         return accumulator
@@ -24,6 +24,9 @@ from workflows.CMS_corrections.btag_utils import btagcuts, doBTagWeights, getBTa
 from workflows.CMS_corrections.jetmet_utils import apply_jecs
 from workflows.CMS_corrections.leptonscale_utils import doLeptonScaleVariations
 from workflows.CMS_corrections.leptonsf_utils import doLeptonSFs, doTriggerSFs
+from workflows.CMS_corrections.track_killing_utils import drop_tracks
+from workflows.SUEP_utils import genKinematics
+from workflows.utils.branch_manifest import BranchManifest, met_filters
 
 vector.register_awkward()
 
@@ -64,6 +67,61 @@ class SUEP_cluster_ZH(processor.ProcessorABC):
     def accumulator(self):
         return self._accumulator
 
+    def branchManifest(self):
+        """
+        Branches read by this configuration (see utils.branch_manifest), the ones
+        not declared here are not read by the preloading.
+        """
+        manifest = BranchManifest(["run", "event", "luminosityBlock"])
+        manifest.add("Jet_*", "Muon_*", "Electron_*", "MET_*", "fixedGridRhoFastjetAll")
+        manifest.add(*met_filters(self.era))
+        if self.era == 2018:
+            manifest.add(
+                "HLT_IsoMu24",
+                "HLT_Mu17_TrkIsoVVL_Mu8_TrkIsoVVL_DZ_Mass3p8",
+                "HLT_Ele32_WPTight_Gsf",
+                "HLT_Ele23_Ele12_CaloIdL_TrackIdL_IsoVL",
+            )
+        if self.era == 2017:
+            manifest.add(
+                "HLT_IsoMu27",
+                "HLT_Mu17_TrkIsoVVL_Mu8_TrkIsoVVL_DZ_Mass8",
+                "HLT_Ele35_WPTight_Gsf",
+                "HLT_Ele23_Ele12_CaloIdL_TrackIdL_IsoVL",
+            )
+        if self.era == 2016 or self.era == 2015:  # 2015==2016APV
+            manifest.add(
+                "HLT_IsoMu24",
+                "HLT_Mu17_TrkIsoVVL_Mu8_TrkIsoVVL_DZ",
+                "HLT_Ele27_WPTight_Gsf",
+                "HLT_Ele23_Ele12_CaloIdL_TrackIdL_IsoVL_DZ",
+            )
+        manifest.collection(
+            "PFCands",
+            [
+                "trkPt",
+                "trkEta",
+                "trkPhi",
+                "mass",
+                "pdgId",
+                "fromPV",
+                "dz",
+                "d0",
+                "puppiWeight",
+            ],
+        )
+        manifest.collection(
+            "lostTracks", ["pt", "eta", "phi", "fromPV", "dz", "d0", "puppiWeight"]
+        )
+        if self.isMC:
+            manifest.add("genWeight", "Pileup_nTrueInt", "PSWeight", "GenJet_*")
+            manifest.collection(
+                "GenPart", ["pt", "eta", "phi", "mass", "pdgId", "status"]
+            )
+            if self.era == 2016 or self.era == 2017 or self.era == 2015:
+                manifest.add("L1PreFiringWeight_*")
+        return manifest
+
     def sphericity(self, events, particles, r):
         # In principle here we already have ak.num(particles) != 0
         # Some sanity replacements just in case the boosting broke
@@ -585,9 +643,8 @@ class SUEP_cluster_ZH(processor.ProcessorABC):
             return True
 
     def process(self, events):
-        np.random.seed(
-            max(0, min(events.event[0], 2**31))
-        )  # This ensures reproducibility of results (i.e. for the random track dropping), while also getting different random numbers per file to avoid biases (like always dropping the first track, etc.)
+        # N.B.: random numbers (track dropping, muon smearing) are keyed on (run, event, object index),
+        # see workflows/utils/random_utils.py, so results are reproducible without seeding
         debug = True  # If we want some prints in the middle
         self.chunkTag = "out_%i_%i_%i.hdf5" % (
             events.event[0],
@@ -2111,24 +2168,16 @@ class SUEP_cluster_ZH(processor.ProcessorABC):
     def doTracksDropping(self, events, tracks):
         probsLowPt = {2015: 0.027, 2016: 0.027, 2017: 0.022, 2018: 0.021}
         probsHighPt = {2015: 0.01, 2016: 0.01, 2017: 0.01, 2018: 0.01}
-        cutLowPtTracks = (tracks.pt < 20) & (tracks.pt >= 1)
-        lowPtTracks = tracks[cutLowPtTracks]
-        cutHighPtTracks = tracks.pt >= 20
-        highPtTracks = tracks[cutHighPtTracks]
-        # Generate random numbers
-        randomLow = ak.unflatten(
-            np.random.random(ak.sum(ak.num(lowPtTracks))), ak.num(lowPtTracks)
-        )
-        randomHigh = ak.unflatten(
-            np.random.random(ak.sum(ak.num(highPtTracks))), ak.num(highPtTracks)
+        pt = ak.to_numpy(ak.flatten(tracks.pt))
+        # tracks below 1 GeV are not part of either block and are dropped
+        dropProbs = np.select(
+            [(pt < 20) & (pt >= 1), pt >= 20],
+            [probsLowPt[self.era], probsHighPt[self.era]],
+            1.0,
         )
-        # Now get the tracks
-        passLowPtTracks = lowPtTracks[(randomLow > probsLowPt[self.era])]
-        passHighPtTracks = highPtTracks[(randomHigh > probsHighPt[self.era])]
-        # And then broadcast them together again
         return {
             "": tracks,
-            "_TRACKUP": ak.concatenate([passLowPtTracks, passHighPtTracks], axis=1),
+            "_TRACKUP": drop_tracks(events, tracks, dropProbs),
         }
 
     def doJECJERVariations(self, events, jets):
@@ -2339,12 +2388,14 @@ class SUEP_cluster_ZH(processor.ProcessorABC):
                 out["genZpt"] = self.Zpt
 
             else:
-                out["genZpt"] = self.genZ.pt[:, 0]
-                out["genZeta"] = self.genZ.eta[:, 0]
-                out["genZphi"] = self.genZ.phi[:, 0]
-                out["genHpt"] = self.genH.pt[:, 0]
-                out["genHeta"] = self.genH.eta[:, 0]
-                out["genHphi"] = self.genH.phi[:, 0]
+                genZ = genKinematics(self.genZ, last=False, fields=("pt", "eta", "phi"))
+                genH = genKinematics(self.genH, last=False, fields=("pt", "eta", "phi"))
+                out["genZpt"] = genZ["pt"]
+                out["genZeta"] = genZ["eta"]
+                out["genZphi"] = genZ["phi"]
+                out["genHpt"] = genH["pt"]
+                out["genHeta"] = genH["eta"]
+                out["genHphi"] = genH["phi"]
         # out["nPU"] = self.getNPU()[:]
         return out
 
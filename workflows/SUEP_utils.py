@@ -41,35 +41,61 @@ def ClusterMethod(
         boost_SUEP
     )  ### boost the SUEP tracks to their restframe
 
+    # the ISR tracks in their restframe are needed for the inverted selection,
+    # compute them now so the sphericity of both candidates is done in one go
+    if do_inverted:
+        boost_ISR = ak.zip(
+            {
+                "px": ISR_cand.px * -1,
+                "py": ISR_cand.py * -1,
+                "pz": ISR_cand.pz * -1,
+                "mass": ISR_cand.mass,
+            },
+            with_name="Momentum4D",
+        )
+        ISR_tracks_b = ISR_cluster_tracks.boost_p4(boost_ISR)
+
+        # consistency check: we required already that ISR and SUEP have each at least 2 tracks
+        assert all(ak.num(ISR_tracks_b) > 1)
+
+        eigs, eigs_ISR = batch_sphericity(
+            [SUEP_tracks_b, ISR_tracks_b], 1.0
+        )  # Set r=1.0 for IRC safe
+    else:
+        eigs = sphericity(SUEP_tracks_b, 1.0)  # Set r=1.0 for IRC safe
+
     # SUEP jet variables
-    eigs = sphericity(SUEP_tracks_b, 1.0)  # Set r=1.0 for IRC safe
-    self.out_vars.loc[indices, "SUEP_nconst_CL" + out_label] = ak.num(SUEP_tracks_b)
-    self.out_vars.loc[indices, "SUEP_pt_avg_b_CL" + out_label] = ak.mean(
-        SUEP_tracks_b.pt, axis=-1
+    self.out_vars.loc(indices, "SUEP_nconst_CL" + out_label, ak.num(SUEP_tracks_b))
+    self.out_vars.loc(
+        indices, "SUEP_pt_avg_b_CL" + out_label, ak.mean(SUEP_tracks_b.pt, axis=-1)
     )
-    self.out_vars.loc[indices, "SUEP_S1_CL" + out_label] = 1.5 * (
-        eigs[:, 1] + eigs[:, 0]
+    self.out_vars.loc(
+        indices, "SUEP_S1_CL" + out_label, 1.5 * (eigs[:, 1] + eigs[:, 0])
     )
 
     # unboost for these
     SUEP_tracks = SUEP_tracks_b.boost_p4(SUEP_cand)
-    self.out_vars.loc[indices, "SUEP_pt_avg_CL" + out_label] = ak.mean(
-        SUEP_tracks.pt, axis=-1
+    self.out_vars.loc(
+        indices, "SUEP_pt_avg_CL" + out_label, ak.mean(SUEP_tracks.pt, axis=-1)
     )
     deltaR = SUEP_tracks.deltaR(SUEP_cand)
-    # self.out_vars.loc[indices, "SUEP_rho0_CL"+out_label] = rho(0, SUEP_cand, SUEP_tracks, deltaR)
-    # self.out_vars.loc[indices, "SUEP_rho1_CL"+out_label] = rho(1, SUEP_cand, SUEP_tracks, deltaR)
+    # self.out_vars.loc(indices, "SUEP_rho0_CL"+out_label, rho(0, SUEP_cand, SUEP_tracks, deltaR))
+    # self.out_vars.loc(indices, "SUEP_rho1_CL"+out_label, rho(1, SUEP_cand, SUEP_tracks, deltaR))
 
-    self.out_vars.loc[indices, "SUEP_pt_CL" + out_label] = SUEP_cand.pt
-    self.out_vars.loc[indices, "SUEP_eta_CL" + out_label] = SUEP_cand.eta
-    self.out_vars.loc[indices, "SUEP_phi_CL" + out_label] = SUEP_cand.phi
-    self.out_vars.loc[indices, "SUEP_mass_CL" + out_label] = SUEP_cand.mass
+    self.out_vars.loc(indices, "SUEP_pt_CL" + out_label, SUEP_cand.pt)
+    self.out_vars.loc(indices, "SUEP_eta_CL" + out_label, SUEP_cand.eta)
+    self.out_vars.loc(indices, "SUEP_phi_CL" + out_label, SUEP_cand.phi)
+    self.out_vars.loc(indices, "SUEP_mass_CL" + out_label, SUEP_cand.mass)
 
-    self.out_vars.loc[indices, "SUEP_delta_mass_genMass_CL" + out_label] = (
-        SUEP_cand.mass - self.out_vars["SUEP_genMass" + out_label][indices]
+    self.out_vars.loc(
+        indices,
+        "SUEP_delta_mass_genMass_CL" + out_label,
+        (SUEP_cand.mass - self.out_vars["SUEP_genMass" + out_label][indices]),
     )
-    self.out_vars.loc[indices, "SUEP_delta_pt_genPt_CL" + out_label] = (
-        SUEP_cand.pt - self.out_vars["SUEP_genPt" + out_label][indices]
+    self.out_vars.loc(
+        indices,
+        "SUEP_delta_pt_genPt_CL" + out_label,
+        (SUEP_cand.pt - self.out_vars["SUEP_genPt" + out_label][indices]),
     )
 
     # Calculate orientation difference between candidate and actual SUEP
@@ -90,43 +116,28 @@ def ClusterMethod(
 
     # inverted selection
     if do_inverted:
-        boost_ISR = ak.zip(
-            {
-                "px": ISR_cand.px * -1,
-                "py": ISR_cand.py * -1,
-                "pz": ISR_cand.pz * -1,
-                "mass": ISR_cand.mass,
-            },
-            with_name="Momentum4D",
-        )
-        ISR_tracks_b = ISR_cluster_tracks.boost_p4(boost_ISR)
-
-        # consistency check: we required already that ISR and SUEP have each at least 2 tracks
-        assert all(ak.num(ISR_tracks_b) > 1)
-
         # ISR jet variables
-        eigs = sphericity(ISR_tracks_b, 1.0)  # Set r=1.0 for IRC safe
-        self.out_vars.loc[indices, "ISR_nconst_CL" + out_label] = ak.num(ISR_tracks_b)
-        self.out_vars.loc[indices, "ISR_pt_avg_b_CL" + out_label] = ak.mean(
-            ISR_tracks_b.pt, axis=-1
+        self.out_vars.loc(indices, "ISR_nconst_CL" + out_label, ak.num(ISR_tracks_b))
+        self.out_vars.loc(
+            indices, "ISR_pt_avg_b_CL" + out_label, ak.mean(ISR_tracks_b.pt, axis=-1)
         )
-        self.out_vars.loc[indices, "ISR_S1_CL" + out_label] = 1.5 * (
-            eigs[:, 1] + eigs[:, 0]
+        self.out_vars.loc(
+            indices, "ISR_S1_CL" + out_label, 1.5 * (eigs_ISR[:, 1] + eigs_ISR[:, 0])
         )
 
         # unboost for these
         ISR_tracks = ISR_tracks_b.boost_p4(ISR_cand)
-        self.out_vars.loc[indices, "ISR_pt_avg_CL" + out_label] = ak.mean(
-            ISR_tracks.pt, axis=-1
+        self.out_vars.loc(
+            indices, "ISR_pt_avg_CL" + out_label, ak.mean(ISR_tracks.pt, axis=-1)
         )
         deltaR = ISR_tracks.deltaR(ISR_cand)
-        # self.out_vars.loc[indices, "ISR_rho0_CL"+out_label] = rho(0, ISR_cand, ISR_tracks, deltaR)
-        # self.out_vars.loc[indices, "ISR_rho1_CL"+out_label] = rho(1, ISR_cand, ISR_tracks, deltaR)
+        # self.out_vars.loc(indices, "ISR_rho0_CL"+out_label, rho(0, ISR_cand, ISR_tracks, deltaR))
+        # self.out_vars.loc(indices, "ISR_rho1_CL"+out_label, rho(1, ISR_cand, ISR_tracks, deltaR))
 
-        self.out_vars.loc[indices, "ISR_pt_CL" + out_label] = ISR_cand.pt
-        self.out_vars.loc[indices, "ISR_eta_CL" + out_label] = ISR_cand.eta
-        self.out_vars.loc[indices, "ISR_phi_CL" + out_label] = ISR_cand.phi
-        self.out_vars.loc[indices, "ISR_mass_CL" + out_label] = ISR_cand.mass
+        self.out_vars.loc(indices, "ISR_pt_CL" + out_label, ISR_cand.pt)
+        self.out_vars.loc(indices, "ISR_eta_CL" + out_label, ISR_cand.eta)
+        self.out_vars.loc(indices, "ISR_phi_CL" + out_label, ISR_cand.phi)
+        self.out_vars.loc(indices, "ISR_mass_CL" + out_label, ISR_cand.mass)
 
 
 def ISRRemovalMethod(self, indices, tracks, SUEP_cand, ISR_cand):
@@ -171,24 +182,26 @@ def ISRRemovalMethod(self, indices, tracks, SUEP_cand, ISR_cand):
         tracks = tracks[oneIRMtrackCut]
         indices = indices[oneIRMtrackCut]
 
-        self.out_vars.loc[indices, "SUEP_dphi_SUEP_ISR_IRM"] = ak.mean(
-            abs(SUEP_cand.deltaphi(ISR_cand_IRM)), axis=-1
+        self.out_vars.loc(
+            indices,
+            "SUEP_dphi_SUEP_ISR_IRM",
+            ak.mean(abs(SUEP_cand.deltaphi(ISR_cand_IRM)), axis=-1),
         )
 
         # SUEP jet variables
         eigs = sphericity(SUEP_tracks_b, 1.0)  # Set r=1.0 for IRC safe
-        self.out_vars.loc[indices, "SUEP_nconst_IRM"] = ak.num(SUEP_tracks_b)
-        self.out_vars.loc[indices, "SUEP_pt_avg_b_IRM"] = ak.mean(
-            SUEP_tracks_b.pt, axis=-1
+        self.out_vars.loc(indices, "SUEP_nconst_IRM", ak.num(SUEP_tracks_b))
+        self.out_vars.loc(
+            indices, "SUEP_pt_avg_b_IRM", ak.mean(SUEP_tracks_b.pt, axis=-1)
         )
-        self.out_vars.loc[indices, "SUEP_S1_IRM"] = 1.5 * (eigs[:, 1] + eigs[:, 0])
+        self.out_vars.loc(indices, "SUEP_S1_IRM", 1.5 * (eigs[:, 1] + eigs[:, 0]))
 
         # unboost for these
         SUEP_tracks = SUEP_tracks_b.boost_p4(SUEP_cand)
-        self.out_vars.loc[indices, "SUEP_pt_avg_IRM"] = ak.mean(SUEP_tracks.pt, axis=-1)
+        self.out_vars.loc(indices, "SUEP_pt_avg_IRM", ak.mean(SUEP_tracks.pt, axis=-1))
         deltaR = SUEP_tracks.deltaR(SUEP_cand)
-        # self.out_vars.loc[indices, "SUEP_rho0_IRM"] = rho(0, SUEP_cand, SUEP_tracks, deltaR)
-        # self.out_vars.loc[indices, "SUEP_rho1_IRM"] = rho(1, SUEP_cand, SUEP_tracks, deltaR)
+        # self.out_vars.loc(indices, "SUEP_rho0_IRM", rho(0, SUEP_cand, SUEP_tracks, deltaR))
+        # self.out_vars.loc(indices, "SUEP_rho1_IRM", rho(1, SUEP_cand, SUEP_tracks, deltaR))
 
         # redefine the jets using the tracks as selected by IRM
         SUEP = ak.zip(
@@ -200,10 +213,10 @@ def ISRRemovalMethod(self, indices, tracks, SUEP_cand, ISR_cand):
             },
             with_name="Momentum4D",
         )
-        self.out_vars.loc[indices, "SUEP_pt_IRM"] = SUEP.pt
-        self.out_vars.loc[indices, "SUEP_eta_IRM"] = SUEP.eta
-        self.out_vars.loc[indices, "SUEP_phi_IRM"] = SUEP.phi
-        self.out_vars.loc[indices, "SUEP_mass_IRM"] = SUEP.mass
+        self.out_vars.loc(indices, "SUEP_pt_IRM", SUEP.pt)
+        self.out_vars.loc(indices, "SUEP_eta_IRM", SUEP.eta)
+        self.out_vars.loc(indices, "SUEP_phi_IRM", SUEP.phi)
+        self.out_vars.loc(indices, "SUEP_mass_IRM", SUEP.mass)
 
 
 def ConeMethod(self, indices, tracks, SUEP_cand, ISR_cand, do_inverted=False):
@@ -259,23 +272,23 @@ def ConeMethod(self, indices, tracks, SUEP_cand, ISR_cand, do_inverted=False):
 
         # SUEP jet variables
         eigs = sphericity(SUEP_tracks_b, 1.0)  # Set r=1.0 for IRC safe
-        self.out_vars.loc[indices, "SUEP_nconst_CO"] = ak.num(SUEP_tracks_b)
-        self.out_vars.loc[indices, "SUEP_pt_avg_b_CO"] = ak.mean(
-            SUEP_tracks_b.pt, axis=-1
+        self.out_vars.loc(indices, "SUEP_nconst_CO", ak.num(SUEP_tracks_b))
+        self.out_vars.loc(
+            indices, "SUEP_pt_avg_b_CO", ak.mean(SUEP_tracks_b.pt, axis=-1)
         )
-        self.out_vars.loc[indices, "SUEP_S1_CO"] = 1.5 * (eigs[:, 1] + eigs[:, 0])
+        self.out_vars.loc(indices, "SUEP_S1_CO", 1.5 * (eigs[:, 1] + eigs[:, 0]))
 
         # unboost for these
         SUEP_tracks = SUEP_tracks_b.boost_p4(SUEP_cand)
-        self.out_vars.loc[indices, "SUEP_pt_avg_CO"] = ak.mean(SUEP_tracks.pt, axis=-1)
+        self.out_vars.loc(indices, "SUEP_pt_avg_CO", ak.mean(SUEP_tracks.pt, axis=-1))
         deltaR = SUEP_tracks.deltaR(SUEP_cand)
-        # self.out_vars.loc[indices, "SUEP_rho0_CO"] = rho(0, SUEP_cand, SUEP_tracks, deltaR)
-        # self.out_vars.loc[indices, "SUEP_rho1_CO"] = rho(1, SUEP_cand, SUEP_tracks, deltaR)
+        # self.out_vars.loc(indices, "SUEP_rho0_CO", rho(0, SUEP_cand, SUEP_tracks, deltaR))
+        # self.out_vars.loc(indices, "SUEP_rho1_CO", rho(1, SUEP_cand, SUEP_tracks, deltaR))
 
-        self.out_vars.loc[indices, "SUEP_pt_CO"] = SUEP_cand.pt
-        self.out_vars.loc[indices, "SUEP_eta_CO"] = SUEP_cand.eta
-        self.out_vars.loc[indices, "SUEP_phi_CO"] = SUEP_cand.phi
-        self.out_vars.loc[indices, "SUEP_mass_CO"] = SUEP_cand.mass
+        self.out_vars.loc(indices, "SUEP_pt_CO", SUEP_cand.pt)
+        self.out_vars.loc(indices, "SUEP_eta_CO", SUEP_cand.eta)
+        self.out_vars.loc(indices, "SUEP_phi_CO", SUEP_cand.phi)
+        self.out_vars.loc(indices, "SUEP_mass_CO", SUEP_cand.mass)
 
         # inverted selection
         if do_inverted:
@@ -316,105 +329,111 @@ def ConeMethod(self, indices, tracks, SUEP_cand, ISR_cand, do_inverted=False):
 
                 # ISR jet variables
                 eigs = sphericity(ISR_tracks_b, 1.0)  # Set r=1.0 for IRC safe
-                self.out_vars.loc[indices, "ISR_nconst_CO"] = ak.num(ISR_tracks_b)
-                self.out_vars.loc[indices, "ISR_pt_avg_b_CO"] = ak.mean(
-                    ISR_tracks_b.pt, axis=-1
+                self.out_vars.loc(indices, "ISR_nconst_CO", ak.num(ISR_tracks_b))
+                self.out_vars.loc(
+                    indices, "ISR_pt_avg_b_CO", ak.mean(ISR_tracks_b.pt, axis=-1)
                 )
-                self.out_vars.loc[indices, "ISR_pt_mean_scaled_CO"] = ak.mean(
-                    ISR_tracks_b.pt, axis=-1
-                ) / ak.max(ISR_tracks_b.pt, axis=-1)
-                self.out_vars.loc[indices, "ISR_S1_CO"] = 1.5 * (
-                    eigs[:, 1] + eigs[:, 0]
+                self.out_vars.loc(
+                    indices,
+                    "ISR_pt_mean_scaled_CO",
+                    ak.mean(ISR_tracks_b.pt, axis=-1)
+                    / ak.max(ISR_tracks_b.pt, axis=-1),
                 )
+                self.out_vars.loc(indices, "ISR_S1_CO", 1.5 * (eigs[:, 1] + eigs[:, 0]))
 
                 # unboost for these
                 ISR_tracks = ISR_tracks_b.boost_p4(ISR_cand)
-                self.out_vars.loc[indices, "ISR_pt_avg_CO"] = ak.mean(
-                    ISR_tracks.pt, axis=-1
+                self.out_vars.loc(
+                    indices, "ISR_pt_avg_CO", ak.mean(ISR_tracks.pt, axis=-1)
                 )
                 deltaR = ISR_tracks.deltaR(ISR_cand)
-                self.out_vars.loc[indices, "ISR_rho0_CO"] = rho(
-                    0, ISR_cand, ISR_tracks, deltaR
+                self.out_vars.loc(
+                    indices, "ISR_rho0_CO", rho(0, ISR_cand, ISR_tracks, deltaR)
                 )
-                self.out_vars.loc[indices, "ISR_rho1_CO"] = rho(
-                    1, ISR_cand, ISR_tracks, deltaR
+                self.out_vars.loc(
+                    indices, "ISR_rho1_CO", rho(1, ISR_cand, ISR_tracks, deltaR)
                 )
 
-                self.out_vars.loc[indices, "ISR_pt_CO"] = ISR_cand.pt
-                self.out_vars.loc[indices, "ISR_eta_CO"] = ISR_cand.eta
-                self.out_vars.loc[indices, "ISR_phi_CO"] = ISR_cand.phi
-                self.out_vars.loc[indices, "ISR_mass_CO"] = ISR_cand.mass
+                self.out_vars.loc(indices, "ISR_pt_CO", ISR_cand.pt)
+                self.out_vars.loc(indices, "ISR_eta_CO", ISR_cand.eta)
+                self.out_vars.loc(indices, "ISR_phi_CO", ISR_cand.phi)
+                self.out_vars.loc(indices, "ISR_mass_CO", ISR_cand.mass)
 
 
 def sphericity(particles, r):
-    norm = ak.sum(particles.p**r, axis=1, keepdims=True)
-    s = np.array(
-        [
-            [
-                ak.sum(
-                    particles.px * particles.px * particles.p ** (r - 2.0),
-                    axis=1,
-                    keepdims=True,
-                )
-                / norm,
-                ak.sum(
-                    particles.px * particles.py * particles.p ** (r - 2.0),
-                    axis=1,
-                    keepdims=True,
-                )
-                / norm,
-                ak.sum(
-                    particles.px * particles.pz * particles.p ** (r - 2.0),
-                    axis=1,
-                    keepdims=True,
-                )
-                / norm,
-            ],
-            [
-                ak.sum(
-                    particles.py * particles.px * particles.p ** (r - 2.0),
-                    axis=1,
-                    keepdims=True,
-                )
-                / norm,
-                ak.sum(
-                    particles.py * particles.py * particles.p ** (r - 2.0),
-                    axis=1,
-                    keepdims=True,
-                )
-                / norm,
-                ak.sum(
-                    particles.py * particles.pz * particles.p ** (r - 2.0),
-                    axis=1,
-                    keepdims=True,
-                )
-                / norm,
-            ],
-            [
-                ak.sum(
-                    particles.pz * particles.px * particles.p ** (r - 2.0),
-                    axis=1,
-                    keepdims=True,
-                )
-                / norm,
-                ak.sum(
-                    particles.pz * particles.py * particles.p ** (r - 2.0),
-                    axis=1,
-                    keepdims=True,
-                )
-                / norm,
-                ak.sum(
-                    particles.pz * particles.pz * particles.p ** (r - 2.0),
-                    axis=1,
-                    keepdims=True,
-                )
-                / norm,
-            ],
-        ]
+    """
+    Sorted eigenvalues (eval1 < eval2 < eval3) of the sphericity tensor
+    of a collection of (events x particles).
+    """
+    return batch_sphericity([particles], r)[0]
+
+
+def batch_sphericity(collections, r):
+    """
+    Sphericity eigenvalues for several collections of (events x particles) at once.
+    The collections can have different numbers of events: they are flattened and
+    stacked, the six unique tensor components are accumulated per event with
+    segmented sums, and the eigenvalues are solved in closed form.
+    Returns a list with one (events x 3) array per collection.
+    """
+    counts = [ak.to_numpy(ak.num(particles, axis=1)) for particles in collections]
+    flat = [ak.flatten(particles, axis=1) for particles in collections]
+    px = np.concatenate([ak.to_numpy(f.px) for f in flat]).astype(np.float64)
+    py = np.concatenate([ak.to_numpy(f.py) for f in flat]).astype(np.float64)
+    pz = np.concatenate([ak.to_numpy(f.pz) for f in flat]).astype(np.float64)
+
+    # index of the (stacked) event each particle belongs to
+    counts_all = np.concatenate(counts)
+    nevents = len(counts_all)
+    event_idx = np.repeat(np.arange(nevents), counts_all)
+
+    p2 = px * px + py * py + pz * pz
+    weight = np.sqrt(p2) ** (r - 2.0)
+
+    def segmented_sum(values):
+        return np.bincount(event_idx, weights=values, minlength=nevents)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        norm = segmented_sum(weight * p2)
+        wpx, wpy = weight * px, weight * py
+        s_xx = segmented_sum(wpx * px) / norm
+        s_yy = segmented_sum(wpy * py) / norm
+        s_zz = segmented_sum(weight * pz * pz) / norm
+        s_xy = segmented_sum(wpx * py) / norm
+        s_xz = segmented_sum(wpx * pz) / norm
+        s_yz = segmented_sum(wpy * pz) / norm
+
+    evals = eigvalsh_3x3(s_xx, s_yy, s_zz, s_xy, s_xz, s_yz)
+
+    splits = np.cumsum([len(c) for c in counts])[:-1]
+    return np.split(evals, splits)
+
+
+def eigvalsh_3x3(a00, a11, a22, a01, a02, a12):
+    """
+    Closed-form (trigonometric) eigenvalues of a batch of real symmetric 3x3 matrices,
+    given their six unique components. Returns an (N x 3) array sorted in ascending order.
+    """
+    q = (a00 + a11 + a22) / 3.0
+    b00, b11, b22 = a00 - q, a11 - q, a22 - q
+    p1 = a01 * a01 + a02 * a02 + a12 * a12
+    p = np.sqrt((b00 * b00 + b11 * b11 + b22 * b22 + 2.0 * p1) / 6.0)
+
+    # half the determinant of (A - qI) / p, which is the cosine of 3*phi
+    det = (
+        b00 * (b11 * b22 - a12 * a12)
+        - a01 * (a01 * b22 - a12 * a02)
+        + a02 * (a01 * a12 - b11 * a02)
     )
-    s = np.squeeze(np.moveaxis(s, 2, 0), axis=3)
-    evals = np.sort(np.linalg.eigvalsh(s))
-    return evals
+    with np.errstate(divide="ignore", invalid="ignore"):
+        half_det = np.where(p > 0, det / (2.0 * p**3), 0.0)
+    phi = np.arccos(np.clip(half_det, -1.0, 1.0)) / 3.0
+
+    # for degenerate matrices (p == 0) all eigenvalues collapse to q
+    eval3 = q + 2.0 * p * np.cos(phi)
+    eval1 = q + 2.0 * p * np.cos(phi + (2.0 * np.pi / 3.0))
+    eval2 = 3.0 * q - eval1 - eval3
+    return np.stack((eval1, eval2, eval3), axis=-1)
 
 
 def rho(number, jet, tracks, deltaR, dr=0.05):
@@ -575,3 +594,24 @@ def to_np_array(ak_array, maxN=100, pad=0):
     return ak.to_numpy(
         ak.fill_none(ak.pad_none(ak_array, maxN, clip=True, axis=-1), pad)
     )
+
+
+def lastCopy(particles):
+    """
+    Last particle of each event, e.g. the last copy of a particle in the generator
+    chain. Keeps the event dimension: 0 or 1 particle per event.
+    """
+    return particles[ak.local_index(particles, axis=1) == ak.num(particles, axis=1) - 1]
+
+
+def genKinematics(particles, last=True, fields=("mass", "pt", "eta", "phi"), default=0):
+    """
+    Kinematics of one copy of a particle per event, the last (or first) one in the
+    generator chain, as numpy arrays. Events without the particle get default.
+    """
+    if last:
+        particles = lastCopy(particles)
+    selected = ak.firsts(particles, axis=1)
+    return {
+        field: ak.to_numpy(ak.fill_none(selected[field], default)) for field in fields
+    }
@@ -0,0 +1,419 @@
+"""
+Branch manifests: the branches of the input tree that a processor reads, for a given
+configuration (era, isMC, ...), as names or fnmatch patterns (e.g. "Jet_*").
+Each processor declares its own with a branchManifest() method.
+
+preload() reads exactly those branches, in bulk (one vectored read per chunk, instead
+of one request per branch as they are accessed), into a local file which is then given
+to the coffea Runner. Collections and fields that were not declared are not in it, so
+accessing them fails right away, with an AttributeError, instead of silently adding a
+remote read. The bytes read and the time spent decompressing are reported per chunk.
+
+undeclared() checks the code of a processor against its manifest, without reading any
+file, so that a branch that is read but not declared is found before a job runs.
+
+e.g.
+    preload(infile, instance.branchManifest(), "preload.root")
+    runner.run(fileset={dataset: ["preload.root"]}, ...)
+"""
+import ast
+import fnmatch
+import inspect
+import logging
+import re
+import textwrap
+import time
+
+import awkward as ak
+import numpy as np
+import uproot
+
+# MET filters (see https://twiki.cern.ch/twiki/bin/viewauth/CMS/MissingETOptionalFiltersRun2)
+MET_FILTERS = [
+    "Flag_goodVertices",
+    "Flag_globalSuperTightHalo2016Filter",
+    "Flag_HBHENoiseFilter",
+    "Flag_HBHENoiseIsoFilter",
+    "Flag_EcalDeadCellTriggerPrimitiveFilter",
+    "Flag_BadPFMuonFilter",
+    "Flag_BadPFMuonDzFilter",
+    "Flag_eeBadScFilter",
+]
+
+
+def met_filters(era):
+    if str(era) in ["2017", "2018"]:
+        return MET_FILTERS + ["Flag_ecalBadCalibFilter"]
+    return MET_FILTERS
+
+
+class BranchManifest:
+    """A set of branch names, or fnmatch patterns, of the input tree."""
+
+    def __init__(self, patterns=()):
+        self.patterns = set(patterns)
+
+    def __repr__(self):
+        return "BranchManifest(%r)" % sorted(self.patterns)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __iter__(self):
+        return iter(sorted(self.patterns))
+
+    def __or__(self, other):
+        return BranchManifest(self.patterns | set(other))
+
+    def add(self, *patterns):
+        self.patterns.update(patterns)
+
+    def collection(self, name, fields):
+        """Declare some fields of a collection, e.g. ("PFCands", ["trkPt", "trkEta"])."""
+        self.add(*[f"{name}_{field}" for field in fields])
+
+    def matches(self, name):
+        return len(self.select([name])) > 0
+
+    def select(self, names):
+        """The names that are declared, in the same order."""
+        if len(self.patterns) == 0:
+            return []
+        regex = re.compile("|".join(fnmatch.translate(p) for p in self.patterns))
+        return [name for name in names if regex.match(name)]
+
+    def missing(self, names):
+        """Patterns that don't match any of names, e.g. branches not in a file."""
+        return sorted(p for p in self.patterns if not fnmatch.filter(names, p))
+
+
+# attributes of the events which are not branches
+EVENTS_ATTRIBUTES = {"metadata", "behavior", "fields", "layout", "caches"}
+
+
+_UNKNOWN = object()
+
+
+class _Configuration:
+    """
+    The attributes of the processor (settings), as set by the code followed so far,
+    e.g. self.doGen = self.isDY.
+    """
+
+    def __init__(self, settings):
+        self._settings = settings
+        self._values = {}
+
+    def __getattr__(self, name):
+        if name in self._values:
+            if self._values[name] is _UNKNOWN:
+                raise AttributeError(name)
+            return self._values[name]
+        return getattr(self._settings, name)
+
+
+def _value(expression, config):
+    """
+    Value of expression if it only depends on the configuration (self.<attr>, with
+    self the config, and no calls), otherwise _UNKNOWN.
+    """
+    nodes = list(ast.walk(expression))
+    names = {node.id for node in nodes if isinstance(node, ast.Name)}
+    if names - {"self"} or any(isinstance(node, ast.Call) for node in nodes):
+        return _UNKNOWN
+    try:
+        code = compile(ast.Expression(expression), "<expression>", "eval")
+        return eval(code, {"__builtins__": {}}, {"self": config})
+    except Exception:
+        return _UNKNOWN
+
+
+def _evaluate(test, config):
+    """
+    Value of the condition test of an if statement on the configuration, or None if it
+    depends on anything else, see _value.
+    """
+    if isinstance(test, ast.BoolOp):
+        values = [_evaluate(v, config) for v in test.values]
+        short = isinstance(test.op, ast.Or)  # the value that decides the result
+        if any(v is short for v in values):
+            return short
+        return None if None in values else not short
+    if isinstance(test, ast.UnaryOp) and isinstance(test.op, ast.Not):
+        value = _evaluate(test.operand, config)
+        return None if value is None else not value
+    value = _value(test, config)
+    return None if value is _UNKNOWN else bool(value)
+
+
+def _self_attribute(target):
+    if (
+        isinstance(target, ast.Attribute)
+        and isinstance(target.value, ast.Name)
+        and target.value.id == "self"
+    ):
+        return target.attr
+    return None
+
+
+def _callee(call, config, globals_):
+    """
+    The function called by call, if it is run on the processor: a method of the
+    processor (self.method(...)), or a function taking it first (func(self, ...)).
+    """
+    func = call.func
+    target = None
+    if _self_attribute(func) is not None:
+        target = getattr(type(config._settings), func.attr, None)
+    elif call.args and isinstance(call.args[0], ast.Name) and call.args[0].id == "self":
+        if isinstance(func, ast.Name):
+            target = globals_.get(func.id)
+        elif isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+            target = getattr(globals_.get(func.value.id), func.attr, None)
+    return target if inspect.isfunction(target) else None
+
+
+def _reads(node, config, events, reads, globals_, todo):
+    """
+    Add to reads the (collection, field) or (branch,) read from the variable events in
+    the code of node, following only the branches of the ifs taken with config.
+    The functions it calls on the processor are added to todo.
+    """
+    if isinstance(node, (ast.If, ast.IfExp)):
+        value = _evaluate(node.test, config)
+        _reads(node.test, config, events, reads, globals_, todo)
+        branches = [node.body, node.orelse]
+        if value is not None:
+            branches = [node.body if value else node.orelse]
+        for branch in branches:
+            for child in branch if isinstance(branch, list) else [branch]:
+                _reads(child, config, events, reads, globals_, todo)
+        return
+    if isinstance(node, ast.Attribute):
+        chain = []
+        root = node
+        while isinstance(root, ast.Attribute):
+            chain.insert(0, root.attr)
+            root = root.value
+        if isinstance(root, ast.Name) and root.id == events:
+            if chain[0] not in EVENTS_ATTRIBUTES:
+                reads.add(tuple(chain[:2]))
+            return
+    if isinstance(node, ast.Call):
+        callee = _callee(node, config, globals_)
+        if callee is not None:
+            todo.append(callee)
+    for child in ast.iter_child_nodes(node):
+        _reads(child, config, events, reads, globals_, todo)
+    # the configuration set by the code, e.g. self.doGen = self.isDY
+    if isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign)):
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        for target in targets:
+            name = _self_attribute(target)
+            if name is not None:
+                value = _UNKNOWN
+                if isinstance(node, ast.Assign):
+                    value = _value(node.value, config)
+                config._values[name] = value
+
+
+def _declared(manifest, read):
+    if len(read) == 1:
+        # a branch, or a whole collection
+        name = read[0]
+        return manifest.matches(name) or any(
+            p.startswith(name + "_") for p in manifest.patterns
+        )
+    collection, field = read
+    names = [f"{collection}_{field}"]
+    if field == "mass":
+        # masses of the scouting ntuples, see utils.scouting_schema
+        names.append(f"{collection}_m")
+    return any(manifest.matches(name) for name in names) or manifest.matches(
+        collection
+    )
+
+
+def undeclared(manifest, funcs, settings, events="events"):
+    """
+    Branches read from the variable events (events.Muon.pt is Muon_pt) by the code of
+    funcs, and of the functions they call on the processor (self.method(...) or
+    func(self, ...)), that the manifest does not declare, as sorted strings.
+    The if statements on the configuration (e.g. self.scouting == 1) are evaluated
+    with the attributes of settings, the processor, so only the code that runs for
+    that configuration is checked; the others are followed on both sides.
+
+    e.g.
+        manifest = instance.branchManifest()
+        assert not undeclared(manifest, [type(instance).process], instance)
+    """
+    config = _Configuration(settings)
+    reads = set()
+    todo = list(funcs)
+    seen = set()
+    while todo:
+        func = todo.pop()
+        if func in seen:
+            continue
+        seen.add(func)
+        tree = ast.parse(textwrap.dedent(inspect.getsource(func)))
+        _reads(tree, config, events, reads, func.__globals__, todo)
+    return sorted(".".join(read) for read in reads if not _declared(manifest, read))
+
+
+class _TimedExecutor(uproot.source.futures.TrivialExecutor):
+    """Runs the tasks right away, like uproot's default, and adds up their time."""
+
+    def __init__(self):
+        super().__init__()
+        self.time = 0.0
+
+    def submit(self, task, *args):
+        start = time.perf_counter()
+        try:
+            return super().submit(task, *args)
+        finally:
+            self.time += time.perf_counter() - start
+
+
+def _layout(tree, names):
+    """
+    Split the branches into flat ones and jagged collections (by counter branch), so
+    that they are written back with the same names and counters (e.g. nJet, Jet_pt).
+    """
+    flat, collections = [], {}
+    for name in names:
+        counter = tree[name].count_branch
+        if counter is None:
+            flat.append(name)
+            continue
+        collection = counter.name[1:] if counter.name.startswith("n") else name
+        collections.setdefault(collection, []).append(name)
+    return flat, collections
+
+
+def _to_write(arrays, flat, collections):
+    out = {name: arrays[name] for name in flat}
+    for collection, names in collections.items():
+        if names == [collection]:
+            # a single jagged branch, e.g. PSWeight[nPSWeight]
+            out[collection] = arrays[collection]
+        else:
+            out[collection] = ak.zip(
+                {name[len(collection) + 1 :]: arrays[name] for name in names}
+            )
+    return out
+
+
+def _chunks(tree, nentries, step_size, entries=None):
+    """
+    (start, stop, selected entries or None) of the entry ranges to read. With entries,
+    only the clusters (the entry ranges of the baskets) that have some are read, and
+    consecutive ones are read together, up to step_size entries.
+    """
+    if entries is None:
+        for start in range(0, max(nentries, 1), step_size):
+            yield start, min(start + step_size, nentries), None
+        return
+
+    entries = np.asarray(entries, dtype=np.int64)
+    entries = entries[entries < nentries]
+    offsets = [o for o in tree.common_entry_offsets() if o < nentries] + [nentries]
+    chunk = None
+    for start, stop in zip(offsets[:-1], offsets[1:]):
+        lo, hi = np.searchsorted(entries, [start, stop])
+        if lo == hi:
+            continue
+        if chunk and chunk[1] == start and stop - chunk[0] <= step_size:
+            chunk = (chunk[0], stop, chunk[2], hi)
+            continue
+        if chunk:
+            yield chunk[0], chunk[1], entries[chunk[2] : chunk[3]]
+        chunk = (start, stop, lo, hi)
+    if chunk:
+        yield chunk[0], chunk[1], entries[chunk[2] : chunk[3]]
+    elif len(entries) == 0:
+        # nothing selected, still write the (empty) tree
+        yield 0, 0, entries
+
+
+def preload(
+    infile,
+    manifest,
+    outfile,
+    treename="Events",
+    step_size=100000,
+    entry_stop=None,
+    timeout=None,
+    entries=None,
+):
+    """
+    Copy the branches of the manifest, from the treename tree of infile, to outfile
+    (up to entry_stop, if given). If entries (sorted entry numbers) is given, only those
+    are copied, e.g. the events that passed a selection (see utils.skim_cache).
+    Returns the I/O report: one dict per chunk, with the number of entries, the bytes
+    read, the time spent reading the chunk, and the part of it spent decompressing.
+    """
+    report = []
+    with uproot.open(infile, timeout=timeout) as f:
+        tree = f[treename]
+        names = manifest.select(tree.keys())
+        missing = manifest.missing(tree.keys())
+        if missing:
+            logging.warning(f"Declared branches not in {infile}: {missing}")
+        flat, collections = _layout(tree, names)
+        logging.info(
+            f"Preloading {len(names)} of {len(tree.keys())} branches from {infile}"
+        )
+
+        nentries = tree.num_entries
+        if entry_stop is not None:
+            nentries = min(entry_stop, nentries)
+        source = tree.file.source
+        with uproot.recreate(outfile) as fout:
+            chunks = _chunks(tree, nentries, step_size, entries)
+            for i, (start, stop, selected) in enumerate(chunks):
+                executor = _TimedExecutor()
+                nbytes = getattr(source, "num_requested_bytes", 0)
+                tic = time.perf_counter()
+                arrays = tree.arrays(
+                    names,
+                    entry_start=start,
+                    entry_stop=stop,
+                    how=dict,
+                    decompression_executor=executor,
+                )
+                if selected is not None:
+                    arrays = {k: v[selected - start] for k, v in arrays.items()}
+                chunk = dict(
+                    entries=stop - start if selected is None else len(selected),
+                    bytesread=getattr(source, "num_requested_bytes", 0) - nbytes,
+                    readtime=time.perf_counter() - tic,
+                    decompresstime=executor.time,
+                )
+                report.append(chunk)
+                print(
+                    "Preloaded entries {}-{}: {:.1f} MB in {:.1f}s ({:.1f}s decompressing)".format(
+                        start,
+                        stop,
+                        chunk["bytesread"] / 1e6,
+                        chunk["readtime"],
+                        chunk["decompresstime"],
+                    )
+                )
+
+                out = _to_write(arrays, flat, collections)
+                if i == 0:
+                    fout[treename] = out
+                else:
+                    fout[treename].extend(out)
+
+    print(
+        "Preloaded {} entries: {:.1f} MB in {:.1f}s ({:.1f}s decompressing)".format(
+            sum(c["entries"] for c in report),
+            sum(c["bytesread"] for c in report) / 1e6,
+            sum(c["readtime"] for c in report),
+            sum(c["decompresstime"] for c in report),
+        )
+    )
+    return report
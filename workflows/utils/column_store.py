@@ -0,0 +1,135 @@
+import awkward as ak
+import numpy as np
+import pandas as pd
+
+
+class ColumnStore:
+    """A typed, preallocated table of per-event columns
+    Each column is a single numpy array of length nrows. Columns are either
+    assigned whole (keeping their own dtype) or filled for a subset of events
+    by integer-index scatter with `loc`; those are preallocated as float64
+    filled with NaN for the events that are never written.
+    The table is converted to pandas (or arrow) only once, when it is emitted.
+    Parameters
+    ----------
+        columns : dict, optional
+            Initial columns, name -> array-like of equal lengths.
+    Examples
+    --------
+    >>> store = ColumnStore()
+    >>> store["ntracks"] = np.array([10, 20, 30])
+    >>> store.loc(np.array([0, 2]), "SUEP_S1_CL", np.array([0.5, 0.7]))
+    >>> store.to_pandas()
+       ntracks  SUEP_S1_CL
+    0       10         0.5
+    1       20         NaN
+    2       30         0.7
+    """
+
+    def __init__(self, columns=None):
+        self._columns = {}
+        self.nrows = None
+        for key, value in (columns or {}).items():
+            self[key] = value
+
+    def __repr__(self):
+        return "ColumnStore(nrows=%r, columns=%r)" % (self.nrows, self.columns)
+
+    def __len__(self):
+        return self.nrows or 0
+
+    def __contains__(self, key):
+        return key in self._columns
+
+    def keys(self):
+        return self._columns.keys()
+
+    @property
+    def columns(self):
+        return list(self._columns.keys())
+
+    def _check_rows(self, n):
+        if self.nrows is None:
+            self.nrows = n
+        elif n != self.nrows:
+            raise ValueError(
+                "Column of length %r does not match the %r rows of the ColumnStore"
+                % (n, self.nrows)
+            )
+
+    def declare(self, keys, dtype=np.float64, fill=np.nan):
+        """Preallocate columns (if they don't exist yet) filled with a default value."""
+        if self.nrows is None:
+            raise ValueError("Cannot declare columns before the number of rows is set.")
+        for key in keys:
+            if key not in self._columns:
+                self._columns[key] = np.full(self.nrows, fill, dtype=dtype)
+
+    def loc(self, indices, key, value):
+        """Scatter value into the rows indices (integer positions) of column key."""
+        if not isinstance(key, str):
+            raise ValueError("Column name must be a string not %r." % type(key))
+        if key not in self._columns:
+            self.declare([key])
+        self._columns[key][indices] = to_numpy(value)
+
+    def __setitem__(self, key, value):
+        if not isinstance(key, str):
+            raise ValueError("Column name must be a string not %r." % type(key))
+        if np.ndim(value) == 0:
+            # broadcast scalars to the whole column
+            if self.nrows is None:
+                raise ValueError(
+                    "Cannot broadcast a scalar before the number of rows is set."
+                )
+            value = np.full(self.nrows, value)
+        value = to_numpy(value)
+        self._check_rows(len(value))
+        self._columns[key] = value
+
+    def __getitem__(self, key):
+        if not isinstance(key, str):
+            raise ValueError("Column name must be a string not %r." % type(key))
+        if key not in self._columns:
+            raise KeyError(f"Key {key} does not exist in ColumnStore")
+        return self._columns[key]
+
+    def to_dict(self):
+        return dict(self._columns)
+
+    def to_pandas(self):
+        return pd.DataFrame(self._columns, index=pd.RangeIndex(len(self)), copy=False)
+
+    def to_arrow(self):
+        import pyarrow as pa
+
+        return pa.table(self._columns)
+
+    @classmethod
+    def from_pandas(cls, df):
+        return cls({key: df[key].to_numpy() for key in df.columns})
+
+    @classmethod
+    def concatenate(cls, stores):
+        """Stack the rows of several ColumnStores, missing columns are filled with NaN."""
+        stores = [s for s in stores if len(s) > 0 or len(s.columns) > 0]
+        keys = list(dict.fromkeys(k for s in stores for k in s.keys()))
+        out = cls()
+        for key in keys:
+            out[key] = np.concatenate(
+                [s[key] if key in s else np.full(len(s), np.nan) for s in stores]
+            )
+        return out
+
+
+def to_numpy(value):
+    """Convert an array-like (awkward, pandas, list) column to a flat numpy array."""
+    if isinstance(value, ak.Array):
+        value = ak.to_numpy(ak.fill_none(value, np.nan), allow_missing=False)
+    elif isinstance(value, (pd.Series, pd.Index)):
+        value = value.to_numpy()
+    value = np.asarray(value)
+    # one object per event (e.g. leading lepton) comes as a (N x 1) array
+    if value.ndim == 2 and value.shape[1] == 1:
+        value = value[:, 0]
+    return value
@@ -5,6 +5,8 @@
 # This won't be triggered unless the SUEP processor runs smoothly through
 # all the chunks, thus assuring we processed all the events
 # N.B.: Only merging df named 'vars' in the HDF5 object
+# The inputs are streamed to the output (see NtupleMerger), which is written as
+# a HDF5 table or Parquet, based on the extension of outFile
 
 import glob
 import os
@@ -14,6 +16,8 @@ import h5py
 import numpy as np
 import pandas as pd
 
+from workflows.utils import pandas_utils
+
 
 def h5load(ifile, label):
     try:
@@ -31,46 +35,215 @@ def h5load(ifile, label):
         return 0, 0
 
 
+def load(ifile):
+    if ifile.endswith(".parquet"):
+        try:
+            return pandas_utils.parquet_load(ifile)
+        except Exception as e:
+            print("Some error occurred", ifile, e)
+            return 0, 0
+    return h5load(ifile, "vars")
+
+
+def merged_schema(dtypes):
+    """
+    Schema (column -> dtype) of the concatenation of DataFrames with the given dtypes
+    (list of pandas Series, column -> dtype), as pd.concat would make it: columns that
+    are missing in some of the DataFrames are filled with NaN, so they become floats.
+    Half precision floats, which the outputs can not store, become float32.
+    """
+    schema = {}
+    for dtype in dtypes:
+        for column, t in dtype.items():
+            if t == "float16":
+                t = np.dtype("float32")
+            schema[column] = (
+                np.result_type(schema[column], t) if column in schema else t
+            )
+    for column, t in schema.items():
+        if any(column not in dtype for dtype in dtypes) and t.kind in "biu":
+            schema[column] = np.dtype("float64")
+    return schema
+
+
+class NtupleMerger:
+    """
+    Streaming merger of ntuples. Each DataFrame added is appended to an on-disk table
+    (HDF5 in the table format, or Parquet, based on the extension of outFile), so that
+    only one input is in memory at a time, instead of concatenating them all.
+    The metadata is merged as the inputs are added: gensumweight and cutflows are
+    summed, the rest is taken from the first input.
+    Once an output has max_rows events, the next inputs go to a new output file, named
+    by replacing {} in outFile by the number of the output (or by appending _<number>).
+    The columns and types of an output are those of its first input, or schema
+    (column -> dtype) if given, see merged_schema. Missing float columns are filled with
+    NaN, while an input that does not fit (new columns, missing columns of other types,
+    or types that can not be converted) is also moved to a new output.
+    on_close(fname) is called for each output once it is complete, e.g. to copy it.
+    """
+
+    def __init__(self, outFile, max_rows=None, schema=None, on_close=None):
+        self.outFile = outFile
+        self.max_rows = max_rows
+        self.schema = schema
+        self.on_close = on_close
+        self.outputs = []
+        self._reset()
+
+    def _reset(self):
+        self.metadata = None
+        self.nrows = 0
+        self._schema = self.schema
+        self._store = None
+        self._writer = None
+
+    @property
+    def fname(self):
+        """Name of the current output."""
+        iout = len(self.outputs)
+        if "{}" in self.outFile:
+            return self.outFile.format(iout)
+        if iout == 0:
+            return self.outFile
+        base, ext = os.path.splitext(self.outFile)
+        return f"{base}_{iout}{ext}"
+
+    def add_metadata(self, metadata):
+        if self.metadata is None:
+            self.metadata = dict(metadata)
+            return
+        for k, v in metadata.items():
+            if k not in self.metadata:
+                self.metadata[k] = v
+            elif k == "gensumweight" or "cutflow" in k:
+                self.metadata[k] += v
+
+    def add(self, df, metadata):
+        """Append the DataFrame of an ntuple, and merge its metadata."""
+        # no need to add empty ones
+        if "empty" in list(df.keys()) or df.shape[0] == 0:
+            self.add_metadata(metadata)
+            return
+
+        conformed = self._conform(df)
+        if conformed is None:
+            print("Schema changed, starting a new output.")
+            self.close_output()
+            conformed = self._conform(df)
+        self.add_metadata(metadata)
+        self._append(conformed)
+        self.nrows += conformed.shape[0]
+
+        if self.max_rows is not None and self.nrows >= self.max_rows:
+            self.close_output()
+
+    def _conform(self, df):
+        """
+        df with the columns and types of the output, None if it does not fit in it.
+        The first input of an output defines them, if no schema was given.
+        """
+        # these can not be stored in parquet or in PyTables tables
+        df = df.astype(
+            {key: "float32" for key, dtype in df.dtypes.items() if dtype == "float16"}
+        )
+        if self._schema is None:
+            self._schema = dict(df.dtypes)
+            return df
+        if any(column not in self._schema for column in df.columns):
+            return None
+        # missing columns are filled with NaN, which only floats can hold
+        if any(
+            column not in df.columns and np.dtype(t).kind != "f"
+            for column, t in self._schema.items()
+        ):
+            return None
+        try:
+            df = df.reindex(columns=list(self._schema.keys()))
+            return df.astype(self._schema)
+        except (ValueError, TypeError):
+            return None
+
+    def _append(self, df):
+        if self.outFile.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.fname, table.schema)
+            self._writer.write_table(table, row_group_size=100000)
+        else:
+            if self._store is None:
+                self._store = pd.HDFStore(self.fname, "w")
+            self._store.append(
+                "vars",
+                df,
+                format="table",
+                data_columns=[
+                    c for c in pandas_utils.H5_DATA_COLUMNS if c in self._schema
+                ],
+                index=False,
+            )
+
+    def close_output(self):
+        """Finish the current output, if anything was added to it."""
+        if self.metadata is None and self.nrows == 0:
+            return
+        fname = self.fname
+        if self.nrows == 0:
+            print("No events in", fname)
+            df = pd.DataFrame(["empty"], columns=["empty"])
+            if fname.endswith(".parquet"):
+                pandas_utils.write_parquet(df, fname, self.metadata)
+            else:
+                with pd.HDFStore(fname, "w") as store:
+                    pandas_utils.h5put(store, df, "vars")
+                    store.get_storer("vars").attrs.metadata = self.metadata
+        elif self._writer is not None:
+            self._writer.add_key_value_metadata(
+                {"metadata": pandas_utils.metadata_to_json(self.metadata)}
+            )
+            self._writer.close()
+        else:
+            self._store.create_table_index("vars")
+            self._store.get_storer("vars").attrs.metadata = self.metadata
+            self._store.close()
+        self.outputs.append(fname)
+        self._reset()
+        if self.on_close is not None:
+            self.on_close(fname)
+
+    def close(self):
+        """Finish the last output, returns the list of the output files."""
+        self.close_output()
+        return self.outputs
+
+
 def merge(options, pattern="condor_*.hdf5", outFile="out.hdf5"):
     files = glob.glob(pattern)
     if len(files) == 0:
         print("No .hdf5 files found")
         sys.exit()
 
-    df_tot = None
-    metadata_tot = None
-    for ifile, file in enumerate(files):
-        df, metadata = h5load(file, "vars")
+    # the chunks are local and small, so it's cheap to read them twice,
+    # first to find the schema, so that they all fit in one output
+    dtypes = []
+    for file in files:
+        df, _ = load(file)
 
         ### Error out here
         if type(df) == int:
             print("Something screwed up.")
             sys.exit()
 
-        ### MERGE METADATA
-        if metadata_tot is None:
-            metadata_tot = metadata
-        elif options.isMC:
-            metadata_tot["gensumweight"] += metadata["gensumweight"]
+        if "empty" not in list(df.keys()):
+            dtypes.append(df.dtypes)
 
-        # no need to add empty ones
-        if "empty" in list(df.keys()):
-            continue
-
-        ### MERGE DF
-        if df_tot is None:
-            df_tot = df
-        else:
-            df_tot = pd.concat((df_tot, df))
-
-    # SAVE OUTPUTS
-    if df_tot is None:
-        print("No events in df_tot.")
-        df_tot = pd.DataFrame(["empty"], columns=["empty"])
-    store = pd.HDFStore(outFile)
-    store.put("vars", df_tot)
-    store.get_storer("vars").attrs.metadata = metadata_tot
-    store.close()
+    merger = NtupleMerger(outFile, schema=merged_schema(dtypes) if dtypes else None)
+    for file in files:
+        df, metadata = load(file)
+        merger.add(df, metadata)
+    merger.close()
 
     # clean up the chunk files that we have already merged together
     for file in files:
@@ -1,68 +1,93 @@
 import pandas as pd
 from coffea.processor.accumulator import AccumulatorABC
 
+from workflows.utils.column_store import ColumnStore
+
 
 class pandas_accumulator(AccumulatorABC):
     """An appendable pandas table
+    The table is stored as a list of blocks, one ColumnStore (one numpy array per
+    column) per chunk. While a chunk is processed, its columns can be assigned whole
+    or filled by integer-index scatter. Adding accumulators only appends references
+    to their blocks, so merging the chunks in the executors does not copy any data;
+    the blocks are concatenated once, by `compact` (e.g. in the processor's
+    postprocess), or when the value is requested.
     Parameters
     ----------
-        value : pandas.DataFrame
-            The identity value array, which should be an empty ndarray
-            with the desired row shape. The column dimension will correspond to
-            the first index of `value` shape.
+        value : pandas.DataFrame or ColumnStore
+            The initial value of the table, usually empty.
     Examples
     --------
     If a set of accumulators is defined as::
         a = pandas_accumulator(pd.DataFrame())
         b = pandas_accumulator(pd.DataFrame({'col1': [1, 2], 'col2': [3, 4]}))
-        b = pandas_accumulator(pd.DataFrame({'col1': [5, 6], 'col2': [7, 8]}))
+        c = pandas_accumulator(pd.DataFrame({'col1': [5, 6], 'col2': [7, 8]}))
     then:
-    >>> a + b
-    column_accumulator(array([1., 2., 3.]))
-    >>> c + b + a
-    column_accumulator(array([4., 5., 6., 1., 2., 3.]))
+    >>> (a + b + c).value
+       col1  col2
+    0     1     3
+    1     2     4
+    2     5     7
+    3     6     8
     """
 
     def __init__(self, value):
-        if not isinstance(value, pd.DataFrame):
-            raise ValueError("pandas_accumulator only works with pandas DataFrames")
-        self._empty = pd.DataFrame()
-        self._value = value
+        if isinstance(value, pd.DataFrame):
+            value = ColumnStore.from_pandas(value)
+        if not isinstance(value, ColumnStore):
+            raise ValueError(
+                "pandas_accumulator only works with pandas DataFrames or ColumnStores"
+            )
+        self._blocks = [value]
 
     def __repr__(self):
         return "pandas_accumulator(\n%r\n)" % self.value
 
+    def __len__(self):
+        return sum(len(block) for block in self._blocks)
+
+    @property
+    def nblocks(self):
+        return len(self._blocks)
+
     def identity(self):
-        return pandas_accumulator(self._empty)
+        return pandas_accumulator(ColumnStore())
 
     def add(self, other):
         if not isinstance(other, pandas_accumulator):
             raise ValueError("pandas_accumulator cannot be added to %r" % type(other))
-        if other._empty.shape != self._empty.shape:
+        blocks = [
+            block
+            for block in self._blocks + other._blocks
+            if len(block) > 0 or len(block.columns) > 0
+        ]
+        self._blocks = blocks or [ColumnStore()]
+
+    def compact(self):
+        """Concatenate the blocks into a single one, returns it."""
+        if len(self._blocks) > 1:
+            self._blocks = [ColumnStore.concatenate(self._blocks)]
+        return self._blocks[0]
+
+    def _block(self):
+        # the table of the chunk being processed
+        if len(self._blocks) > 1:
             raise ValueError(
-                "Cannot add two column_accumulator objects of dissimilar shape (%r vs %r)"
-                % (self._empty.shape, other._empty.shape)
+                "Cannot modify a pandas_accumulator made of %r blocks, only that of a single chunk."
+                % len(self._blocks)
             )
-        self._value = pd.concat((self._value, other._value))
+        return self._blocks[0]
 
     def loc(self, indices, key, value):
-        self._value.loc[indices, key] = value
+        self._block().loc(indices, key, value)
 
     def __setitem__(self, key, value):
-        if not isinstance(key, str):
-            raise ValueError("Column name must be a string not %r." % type(key))
-        self._value[key] = value
+        self._block()[key] = value
 
     def __getitem__(self, key):
-        if not isinstance(key, str):
-            raise ValueError("Column name must be a string not %r." % type(key))
-        if key not in self._value.keys():
-            raise KeyError(f"Key {key} does not exist in accumulator")
-        return self._value[key]
+        return self.compact()[key]
 
     @property
     def value(self):
-        """The current value of the column
-        Returns a numpy array where the first dimension is the column dimension
-        """
-        return self._value
+        """The current value of the table, as a pandas.DataFrame"""
+        return self.compact().to_pandas()
@@ -1,3 +1,4 @@
+import json
 import os
 import pathlib
 import shutil
@@ -22,31 +23,215 @@ def ak_to_pandas(self, jet_collection: ak.Array) -> pd.DataFrame:
     return out_df
 
 
+# columns indexed as data columns in the HDF5 table format, so that they can be
+# used in the where selections of HDFStore.select (see histmaker/fill_utils.h5load)
+H5_DATA_COLUMNS = [
+    "ht",
+    "ht_JEC",
+    "ht_JEC_JER_up",
+    "ht_JEC_JER_down",
+    "ht_JEC_JES_up",
+    "ht_JEC_JES_down",
+    "ntracks",
+    "ngood_ak4jets",
+    "ngood_fastjets",
+    "SUEP_S1_CL",
+    "SUEP_nconst_CL",
+    "ISR_S1_CL",
+    "ISR_nconst_CL",
+    "SUEP_S1_CL_track_down",
+    "SUEP_nconst_CL_track_down",
+    "ISR_S1_CL_track_down",
+    "ISR_nconst_CL_track_down",
+]
+
+
+def h5put(
+    store: pd.HDFStore,
+    df: pd.DataFrame,
+    gname: str,
+    table: bool = False,
+    data_columns: Optional[List[str]] = None,
+) -> None:
+    """
+    Put df in the store, either in the (default) fixed format, or in the PyTables
+    table format, which can be queried by column and by selection on the data columns
+    (by default, the ones in H5_DATA_COLUMNS present in df).
+    """
+    if not table:
+        store.put(gname, df)
+        return
+    if data_columns is None:
+        data_columns = H5_DATA_COLUMNS
+    # PyTables tables have no half precision floats (see format_dataframe)
+    df = df.astype(
+        {key: "float32" for key, dtype in df.dtypes.items() if dtype == "float16"}
+    )
+    store.put(
+        gname,
+        df,
+        format="table",
+        data_columns=[c for c in data_columns if c in df.columns],
+        index=True,
+    )
+
+
 def h5store(
-    self, store: pd.HDFStore, df: pd.DataFrame, fname: str, gname: str, **kwargs: float
+    self,
+    store: pd.HDFStore,
+    df: pd.DataFrame,
+    fname: str,
+    gname: str,
+    table: bool = False,
+    **kwargs: float,
 ) -> None:
-    store.put(gname, df)
+    h5put(store, df, gname, table=table)
     store.get_storer(gname).attrs.metadata = kwargs
 
 
-def save_dfs(self, dfs, df_names, fname="out.hdf5", metadata=None):
+def h5_to_table(fname: str, gname: str = "vars", data_columns=None) -> bool:
+    """
+    Convert, in place, the DataFrame gname of a HDF5 store written in the fixed
+    format to the table format (see h5put), keeping its metadata.
+    The other keys of the store (e.g. the ones of save_dfs) are copied over as they
+    are, in their format and with their metadata.
+    Returns False if it already was a table.
+    """
+    with pd.HDFStore(fname, "r") as store:
+        if store.get_storer(gname).is_table:
+            return False
+        # (key, DataFrame, table format, data columns, metadata) of each key
+        keys = []
+        for key in store.keys():
+            storer = store.get_storer(key)
+            metadata = getattr(storer.attrs, "metadata", None)
+            if key.strip("/") == gname.strip("/"):
+                keys.append((key, store[key], True, data_columns, metadata))
+            elif storer.is_table:
+                keys.append((key, store[key], True, storer.data_columns, metadata))
+            else:
+                keys.append((key, store[key], False, None, metadata))
+    tmp_fname = fname + ".tmp"
+    try:
+        with pd.HDFStore(tmp_fname, "w") as store:
+            for key, df, table, key_data_columns, metadata in keys:
+                h5put(store, df, key, table=table, data_columns=key_data_columns)
+                if metadata is not None:
+                    store.get_storer(key).attrs.metadata = metadata
+        os.replace(tmp_fname, fname)
+    finally:
+        if os.path.exists(tmp_fname):
+            os.remove(tmp_fname)
+    return True
+
+
+def _json_default(obj):
+    # numpy scalars and arrays, coffea accumulators
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "value"):
+        return obj.value
+    return str(obj)
+
+
+def metadata_to_json(metadata: Optional[dict]) -> bytes:
+    """Metadata as stored in the key-value metadata of the Parquet files."""
+    return json.dumps(metadata or {}, default=_json_default).encode()
+
+
+def write_parquet(
+    df: pd.DataFrame, fname: str, metadata: Optional[dict] = None, row_group_size=100000
+) -> None:
+    """
+    Write a DataFrame to a Parquet file, with the metadata (gensumweight, cutflows,
+    git info, ...) stored as JSON in the key-value metadata of the file.
+    Row groups carry min/max statistics, so that selections can skip them when reading.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # parquet has no half precision floats (see format_dataframe)
+    df = df.astype(
+        {key: "float32" for key, dtype in df.dtypes.items() if dtype == "float16"}
+    )
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            b"metadata": metadata_to_json(metadata),
+        }
+    )
+    pq.write_table(table, fname, row_group_size=row_group_size)
+
+
+def parquet_load(
+    ifile: str, columns: Optional[List[str]] = None, filters: Optional[list] = None
+):
+    """
+    Load a pandas DataFrame from a Parquet file, including metadata.
+    Only the columns (which exist in the file) are read, and filters, in the
+    disjunctive normal form of pyarrow, are used to skip row groups and rows.
+    """
+    import pyarrow.parquet as pq
+
+    schema = pq.read_schema(ifile)
+    # key-value metadata of the file footer, it can also be added once a file was
+    # written incrementally (see merger.NtupleMerger), unlike that of the schema
+    footer = pq.read_metadata(ifile).metadata or {}
+    metadata = json.loads(footer.get(b"metadata", b"{}"))
+    if columns is not None:
+        columns = [c for c in columns if c in schema.names]
+    if filters is not None and any(
+        term[0] not in schema.names for conj in filters for term in conj
+    ):
+        filters = None
+    data = pq.read_table(ifile, columns=columns, filters=filters).to_pandas()
+    return data, metadata
+
+
+def default_metadata(self) -> dict:
+    if self.isMC:
+        return dict(
+            gensumweight=self.gensumweight,
+            era=self.era,
+            mc=self.isMC,
+            sample=self.sample,
+        )
+    return dict(era=self.era, mc=self.isMC, sample=self.sample)
+
+
+def save_dfs(self, dfs, df_names, fname="out.hdf5", metadata=None, table=False):
+    """
+    Save the DataFrames dfs, named df_names, to the output location of the processor.
+    The format is chosen from the extension of fname: a HDF5 store with one key per
+    DataFrame (in the PyTables table format if table, see h5put), or for .parquet
+    one Parquet file per DataFrame ("vars" in fname, the others in fname_<name>.parquet).
+    """
     subdirs = []
+    if fname.endswith(".parquet"):
+        if self.output_location is None:
+            print("self.output_location is None")
+            return
+        if metadata is None:
+            metadata = default_metadata(self)
+        for out, gname in zip(dfs, df_names):
+            out_fname = (
+                fname
+                if gname == "vars"
+                else fname.replace(".parquet", f"_{gname}.parquet")
+            )
+            write_parquet(out, out_fname, metadata)
+            dump_table(self, out_fname, self.output_location, subdirs)
+        return
+
     store = pd.HDFStore(fname)
     if self.output_location is not None:
         # pandas to hdf5
         for out, gname in zip(dfs, df_names):
             if metadata is None:
-                if self.isMC:
-                    metadata = dict(
-                        gensumweight=self.gensumweight,
-                        era=self.era,
-                        mc=self.isMC,
-                        sample=self.sample,
-                    )
-                else:
-                    metadata = dict(era=self.era, mc=self.isMC, sample=self.sample)
-
-            store_fin = h5store(self, store, out, fname, gname, **metadata)
+                metadata = default_metadata(self)
+
+            store_fin = h5store(self, store, out, fname, gname, table=table, **metadata)
 
         store.close()
 
@@ -0,0 +1,54 @@
+"""
+Counter-based random numbers for the per-object systematics (track killing,
+muon smearing, ...).
+Instead of drawing from a global, seeded generator, every random number is a
+hash of (stream, run, event, object index). Results therefore only depend on
+the event and on the position of the object in its collection, and not on how
+the input is split into chunks or distributed over workers.
+"""
+
+import awkward as ak
+import numpy as np
+
+# streams, to get independent random numbers for the same object in different places
+TRACK_KILLING_STREAM = 1
+MUON_SMEARING_STREAM = 2
+
+
+def _splitmix64(x):
+    """splitmix64 finalizer, x is a uint64 numpy array (arithmetic wraps around)"""
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def counter_random(run, event, index, stream=0):
+    """
+    Uniform random numbers in [0, 1), one per entry of the (broadcastable)
+    run, event, and index arrays.
+    """
+    run, event, index = np.broadcast_arrays(
+        np.asarray(run).astype(np.uint64),
+        np.asarray(event).astype(np.uint64),
+        np.asarray(index).astype(np.uint64),
+    )
+    x = _splitmix64(np.full(run.shape, stream, dtype=np.uint64) ^ run)
+    x = _splitmix64(x ^ event)
+    x = _splitmix64(x ^ index)
+    # keep the 53 most significant bits to fill the mantissa of a double
+    return (x >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+def object_random(events, objects, stream=0):
+    """
+    Flat array of random numbers for a jagged (events x objects) collection,
+    keyed on (run, event, index of the object in the event).
+    Returns the random numbers and the number of objects per event.
+    """
+    counts = ak.to_numpy(ak.num(objects, axis=1))
+    starts = np.cumsum(counts) - counts
+    index = np.arange(counts.sum()) - np.repeat(starts, counts)
+    run = np.repeat(ak.to_numpy(events.run), counts)
+    event = np.repeat(ak.to_numpy(events.event), counts)
+    return counter_random(run, event, index, stream), counts
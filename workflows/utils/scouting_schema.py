@@ -0,0 +1,38 @@
+"""
+NanoEvents schema for the scouting ntuples, so that their tree (mmtree/tree) is read
+directly, and lazily, by coffea, like the NanoAOD ones.
+The branches are grouped into collections by their prefix (PFcand_pt -> PFcand.pt,
+scouting_trig -> scouting.trig, ...) as in NanoAOD. The masses are stored as "_m",
+which are renamed to "_mass", as expected by the 4-vector methods, see
+https://github.com/CoffeaTeam/coffea/blob/master/coffea/nanoevents/methods/vector.py#L753
+"""
+from coffea.nanoevents import NanoAODSchema
+
+# strings, which are not used
+SKIPPED_BRANCHES = ["hltResultName", "genModel"]
+
+
+def scouting_name(branch):
+    """Name of a branch of the scouting ntuples, as seen in the events."""
+    if branch.endswith("_m"):
+        return branch[: -len("_m")] + "_mass"
+    return branch
+
+
+class ScoutingSchema(NanoAODSchema):
+    """
+    Scouting ntuples schema, NanoAODSchema with the names of the masses changed, and
+    the PF candidates (PFcand) as PFCand objects.
+    Usage: Runner(schema=ScoutingSchema, ...) with treename="mmtree/tree".
+    """
+
+    mixins = {**NanoAODSchema.mixins, "PFcand": "PFCand"}
+
+    def __init__(self, base_form, *args, **kwargs):
+        base_form = dict(base_form)
+        base_form["contents"] = {
+            scouting_name(branch): form
+            for branch, form in base_form["contents"].items()
+            if branch not in SKIPPED_BRANCHES
+        }
+        super().__init__(base_form, *args, **kwargs)
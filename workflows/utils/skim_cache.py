@@ -0,0 +1,160 @@
+"""
+Skim cache: for each input file, the entries that pass the early, track-independent,
+selections of a processor (golden JSON, lepton veto, trigger, MET filters), with the
+number of events and the sum of the gen weights of the whole file.
+Once an input is in the cache, the following runs copy only those entries, with the
+branches of the processor, to a local file (see branch_manifest.preload), and run the
+processor on it without re-evaluating these selections.
+
+The entries are stored per selection version, a hash of the code of the selections
+and of the modules of the helpers they call, of their configuration (era, isMC, ...)
+and of their inputs (e.g. the golden JSON), so that changing any of them invalidates
+the cache, while changes to the rest of the processor (the SUEP methods) don't.
+
+e.g.
+    cache = SkimCache("/path/to/cache", instance.skimVersion())
+    entries = cache.setup(instance, infile)  # instance.skim is "read" or "write"
+    if entries is not None and len(entries) == 0:
+        write_empty(instance, "ntuple_skim.hdf5")  # nothing to run over
+    else:
+        if entries is not None:
+            preload(infile, instance.branchManifest(), "skim.root", entries=entries)
+        output = runner.run({dataset: [...]}, "Events", instance)
+        cache.fill(infile, output)
+"""
+import hashlib
+import inspect
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from coffea import processor
+
+from workflows.utils import pandas_utils
+
+
+def selection_version(funcs, config=None, files=(), modules=()):
+    """
+    Hash of the source code of funcs and of modules (the helpers called by funcs),
+    of config (a dict) and of the files' content.
+    """
+    version = hashlib.sha1()
+    for func in funcs:
+        version.update(inspect.getsource(func).encode())
+    for module in modules:
+        version.update(inspect.getsource(module).encode())
+    version.update(json.dumps(config, sort_keys=True, default=str).encode())
+    for fname in files:
+        with open(fname, "rb") as f:
+            version.update(f.read())
+    return version.hexdigest()[:16]
+
+
+def skim_output(events, selected, gensumweight):
+    """
+    Output of a processor run with skim="write", to be added to its accumulator:
+    selected are the events that pass the early selections, whose "entry" field was
+    set on events before.
+    """
+    return processor.dict_accumulator(
+        {
+            "entries": processor.column_accumulator(
+                np.asarray(selected.entry, dtype=np.int64)
+            ),
+            "nevents": processor.value_accumulator(int, len(events)),
+            "gensumweight": processor.value_accumulator(float, float(gensumweight)),
+        }
+    )
+
+
+def write_empty(instance, fname):
+    """
+    Write the empty ntuple of a processor run with skim="read" on an input with no
+    selected entries, as the processor does when no events pass the early selections,
+    with the sum of the gen weights of the whole file. No chunks would be run over
+    the (empty) skim, so the processor is not run at all.
+    """
+    instance.gensumweight = instance.skim_gensumweight
+    pandas_utils.save_dfs(
+        instance, [pd.DataFrame({"empty": np.array(["empty"])})], ["vars"], fname
+    )
+
+
+class SkimCache:
+    """The skims of a given selection version, stored as .npz files in directory."""
+
+    def __init__(self, directory, version):
+        self.directory = directory
+        self.version = version
+
+    def path(self, infile):
+        key = hashlib.sha1(infile.encode()).hexdigest()[:16]
+        name = os.path.basename(infile).replace(".root", "")
+        return os.path.join(self.directory, self.version, f"{name}_{key}.npz")
+
+    def load(self, infile):
+        """The skim of infile (entries, nevents, gensumweight), or None if not cached."""
+        fname = self.path(infile)
+        if not os.path.exists(fname):
+            return None
+        try:
+            with np.load(fname) as skim:
+                if str(skim["infile"]) != infile:
+                    return None
+                return dict(
+                    entries=skim["entries"],
+                    nevents=int(skim["nevents"]),
+                    gensumweight=float(skim["gensumweight"]),
+                )
+        except Exception as e:
+            logging.warning(f"Could not read the skim cache {fname}: {e}")
+            return None
+
+    def save(self, infile, entries, nevents, gensumweight):
+        fname = self.path(infile)
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        # write and rename, so that an interrupted job does not leave a partial skim
+        tmp = fname + ".tmp.npz"
+        np.savez(
+            tmp,
+            infile=infile,
+            entries=np.sort(np.asarray(entries, dtype=np.int64)),
+            nevents=nevents,
+            gensumweight=gensumweight,
+        )
+        os.replace(tmp, fname)
+
+    def setup(self, instance, infile):
+        """
+        Look infile up, and set instance.skim accordingly: "read", with the sum of the
+        gen weights of the file as instance.skim_gensumweight, returning the entries to
+        run over; or "write", to fill the cache from the run, returning None.
+        Inputs with no selected entries return no entries: there is nothing to run
+        over, their empty ntuple is written with write_empty.
+        """
+        skim = self.load(infile)
+        if skim is None:
+            instance.skim = "write"
+            return None
+        print(
+            "Skim cache: {} of {} entries of {}".format(
+                len(skim["entries"]), skim["nevents"], infile
+            )
+        )
+        instance.skim = "read"
+        instance.skim_gensumweight = skim["gensumweight"]
+        return skim["entries"]
+
+    def fill(self, infile, output):
+        """Save the skim of infile, from the output of a run with skim="write"."""
+        if output is None or "skim" not in output:
+            return
+        skim = output["skim"]
+        self.save(
+            infile,
+            skim["entries"].value,
+            skim["nevents"].value,
+            skim["gensumweight"].value,
+        )